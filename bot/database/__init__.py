@@ -1 +1,2 @@
 from bot.database.main import Database
+from bot.database.aio import run_db
@@ -0,0 +1,30 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from bot.database.main import Database
+
+T = TypeVar('T')
+
+# Bounded below the pool size so off-loop queries never wait on a connection.
+DB_WORKERS = Database.POOL_SIZE - 2
+
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+
+
+def _call_in_worker(func: Callable[..., T], *args, **kwargs) -> T:
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Worker threads are reused: never keep a read snapshot open between calls.
+        Database().remove_session()
+
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a synchronous database method on the database executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor,
+        functools.partial(_call_in_worker, func, *args, **kwargs),
+    )
@@ -0,0 +1,158 @@
+import threading
+
+from sqlalchemy import func, select
+
+from bot.database.main import Database
+from bot.database.models import Categories, Goods, ItemValues
+
+
+class CatalogIndex:
+    """In-memory categories -> goods -> stock tree used to render the shop.
+
+    The tree is loaded with two queries and then kept current by the write
+    methods: stock changes are applied incrementally, structural changes
+    (renames, deletions) simply drop the tree so the next read reloads it.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._generation = 0
+        self._children: dict[str | None, list[str]] = {}
+        self._items: dict[str, list[str]] = {}
+        self._stock: dict[str, int] = {}
+        self._infinite: set[str] = set()
+
+    def _load(self) -> None:
+        with self._lock:
+            generation = self._generation
+        with Database().engine.connect() as conn:
+            categories = conn.execute(select(Categories.name, Categories.parent_name)).all()
+            goods = conn.execute(
+                select(
+                    Goods.name,
+                    Goods.category_name,
+                    func.count(ItemValues.id),
+                    func.max(ItemValues.is_infinity),
+                )
+                .outerjoin(ItemValues, ItemValues.item_name == Goods.name)
+                .group_by(Goods.name)
+            ).all()
+        children: dict[str | None, list[str]] = {}
+        for name, parent in categories:
+            children.setdefault(parent, []).append(name)
+        items: dict[str, list[str]] = {}
+        stock: dict[str, int] = {}
+        infinite: set[str] = set()
+        for name, category, amount, is_infinity in goods:
+            items.setdefault(category, []).append(name)
+            stock[name] = amount or 0
+            if is_infinity:
+                infinite.add(name)
+        with self._lock:
+            self._children, self._items = children, items
+            self._stock, self._infinite = stock, infinite
+            # A write that landed while we were querying may be missing: reload next time.
+            self._loaded = generation == self._generation
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self._load()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._loaded = False
+
+    def stock_added(self, item_name: str, amount: int = 1, is_infinity: bool = False) -> None:
+        with self._lock:
+            self._generation += 1
+            if item_name not in self._stock:
+                # Unknown item: let the next read pick up its category from the database.
+                self._loaded = False
+                return
+            self._stock[item_name] += amount
+            if is_infinity:
+                self._infinite.add(item_name)
+
+    def stock_removed(self, item_name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._generation += 1
+            if item_name not in self._stock:
+                self._loaded = False
+                return
+            self._stock[item_name] = max(self._stock[item_name] - amount, 0)
+
+    def item_added(self, item_name: str, category_name: str) -> None:
+        with self._lock:
+            self._generation += 1
+            if not self._loaded:
+                return
+            self._items.setdefault(category_name, []).append(item_name)
+            self._stock.setdefault(item_name, 0)
+
+    def category_added(self, category_name: str, parent_name: str | None = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if not self._loaded:
+                return
+            self._children.setdefault(parent_name, []).append(category_name)
+
+    def counts(self) -> dict[str, int]:
+        """Return the number of stock rows, goods and categories."""
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                'items': sum(self._stock.values()),
+                'goods': len(self._stock),
+                'categories': sum(len(names) for names in self._children.values()),
+            }
+
+    def stock_amount(self, item_name: str) -> int:
+        self._ensure_loaded()
+        return self._stock.get(item_name, 0)
+
+    def is_infinite(self, item_name: str) -> bool:
+        self._ensure_loaded()
+        return item_name in self._infinite
+
+    def in_stock(self, item_name: str) -> bool:
+        self._ensure_loaded()
+        return item_name in self._infinite or self._stock.get(item_name, 0) > 0
+
+    def subcategories(self, parent_name: str | None) -> list[str]:
+        self._ensure_loaded()
+        return list(self._children.get(parent_name, ()))
+
+    def items(self, category_name: str) -> list[str]:
+        self._ensure_loaded()
+        return list(self._items.get(category_name, ()))
+
+    def items_in_stock(self, category_name: str) -> list[str]:
+        return [name for name in self.items(category_name) if self.in_stock(name)]
+
+    def items_out_of_stock(self, category_name: str) -> list[str]:
+        return [name for name in self.items(category_name) if not self.in_stock(name)]
+
+    def has_stock(self, category_name: str, _seen: set | None = None) -> bool:
+        """Return True if the category or any nested subcategory has an item in stock."""
+        seen = _seen if _seen is not None else set()
+        if category_name in seen:
+            return False
+        seen.add(category_name)
+        if self.items_in_stock(category_name):
+            return True
+        return any(self.has_stock(sub, seen) for sub in self.subcategories(category_name))
+
+    def has_missing_stock(self, category_name: str, _seen: set | None = None) -> bool:
+        """Return True if the category or any nested subcategory has an out-of-stock item."""
+        seen = _seen if _seen is not None else set()
+        if category_name in seen:
+            return False
+        seen.add(category_name)
+        if self.items_out_of_stock(category_name):
+            return True
+        return any(self.has_missing_stock(sub, seen) for sub in self.subcategories(category_name))
+
+
+catalog = CatalogIndex()
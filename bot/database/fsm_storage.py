@@ -0,0 +1,190 @@
+import asyncio
+import copy
+import time
+import typing
+
+from aiogram.dispatcher.storage import BaseStorage
+
+from bot.database.aio import run_db
+from bot.database.methods import get_fsm_record, get_fsm_version, save_fsm_records
+from bot.logger_mesh import logger
+
+Key = tuple[int, int]
+
+
+def _empty() -> dict:
+    return {'state': None, 'data': {}, 'bucket': {}}
+
+
+class SQLiteStorage(BaseStorage):
+    """aiogram FSM storage kept in the ``fsm_records`` table.
+
+    Reads are served from an in-memory cache; a miss loads the record once.
+    Writes only touch the cache and mark the record dirty, and a background
+    task saves every dirty record in one transaction each ``FLUSH_INTERVAL``,
+    so a burst of updates for a user costs a single write. Clean records are
+    dropped from the cache after ``CACHE_TTL`` seconds to bound memory.
+
+    Several worker processes may share the table: a clean record cached for
+    longer than ``REVALIDATE_AFTER`` is checked against the row's write stamp
+    and reloaded when another worker has saved it since. Concurrent writes to
+    the same record from two workers are last-writer-wins, as with aiogram's
+    Redis storage.
+    """
+
+    FLUSH_INTERVAL = 1
+    REVALIDATE_AFTER = 1
+    CACHE_TTL = 30
+
+    def __init__(self):
+        self._cache: dict[Key, dict] = {}
+        self._loaded_at: dict[Key, float] = {}
+        self._versions: dict[Key, int] = {}
+        self._dirty: set[Key] = set()
+        self._locks: dict[Key, asyncio.Lock] = {}
+        self._flusher: asyncio.Task | None = None
+        self._evicted_at = time.monotonic()
+
+    async def _record(self, chat, user) -> tuple[Key, dict]:
+        chat, user = self.check_address(chat=chat, user=user)
+        key = (int(chat), int(user))
+        record = self._cache.get(key)
+        if record is not None and self._is_fresh(key):
+            return key, record
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            record = self._cache.get(key)
+            if record is None or not self._is_fresh(key):
+                record = await self._load(key, record)
+        self._locks.pop(key, None)
+        if time.monotonic() - self._evicted_at >= self.CACHE_TTL:
+            self._evict()
+        return key, record
+
+    def _is_fresh(self, key: Key) -> bool:
+        return key in self._dirty or time.monotonic() - self._loaded_at.get(key, 0) < self.REVALIDATE_AFTER
+
+    async def _load(self, key: Key, cached: dict | None) -> dict:
+        if cached is not None:
+            version = await run_db(get_fsm_version, *key)
+            if key in self._dirty or version == self._versions.get(key):
+                self._loaded_at[key] = time.monotonic()
+                return self._cache[key]
+        loaded = await run_db(get_fsm_record, *key)
+        if key in self._dirty:
+            # Written to while loading; the pending save wins over the row.
+            return self._cache[key]
+        version = loaded.pop('version') if loaded else 0
+        self._cache[key] = record = loaded or _empty()
+        self._versions[key] = version
+        self._loaded_at[key] = time.monotonic()
+        return record
+
+    def _mark_dirty(self, key: Key) -> None:
+        self._dirty.add(key)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Saving FSM records failed")
+
+    async def flush(self) -> None:
+        """Save every dirty record now."""
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        records = {key: copy.deepcopy(self._cache[key]) for key in keys}
+        # Counted as fresh from now on, so a read cannot reload the row before this save lands.
+        now = time.monotonic()
+        for key in keys:
+            self._loaded_at[key] = now
+        try:
+            versions = await run_db(save_fsm_records, records)
+        except Exception:
+            self._dirty |= keys
+            raise
+        self._versions.update(versions)
+
+    def _evict(self) -> None:
+        now = self._evicted_at = time.monotonic()
+        stale = [
+            key for key, loaded_at in self._loaded_at.items()
+            if key not in self._dirty and now - loaded_at >= self.CACHE_TTL
+        ]
+        for key in stale:
+            self._cache.pop(key, None)
+            self._loaded_at.pop(key, None)
+            self._versions.pop(key, None)
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+        await self.flush()
+
+    async def wait_closed(self):
+        return True
+
+    async def get_state(self, *, chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        _, record = await self._record(chat, user)
+        return record['state'] if record['state'] is not None else self.resolve_state(default)
+
+    async def get_data(self, *, chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> dict:
+        _, record = await self._record(chat, user)
+        return copy.deepcopy(record['data']) if record['data'] else (default or {})
+
+    async def set_state(self, *, chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        key, record = await self._record(chat, user)
+        record['state'] = self.resolve_state(state)
+        self._mark_dirty(key)
+
+    async def set_data(self, *, chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key, record = await self._record(chat, user)
+        record['data'] = copy.deepcopy(data) if data else {}
+        self._mark_dirty(key)
+
+    async def update_data(self, *, chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        key, record = await self._record(chat, user)
+        if data is None:
+            data = {}
+        record['data'].update(copy.deepcopy(data), **copy.deepcopy(kwargs))
+        self._mark_dirty(key)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *, chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> dict:
+        _, record = await self._record(chat, user)
+        return copy.deepcopy(record['bucket']) if record['bucket'] else (default or {})
+
+    async def set_bucket(self, *, chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        key, record = await self._record(chat, user)
+        record['bucket'] = copy.deepcopy(bucket) if bucket else {}
+        self._mark_dirty(key)
+
+    async def update_bucket(self, *, chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        key, record = await self._record(chat, user)
+        if bucket is None:
+            bucket = {}
+        record['bucket'].update(copy.deepcopy(bucket), **copy.deepcopy(kwargs))
+        self._mark_dirty(key)
@@ -1,23 +1,114 @@
+import asyncio
+import contextlib
+import threading
 from typing import Final
-from sqlalchemy import create_engine
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from bot.misc import SingletonMeta
 
 
+def _scope_key():
+    """Return the key of the current session scope: the running asyncio task or the thread."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task
+    return threading.get_ident()
+
+
 class Database(metaclass=SingletonMeta):
     BASE: Final = declarative_base()
+    URL: Final = 'sqlite:///database.db'
+    POOL_SIZE: Final = 8
+    MAX_OVERFLOW: Final = 16
+    # Seconds a connection waits for the write lock before SQLITE_BUSY is raised.
+    BUSY_TIMEOUT: Final = 30
+    PRAGMAS: Final = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': BUSY_TIMEOUT * 1000,
+    }
 
     def __init__(self):
-        self.__engine = create_engine(f'sqlite:///database.db')
-        session = sessionmaker(bind=self.__engine)
-        self.__session = session()
+        self.__engine = create_engine(
+            self.URL,
+            poolclass=QueuePool,
+            pool_size=self.POOL_SIZE,
+            max_overflow=self.MAX_OVERFLOW,
+            connect_args={'check_same_thread': False, 'timeout': self.BUSY_TIMEOUT},
+        )
+        event.listen(self.__engine, 'connect', self._on_connect)
+        event.listen(self.__engine, 'begin', self._on_begin)
+        self.__session_factory = sessionmaker(bind=self.__engine)
+        self.__sessions = {}
+        self.__lock = threading.Lock()
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        # Let SQLAlchemy emit BEGIN itself so writers can ask for BEGIN IMMEDIATE.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in self.PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    @staticmethod
+    def _on_begin(connection) -> None:
+        mode = connection.get_execution_options().get('sqlite_begin', 'DEFERRED')
+        connection.exec_driver_sql(f'BEGIN {mode}')
 
     @property
     def session(self):
-        return self.__session
+        """Return the session bound to the current asyncio task or thread."""
+        key = _scope_key()
+        session = self.__sessions.get(key)
+        if session is None:
+            with self.__lock:
+                session = self.__sessions.get(key)
+                if session is None:
+                    session = self.__session_factory()
+                    self.__sessions[key] = session
+                    if isinstance(key, asyncio.Task):
+                        key.add_done_callback(self._release)
+        return session
 
     @property
     def engine(self):
         return self.__engine
+
+    def _release(self, key) -> None:
+        with self.__lock:
+            session = self.__sessions.pop(key, None)
+        if session is not None:
+            session.close()
+
+    def remove_session(self) -> None:
+        """Close the session of the current scope and return its connection to the pool."""
+        self._release(_scope_key())
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Run a block of writes in one ``BEGIN IMMEDIATE`` transaction on the scoped session.
+
+        Taking the write lock up front makes concurrent writers queue on the busy
+        timeout instead of failing when a deferred read transaction is upgraded.
+        """
+        session = self.session
+        if session.in_transaction():
+            # Drop the read snapshot so the block sees the latest committed rows.
+            session.commit()
+        session.connection(execution_options={'sqlite_begin': 'IMMEDIATE'})
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
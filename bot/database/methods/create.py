@@ -1,14 +1,23 @@
 import datetime
+import json
 import random
 import sqlalchemy.exc
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from bot.database import Database
+from bot.database.catalog import catalog
+from bot.database.rollups import record_sale
+from bot.database.stats import shop_stats
 from bot.database.models import (
     User,
     ItemValues,
     Goods,
     Categories,
     BoughtGoods,
+    BroadcastCampaign,
+    IpnEvent,
+    ScheduledJob,
+    UploadedFile,
     Operations,
     UnfinishedOperations,
     PromoCode,
@@ -62,6 +71,7 @@ def ensure_owner_account(owner_id_value) -> None:
     )
 
     updates_required = False
+    created = False
 
     # Demote any legacy owner accounts that do not match the configured OWNER_ID.
     legacy_owners = session.query(User).filter(User.role_id == owner_role_id, User.telegram_id != owner_id).all()
@@ -71,7 +81,7 @@ def ensure_owner_account(owner_id_value) -> None:
         logger.info("ensure_owner_account: Demoted legacy owner %s to role %s.", legacy.telegram_id, admin_role_id)
 
     owner_user = session.query(User).filter(User.telegram_id == owner_id).first()
-    now = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    now = datetime.datetime.utcnow()
     if owner_user is None:
         owner_user = User(
             telegram_id=owner_id,
@@ -82,6 +92,7 @@ def ensure_owner_account(owner_id_value) -> None:
             username=None,
         )
         session.add(owner_user)
+        created = True
         updates_required = True
         logger.info("ensure_owner_account: Created OWNER account for %s.", owner_id)
     elif owner_user.role_id != owner_role_id:
@@ -91,6 +102,11 @@ def ensure_owner_account(owner_id_value) -> None:
 
     if updates_required:
         session.commit()
+        # Counted once the commit has landed; a role change can move the admin count too.
+        if created and not legacy_owners:
+            shop_stats.user_registered(is_admin=True)
+        else:
+            shop_stats.invalidate()
 
     _ensure_profile(session, owner_id)
     logger.info("ensure_owner_account: OWNER_ID synchronized to %s.", owner_id)
@@ -124,6 +140,7 @@ def create_user(
                 )
             )
             session.commit()
+            shop_stats.user_registered(is_admin=role > 1)
         else:
             session.add(
                 User(
@@ -136,6 +153,7 @@ def create_user(
                 )
             )
             session.commit()
+            shop_stats.user_registered(is_admin=role > 1)
         _ensure_profile(session, telegram_id)
 
 
@@ -146,6 +164,7 @@ def create_item(item_name: str, item_description: str, item_price: int, category
         Goods(name=item_name, description=item_description, price=item_price,
               category_name=category_name, delivery_description=delivery_description))
     session.commit()
+    catalog.item_added(item_name, category_name)
 
 
 def add_values_to_item(item_name: str, value: str, is_infinity: bool) -> None:
@@ -157,6 +176,7 @@ def add_values_to_item(item_name: str, value: str, is_infinity: bool) -> None:
         session.add(
             ItemValues(name=item_name, value=value, is_infinity=True))
     session.commit()
+    catalog.stock_added(item_name, is_infinity=is_infinity)
 
 
 def create_category(category_name: str, parent: str | None = None,
@@ -171,13 +191,15 @@ def create_category(category_name: str, parent: str | None = None,
         )
     )
     session.commit()
+    catalog.category_added(category_name, parent)
 
 
-def create_operation(user_id: int, value: int, operation_time: str) -> None:
+def create_operation(user_id: int, value: int, operation_time: datetime.datetime) -> None:
     session = Database().session
     session.add(
         Operations(user_id=user_id, operation_value=value, operation_time=operation_time))
     session.commit()
+    shop_stats.top_up_recorded(value)
 
 
 def start_operation(user_id: int, value: int, operation_id: str, message_id: int | None = None) -> None:
@@ -188,13 +210,21 @@ def start_operation(user_id: int, value: int, operation_id: str, message_id: int
 
 
 def add_bought_item(item_name: str, value: str, price: int, buyer_id: int,
-                    bought_time: str) -> int:
-    session = Database().session
+                    bought_time: datetime.datetime) -> int:
+    with Database().transaction() as session:
+        unique_id = insert_bought_item(session, item_name, value, price, buyer_id, bought_time)
+    shop_stats.sale_recorded(price)
+    return unique_id
+
+
+def insert_bought_item(session, item_name: str, value: str, price: int, buyer_id: int,
+                       bought_time: datetime.datetime) -> int:
+    """Record a sale and its rollup inside the caller's transaction; return the purchase id."""
     unique_id = random.randint(1000000000, 9999999999)
     session.add(
         BoughtGoods(name=item_name, value=value, price=price, buyer_id=buyer_id, bought_datetime=bought_time,
                     unique_id=str(unique_id)))
-    session.commit()
+    record_sale(session, item_name, price, buyer_id, bought_time)
     return unique_id
 
 
@@ -204,7 +234,7 @@ def create_promocode(code: str, discount: int, expires_at: str | None) -> None:
     session.commit()
 
 
-def grant_achievement(user_id: int, code: str, achieved_at: str) -> None:
+def grant_achievement(user_id: int, code: str, achieved_at: datetime.datetime) -> None:
     session = Database().session
     session.add(UserAchievement(user_id=user_id, achievement_code=code, achieved_at=achieved_at))
     session.commit()
@@ -295,7 +325,7 @@ def create_reservation_record(
     item_value: str | None,
     is_infinity: bool,
     operation_id: str | None,
-    expires_at: str | None = None,
+    expires_at: datetime.datetime | None = None,
 ) -> int:
     session = Database().session
     reservation = Reservation(
@@ -351,3 +381,64 @@ def create_media_asset_record(
     session.add(asset)
     session.commit()
     return asset.id
+
+
+def create_broadcast_campaign(
+    created_by: int,
+    text: str,
+    segment: str,
+    segment_value: str | None,
+    total: int,
+    chat_id: int | None = None,
+    message_id: int | None = None,
+) -> int:
+    session = Database().session
+    campaign = BroadcastCampaign(
+        created_by=created_by,
+        text=text,
+        segment=segment,
+        segment_value=segment_value,
+        total=total,
+        chat_id=chat_id,
+        message_id=message_id,
+    )
+    session.add(campaign)
+    session.commit()
+    return campaign.id
+
+
+def save_uploaded_file_id(content_hash: str, kind: str, file_id: str) -> None:
+    session = Database().session
+    record = session.query(UploadedFile).filter(
+        UploadedFile.content_hash == content_hash, UploadedFile.kind == kind
+    ).first()
+    if record:
+        record.file_id = file_id
+    else:
+        session.add(UploadedFile(content_hash=content_hash, kind=kind, file_id=file_id))
+    session.commit()
+
+
+def schedule_job(kind: str, run_at: datetime.datetime, payload: dict | None = None) -> int:
+    session = Database().session
+    job = ScheduledJob(kind=kind, run_at=run_at, payload=json.dumps(payload or {}))
+    session.add(job)
+    session.commit()
+    return job.id
+
+
+def record_ipn_event(payment_id: str, status: str, payload: str) -> bool:
+    """Append an IPN to the inbox; False when this payment/status pair was already received."""
+    session = Database().session
+    result = session.execute(
+        sqlite_insert(IpnEvent).values(
+            payment_id=payment_id,
+            status=status,
+            payload=payload,
+            state='pending',
+            attempts=0,
+            received_at=datetime.datetime.utcnow(),
+        ).on_conflict_do_nothing(index_elements=['payment_id', 'status'])
+    )
+    session.commit()
+    return result.rowcount > 0
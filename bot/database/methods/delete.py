@@ -1,6 +1,9 @@
 import os
 
+from sqlalchemy import text
+
 from bot.database import Database
+from bot.database.catalog import catalog
 from bot.database.models import (
     Categories,
     City,
@@ -14,6 +17,7 @@ from bot.database.models import (
     Reseller,
     ResellerPrice,
     UnfinishedOperations,
+    UploadedFile,
     UserProfile,
 )
 from bot.utils.files import sanitize_name
@@ -29,6 +33,7 @@ def delete_item(item_name: str) -> None:
     session.query(ItemValues).filter(ItemValues.item_name == item_name).delete()
     session.query(ProductMetadata).filter(ProductMetadata.item_name == item_name).delete()
     session.commit()
+    catalog.invalidate()
     folder = os.path.join('assets', 'uploads', sanitize_name(item_name))
     if os.path.isdir(folder) and not os.listdir(folder):
         os.rmdir(folder)
@@ -43,6 +48,7 @@ def delete_only_items(item_name: str) -> None:
     session.query(ItemValues).filter(ItemValues.item_name == item_name).delete()
     session.query(ProductMetadata).filter(ProductMetadata.item_name == item_name).delete()
     session.commit()
+    catalog.invalidate()
     folder = os.path.join('assets', 'uploads', sanitize_name(item_name))
     if os.path.isdir(folder) and not os.listdir(folder):
         os.rmdir(folder)
@@ -58,6 +64,7 @@ def delete_category(category_name: str) -> None:
         delete_item(item.name)
     session.query(Categories).filter(Categories.name == category_name).delete()
     session.commit()
+    catalog.invalidate()
 
 
 def finish_operation(operation_id: str) -> None:
@@ -70,8 +77,56 @@ def finish_operation(operation_id: str) -> None:
 def buy_item(item_id: str, infinity: bool = False) -> None:
     if not infinity:
         session = Database().session
-        session.query(ItemValues).filter(ItemValues.id == item_id).delete()
+        item_name = session.query(ItemValues.item_name).filter(ItemValues.id == item_id).scalar()
+        deleted = session.query(ItemValues).filter(ItemValues.id == item_id).delete()
         session.commit()
+        if deleted and item_name:
+            catalog.stock_removed(item_name, deleted)
+
+
+def claim_item_value(item_name: str) -> dict | None:
+    """Hand out the next stock unit of an item, each unit exactly once.
+
+    Unlimited values are returned without being consumed. Regular units are
+    removed and returned by a single ``DELETE ... RETURNING`` statement, so two
+    buyers racing for the same item can never receive the same row.
+    """
+    with Database().transaction() as session:
+        value = take_item_value(session, item_name)
+    if value is not None and not value['is_infinity']:
+        catalog.stock_removed(item_name)
+    return value
+
+
+def take_item_value(session, item_name: str) -> dict | None:
+    """``claim_item_value`` inside the caller's transaction, without touching the catalog."""
+    unlimited = session.query(ItemValues).filter(
+        ItemValues.item_name == item_name, ItemValues.is_infinity.is_(True)
+    ).first()
+    if unlimited is not None:
+        return {
+            'id': unlimited.id,
+            'item_name': unlimited.item_name,
+            'value': unlimited.value,
+            'is_infinity': True,
+        }
+    row = session.execute(
+        text(
+            'DELETE FROM item_values WHERE id = ('
+            'SELECT id FROM item_values WHERE item_name = :item_name AND is_infinity = 0 '
+            'ORDER BY id LIMIT 1'
+            ') RETURNING id, item_name, value, is_infinity'
+        ),
+        {'item_name': item_name},
+    ).first()
+    if row is None:
+        return None
+    return {
+        'id': row.id,
+        'item_name': row.item_name,
+        'value': row.value,
+        'is_infinity': bool(row.is_infinity),
+    }
 
 
 def delete_promocode(code: str) -> None:
@@ -125,3 +180,11 @@ def delete_media_asset(asset_id: int) -> None:
     session = Database().session
     session.query(MediaAsset).filter(MediaAsset.id == asset_id).delete()
     session.commit()
+
+
+def delete_uploaded_file_id(content_hash: str, kind: str) -> None:
+    session = Database().session
+    session.query(UploadedFile).filter(
+        UploadedFile.content_hash == content_hash, UploadedFile.kind == kind
+    ).delete()
+    session.commit()
@@ -1,4 +1,5 @@
 import datetime
+import json
 
 import sqlalchemy
 from sqlalchemy import exc, func
@@ -6,6 +7,12 @@ from sqlalchemy import exc, func
 from bot.database.models import (
     Achievement,
     BoughtGoods,
+    BroadcastCampaign,
+    ConversationState,
+    FsmRecord,
+    IpnEvent,
+    ScheduledJob,
+    UploadedFile,
     Categories,
     City,
     Database,
@@ -23,12 +30,21 @@ from bot.database.models import (
     ManualPayment,
     MediaAsset,
     Role,
+    SalesRollup,
     StockNotification,
     UnfinishedOperations,
     User,
     UserAchievement,
     UserProfile,
 )
+from bot.database.catalog import catalog
+from bot.misc.dates import SQLITE_LOCAL_MODIFIER, local_day_bounds, local_today
+
+
+def _local_day(column, date: str):
+    """Indexable range predicate matching ``column`` against a shop-local ``YYYY-MM-DD`` day."""
+    start, end = local_day_bounds(datetime.date.fromisoformat(date))
+    return sqlalchemy.and_(column >= start, column < end)
 
 
 def check_user(telegram_id: int) -> User | None:
@@ -64,13 +80,8 @@ def get_role_id_by_name(role_name: str) -> int | None:
 
 def select_today_users(date: str) -> int | None:
     try:
-        date_obj = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-        start_of_day = datetime.datetime.combine(date_obj, datetime.time.min)
-        end_of_day = datetime.datetime.combine(date_obj, datetime.time.max)
-
         return Database().session.query(User).filter(
-            User.registration_date >= str(start_of_day),
-            User.registration_date <= str(end_of_day)
+            _local_day(User.registration_date, date)
         ).count()
     except exc.NoResultFound:
         return None
@@ -104,20 +115,12 @@ def is_reseller(user_id: int) -> bool:
 
 def item_in_stock(item_name: str) -> bool:
     """Return True if item has unlimited quantity or remaining stock."""
-    if check_value(item_name):
-        return True
-    return select_item_values_amount(item_name) > 0
+    return catalog.in_stock(item_name)
 
 
 def get_all_categories() -> list[str]:
     """Return categories that contain at least one item in stock."""
-    categories = [c[0] for c in Database().session.query(Categories.name)
-                  .filter(Categories.parent_name.is_(None)).all()]
-    result = []
-    for name in categories:
-        if get_all_items(name) or get_subcategories(name):
-            result.append(name)
-    return result
+    return [name for name in catalog.subcategories(None) if catalog.has_stock(name)]
 
 
 def get_all_category_names() -> list[str]:
@@ -133,13 +136,7 @@ def get_all_subcategories(parent_name: str) -> list[str]:
 
 
 def get_subcategories(parent_name: str) -> list[str]:
-    subs = [c[0] for c in Database().session.query(Categories.name)
-            .filter(Categories.parent_name == parent_name).all()]
-    result = []
-    for sub in subs:
-        if get_all_items(sub) or get_subcategories(sub):
-            result.append(sub)
-    return result
+    return [sub for sub in catalog.subcategories(parent_name) if catalog.has_stock(sub)]
 
 
 def get_category_parent(category_name: str) -> str | None:
@@ -149,10 +146,7 @@ def get_category_parent(category_name: str) -> str | None:
 
 
 def get_all_items(category_name: str) -> list[str]:
-    items = [item[0] for item in
-             Database().session.query(Goods.name)
-             .filter(Goods.category_name == category_name).all()]
-    return [name for name in items if item_in_stock(name)]
+    return catalog.items_in_stock(category_name)
 
 
 def get_all_item_names(category_name: str) -> list[str]:
@@ -164,33 +158,16 @@ def get_all_item_names(category_name: str) -> list[str]:
 
 def get_out_of_stock_items(category_name: str) -> list[str]:
     """Return items in a category that currently have no stock."""
-    items = get_all_item_names(category_name)
-    result = []
-    for name in items:
-        if not item_in_stock(name):
-            result.append(name)
-    return result
+    return catalog.items_out_of_stock(category_name)
 
 
 def get_out_of_stock_categories() -> list[str]:
     """Return root categories containing any out-of-stock items."""
-    categories = [c[0] for c in Database().session.query(Categories.name)
-                  .filter(Categories.parent_name.is_(None)).all()]
-    result = []
-    for name in categories:
-        if get_out_of_stock_items(name) or get_out_of_stock_subcategories(name):
-            result.append(name)
-    return result
+    return [name for name in catalog.subcategories(None) if catalog.has_missing_stock(name)]
 
 
 def get_out_of_stock_subcategories(parent_name: str) -> list[str]:
-    subs = [c[0] for c in Database().session.query(Categories.name)
-            .filter(Categories.parent_name == parent_name).all()]
-    result = []
-    for sub in subs:
-        if get_out_of_stock_items(sub) or get_out_of_stock_subcategories(sub):
-            result.append(sub)
-    return result
+    return [sub for sub in catalog.subcategories(parent_name) if catalog.has_missing_stock(sub)]
 
 
 def get_bought_item_info(item_id: str) -> dict | None:
@@ -316,16 +293,7 @@ def select_item_values_amount(item_name: str) -> int:
 
 
 def check_value(item_name: str) -> bool | None:
-    try:
-        result = False
-        values = select_item_values_amount(item_name)
-        for i in range(values):
-            is_inf = Database().session.query(ItemValues).filter(ItemValues.item_name == item_name).first()
-            if is_inf and is_inf.is_infinity:
-                result = True
-    except exc.NoResultFound:
-        return False
-    return result
+    return catalog.is_infinite(item_name)
 
 
 def has_stock_notification(user_id: int, item_name: str) -> bool:
@@ -411,13 +379,14 @@ def bought_items_list(buyer_id: int) -> list[str]:
 
 
 def get_purchase_dates() -> list[str]:
-    return [d[0] for d in Database().session.query(func.date(BoughtGoods.bought_datetime)).distinct().all()]
+    local_date = func.date(BoughtGoods.bought_datetime, SQLITE_LOCAL_MODIFIER)
+    return [d[0] for d in Database().session.query(local_date).distinct().all()]
 
 
 def get_purchases_by_date(date: str) -> list[dict]:
     rows = (
         Database().session.query(BoughtGoods)
-        .filter(func.date(BoughtGoods.bought_datetime) == date)
+        .filter(_local_day(BoughtGoods.bought_datetime, date))
         .all()
     )
     return [r.__dict__ for r in rows]
@@ -445,16 +414,9 @@ def select_count_bought_items() -> int:
 
 def select_today_orders(date: str) -> int | None:
     try:
-        date_obj = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-        start_of_day = datetime.datetime.combine(date_obj, datetime.time.min)
-        end_of_day = datetime.datetime.combine(date_obj, datetime.time.max)
-
         return (
                 Database().session.query(func.sum(BoughtGoods.price))
-                .filter(
-                    func.date(BoughtGoods.bought_datetime) >= start_of_day.date(),
-                    func.date(BoughtGoods.bought_datetime) <= end_of_day.date()
-                )
+                .filter(_local_day(BoughtGoods.bought_datetime, date))
                 .scalar() or 0
         )
     except exc.NoResultFound:
@@ -467,16 +429,9 @@ def select_all_orders() -> float:
 
 def select_today_operations(date: str) -> int | None:
     try:
-        date_obj = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-        start_of_day = datetime.datetime.combine(date_obj, datetime.time.min)
-        end_of_day = datetime.datetime.combine(date_obj, datetime.time.max)
-
         return (
                 Database().session.query(func.sum(Operations.operation_value))
-                .filter(
-                    func.date(Operations.operation_time) >= start_of_day.date(),
-                    func.date(Operations.operation_time) <= end_of_day.date()
-                )
+                .filter(_local_day(Operations.operation_time, date))
                 .scalar() or 0
         )
     except exc.NoResultFound:
@@ -659,22 +614,20 @@ def get_product_metadata(item_name: str) -> dict | None:
 
 def get_sales_totals(days: int, bucket: str = 'day') -> list[dict]:
     session = Database().session
-    now = datetime.datetime.utcnow()
-    cutoff = now - datetime.timedelta(days=days)
-    cutoff_str = cutoff.strftime('%Y-%m-%d %H:%M:%S')
+    cutoff = local_today() - datetime.timedelta(days=days)
     if bucket == 'week':
-        group_expr = func.strftime('%Y-%W', BoughtGoods.bought_datetime)
+        group_expr = func.strftime('%Y-%W', SalesRollup.day)
     elif bucket == 'month':
-        group_expr = func.strftime('%Y-%m', BoughtGoods.bought_datetime)
+        group_expr = func.strftime('%Y-%m', SalesRollup.day)
     else:
-        group_expr = func.date(BoughtGoods.bought_datetime)
+        group_expr = func.strftime('%Y-%m-%d', SalesRollup.day)
     rows = (
         session.query(
             group_expr.label('period'),
-            func.coalesce(func.sum(BoughtGoods.price), 0).label('revenue'),
-            func.count(BoughtGoods.id).label('orders'),
+            func.coalesce(func.sum(SalesRollup.revenue), 0).label('revenue'),
+            func.coalesce(func.sum(SalesRollup.orders), 0).label('orders'),
         )
-        .filter(BoughtGoods.bought_datetime >= cutoff_str)
+        .filter(SalesRollup.day >= cutoff)
         .group_by('period')
         .order_by('period')
         .all()
@@ -691,54 +644,54 @@ def get_sales_totals(days: int, bucket: str = 'day') -> list[dict]:
 
 def get_total_revenue() -> int:
     session = Database().session
-    total = session.query(func.sum(BoughtGoods.price)).scalar()
+    total = session.query(func.sum(SalesRollup.revenue)).scalar()
     return int(total or 0)
 
 
-def get_sales_by_city() -> list[dict]:
-    session = Database().session
-    rows = (
-        session.query(
-            City.id,
-            City.name,
-            City.region,
-            func.coalesce(func.sum(BoughtGoods.price), 0).label('revenue'),
-            func.count(BoughtGoods.id).label('orders'),
+def _rollup_groups(key, limit: int | None = None) -> list:
+    """Sum the rollups by ``key``, biggest revenue first."""
+    query = (
+        Database().session.query(
+            key.label('key'),
+            func.sum(SalesRollup.revenue).label('revenue'),
+            func.sum(SalesRollup.orders).label('orders'),
         )
-        .join(UserProfile, UserProfile.city_id == City.id)
-        .join(BoughtGoods, BoughtGoods.buyer_id == UserProfile.user_id)
-        .group_by(City.id)
-        .order_by(func.sum(BoughtGoods.price).desc())
-        .all()
+        .group_by(key)
+        .order_by(func.sum(SalesRollup.revenue).desc())
     )
-    data = [
-        {
-            'city_id': row.id,
-            'city': row.name,
-            'region': row.region,
-            'revenue': int(row.revenue or 0),
-            'orders': row.orders,
-        }
-        for row in rows
-    ]
-    unknown = (
-        session.query(
-            func.coalesce(func.sum(BoughtGoods.price), 0).label('revenue'),
-            func.count(BoughtGoods.id).label('orders'),
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def get_sales_by_city() -> list[dict]:
+    session = Database().session
+    cities = {city.id: city for city in session.query(City).all()}
+    data = []
+    unknown_revenue = unknown_orders = 0
+    for row in _rollup_groups(SalesRollup.city_id):
+        city = cities.get(row.key)
+        if city is None:
+            unknown_revenue += int(row.revenue or 0)
+            unknown_orders += row.orders or 0
+            continue
+        data.append(
+            {
+                'city_id': city.id,
+                'city': city.name,
+                'region': city.region,
+                'revenue': int(row.revenue or 0),
+                'orders': row.orders,
+            }
         )
-        .outerjoin(UserProfile, UserProfile.user_id == BoughtGoods.buyer_id)
-        .filter(UserProfile.city_id.is_(None))
-        .one()
-    )
-    unknown_revenue = int(unknown.revenue or 0)
-    if unknown_revenue > 0 or unknown.orders > 0:
+    if unknown_revenue > 0 or unknown_orders > 0:
         data.append(
             {
                 'city_id': None,
                 'city': 'Unknown',
                 'region': None,
                 'revenue': unknown_revenue,
-                'orders': unknown.orders,
+                'orders': unknown_orders,
             }
         )
     return data
@@ -746,171 +699,210 @@ def get_sales_by_city() -> list[dict]:
 
 def get_sales_by_product_type() -> list[dict]:
     session = Database().session
-    rows = (
-        session.query(
-            ProductType.id,
-            ProductType.name,
-            func.coalesce(func.sum(BoughtGoods.price), 0).label('revenue'),
-            func.count(BoughtGoods.id).label('orders'),
-        )
-        .join(ProductMetadata, ProductMetadata.product_type_id == ProductType.id)
-        .join(BoughtGoods, BoughtGoods.item_name == ProductMetadata.item_name)
-        .group_by(ProductType.id)
-        .order_by(func.sum(BoughtGoods.price).desc())
-        .all()
-    )
-    data = [
-        {
-            'product_type_id': row.id,
-            'product_type': row.name,
-            'revenue': int(row.revenue or 0),
-            'orders': row.orders,
-        }
-        for row in rows
-    ]
-    unknown = (
-        session.query(
-            func.coalesce(func.sum(BoughtGoods.price), 0).label('revenue'),
-            func.count(BoughtGoods.id).label('orders'),
+    types = {row.id: row.name for row in session.query(ProductType.id, ProductType.name).all()}
+    data = []
+    unknown_revenue = unknown_orders = 0
+    for row in _rollup_groups(SalesRollup.product_type_id):
+        if row.key not in types:
+            unknown_revenue += int(row.revenue or 0)
+            unknown_orders += row.orders or 0
+            continue
+        data.append(
+            {
+                'product_type_id': row.key,
+                'product_type': types[row.key],
+                'revenue': int(row.revenue or 0),
+                'orders': row.orders,
+            }
         )
-        .outerjoin(ProductMetadata, ProductMetadata.item_name == BoughtGoods.item_name)
-        .filter(ProductMetadata.product_type_id.is_(None))
-        .one()
-    )
-    unknown_revenue = int(unknown.revenue or 0)
-    if unknown_revenue > 0 or unknown.orders > 0:
+    if unknown_revenue > 0 or unknown_orders > 0:
         data.append(
             {
                 'product_type_id': None,
                 'product_type': 'Uncategorized',
                 'revenue': unknown_revenue,
-                'orders': unknown.orders,
+                'orders': unknown_orders,
             }
         )
     return data
 
 
 def get_top_products(limit: int = 5) -> list[dict]:
-    session = Database().session
-    rows = (
-        session.query(
-            BoughtGoods.item_name,
-            func.count(BoughtGoods.id).label('orders'),
-            func.coalesce(func.sum(BoughtGoods.price), 0).label('revenue'),
-        )
-        .group_by(BoughtGoods.item_name)
-        .order_by(func.sum(BoughtGoods.price).desc())
-        .limit(limit)
-        .all()
-    )
     return [
         {
-            'item_name': row.item_name,
+            'item_name': row.key,
             'orders': row.orders,
             'revenue': int(row.revenue or 0),
         }
-        for row in rows
+        for row in _rollup_groups(SalesRollup.item_name, limit)
     ]
 
 
-def _is_active(profile_status: str | None, last_activity: str | None, last_purchase: str | None, threshold: datetime.date) -> bool:
-    if profile_status == 'inactive':
-        return False
-    if last_activity:
-        try:
-            last_dt = datetime.datetime.fromisoformat(last_activity)
-            if last_dt.date() >= threshold:
-                return True
-        except ValueError:
-            pass
-    if last_purchase:
-        try:
-            purchase_date = datetime.date.fromisoformat(last_purchase)
-            if purchase_date >= threshold:
-                return True
-        except ValueError:
-            pass
-    return False
+def _active_user_clause(threshold_days: int):
+    """Not marked inactive, and seen or bought something within the last ``threshold_days`` days."""
+    threshold = local_today() - datetime.timedelta(days=threshold_days)
+    # last_activity is stored in UTC since the "UTC DateTime timestamps" migration: start at the
+    # UTC instant the shop-local threshold day begins.
+    since, _ = local_day_bounds(threshold)
+    # Spelled out with IS NOT NULL so the clause is never NULL and can be negated.
+    return sqlalchemy.and_(
+        func.coalesce(UserProfile.status, 'active') != 'inactive',
+        sqlalchemy.or_(
+            sqlalchemy.and_(UserProfile.last_activity.isnot(None), UserProfile.last_activity >= since),
+            sqlalchemy.and_(User.last_purchase_date.isnot(None), User.last_purchase_date >= threshold),
+        ),
+    )
+
+
+def _segment_clause(segment: str, value=None, threshold_days: int = 30):
+    if segment == 'active':
+        return _active_user_clause(threshold_days)
+    if segment == 'inactive':
+        return sqlalchemy.not_(_active_user_clause(threshold_days))
+    if segment == 'no_activity':
+        return sqlalchemy.and_(UserProfile.last_activity.is_(None), User.last_purchase_date.is_(None))
+    if segment == 'resellers':
+        return User.telegram_id.in_(sqlalchemy.select(Reseller.user_id))
+    if segment == 'city' and value is not None:
+        return UserProfile.city_id == int(value)
+    if segment == 'region' and value:
+        return UserProfile.city_id.in_(sqlalchemy.select(City.id).where(City.region == str(value)))
+    return sqlalchemy.true()
 
 
 def get_user_activity_counts(threshold_days: int = 30) -> dict[str, int]:
-    session = Database().session
-    rows = (
-        session.query(
-            User.telegram_id,
-            User.last_purchase_date,
-            UserProfile.status,
-            UserProfile.last_activity,
+    total, active = (
+        Database().session.query(
+            func.count(User.telegram_id),
+            func.coalesce(func.sum(sqlalchemy.case((_active_user_clause(threshold_days), 1), else_=0)), 0),
         )
         .outerjoin(UserProfile, UserProfile.user_id == User.telegram_id)
-        .all()
+        .one()
     )
-    threshold = datetime.date.today() - datetime.timedelta(days=threshold_days)
-    active = 0
-    inactive = 0
-    for row in rows:
-        if _is_active(row.status, row.last_activity, row.last_purchase_date, threshold):
-            active += 1
-        else:
-            inactive += 1
-    return {'active': active, 'inactive': inactive}
-
-
-def get_user_ids_by_status(active: bool, threshold_days: int = 30) -> list[int]:
-    session = Database().session
-    rows = (
-        session.query(
-            User.telegram_id,
-            User.last_purchase_date,
-            UserProfile.status,
-            UserProfile.last_activity,
-        )
+    return {'active': active, 'inactive': total - active}
+
+
+def count_segment_users(segment: str, value=None, threshold_days: int = 30) -> int:
+    return (
+        Database().session.query(func.count(User.telegram_id))
         .outerjoin(UserProfile, UserProfile.user_id == User.telegram_id)
-        .all()
+        .filter(_segment_clause(segment, value, threshold_days))
+        .scalar()
     )
-    threshold = datetime.date.today() - datetime.timedelta(days=threshold_days)
-    result = []
-    for row in rows:
-        is_active = _is_active(row.status, row.last_activity, row.last_purchase_date, threshold)
-        if is_active == active:
-            result.append(row.telegram_id)
-    return result
 
 
-def get_user_ids_by_city(city_id: int) -> list[int]:
-    session = Database().session
-    return [
-        row[0]
-        for row in session.query(UserProfile.user_id).filter(UserProfile.city_id == city_id).all()
-    ]
+def get_segment_user_ids_page(segment: str, value=None, after_id: int | None = None,
+                              limit: int = 500, threshold_days: int = 30) -> list[int]:
+    """Return up to ``limit`` ids of a user segment greater than ``after_id``, ascending."""
+    query = (
+        Database().session.query(User.telegram_id)
+        .outerjoin(UserProfile, UserProfile.user_id == User.telegram_id)
+        .filter(_segment_clause(segment, value, threshold_days))
+    )
+    if after_id is not None:
+        query = query.filter(User.telegram_id > after_id)
+    ids = [row[0] for row in query.order_by(User.telegram_id).limit(limit).all()]
+    # Do not hold a read snapshot while the caller works through the page.
+    Database().session.commit()
+    return ids
 
 
-def get_user_ids_by_region(region: str) -> list[int]:
-    session = Database().session
-    return [
-        row[0]
-        for row in (
-            session.query(UserProfile.user_id)
-            .join(City, City.id == UserProfile.city_id)
-            .filter(City.region == region)
-            .all()
-        )
-    ]
+def iter_segment_user_ids(segment: str, value=None, after_id: int | None = None,
+                          batch_size: int = 500, threshold_days: int = 30):
+    """Yield ids of a user segment in ascending batches, paging on ``telegram_id``."""
+    while True:
+        batch = get_segment_user_ids_page(segment, value, after_id, batch_size, threshold_days)
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1]
 
 
-def get_all_user_ids() -> list[int]:
-    return [row[0] for row in Database().session.query(User.telegram_id).all()]
+def get_broadcast_campaign(campaign_id: int) -> BroadcastCampaign | None:
+    return Database().session.query(BroadcastCampaign).filter(BroadcastCampaign.id == campaign_id).first()
 
 
-def get_user_ids_without_activity() -> list[int]:
-    session = Database().session
-    rows = (
-        session.query(User.telegram_id)
-        .outerjoin(UserProfile, UserProfile.user_id == User.telegram_id)
-        .filter(
-            (UserProfile.last_activity.is_(None))
-            & (User.last_purchase_date.is_(None))
-        )
-        .all()
-    )
-    return [row[0] for row in rows]
+def get_running_broadcast_campaigns() -> list[BroadcastCampaign]:
+    return Database().session.query(BroadcastCampaign).filter(
+        BroadcastCampaign.status == 'running'
+    ).order_by(BroadcastCampaign.id).all()
+
+
+def get_uploaded_file_id(content_hash: str, kind: str) -> str | None:
+    return Database().session.query(UploadedFile.file_id).filter(
+        UploadedFile.content_hash == content_hash, UploadedFile.kind == kind
+    ).scalar()
+
+
+def get_pending_job_times() -> list[tuple[int, datetime.datetime]]:
+    """Return ``(id, run_at)`` of every pending scheduled job."""
+    rows = Database().session.query(ScheduledJob.id, ScheduledJob.run_at).filter(
+        ScheduledJob.status == 'pending'
+    ).all()
+    return [(job_id, run_at) for job_id, run_at in rows]
+
+
+def get_conversation_state() -> list[tuple[str, str, float]]:
+    """Return live persisted state entries as ``(key, value, expires_at)`` with a Unix timestamp."""
+    rows = Database().session.query(
+        ConversationState.key, ConversationState.value, ConversationState.expires_at
+    ).filter(ConversationState.expires_at > datetime.datetime.utcnow()).all()
+    epoch = datetime.datetime(1970, 1, 1)
+    return [(key, value, (expires_at - epoch).total_seconds()) for key, value, expires_at in rows]
+
+
+def get_fsm_record(chat: int, user: int) -> dict | None:
+    record = Database().session.query(FsmRecord).filter(FsmRecord.chat == chat, FsmRecord.user == user).first()
+    if record is None:
+        return None
+    return {
+        'state': record.state,
+        'data': json.loads(record.data),
+        'bucket': json.loads(record.bucket),
+        'version': record.version,
+    }
+
+
+def get_fsm_version(chat: int, user: int) -> int:
+    """Write stamp of a saved FSM record; 0 when there is none."""
+    return Database().session.query(FsmRecord.version).filter(
+        FsmRecord.chat == chat, FsmRecord.user == user
+    ).scalar() or 0
+
+
+def get_pending_ipn_event_ids(limit: int) -> list[int]:
+    return [event_id for event_id, in Database().session.query(IpnEvent.id).filter(
+        IpnEvent.state == 'pending'
+    ).order_by(IpnEvent.id).limit(limit)]
+
+
+def count_failed_ipn_events() -> int:
+    return Database().session.query(func.count(IpnEvent.id)).filter(IpnEvent.state == 'failed').scalar()
+
+
+def get_open_operations() -> list[dict]:
+    """Return every unfinished payment operation; ``reserved`` marks a purchase holding an active reservation."""
+    rows = Database().session.query(
+        UnfinishedOperations.operation_id,
+        UnfinishedOperations.user_id,
+        UnfinishedOperations.operation_value,
+        UnfinishedOperations.message_id,
+        UnfinishedOperations.created_at,
+        Reservation.id,
+    ).outerjoin(
+        Reservation,
+        sqlalchemy.and_(
+            Reservation.operation_id == UnfinishedOperations.operation_id, Reservation.status == 'active'
+        ),
+    ).all()
+    return [
+        {
+            'operation_id': operation_id,
+            'user_id': user_id,
+            'value': value,
+            'message_id': message_id,
+            'created_at': created_at,
+            'reserved': reservation_id is not None,
+        }
+        for operation_id, user_id, value, message_id, created_at, reservation_id in rows
+    ]
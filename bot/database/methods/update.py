@@ -1,6 +1,10 @@
 import datetime
+import json
+import time
+from collections import Counter
 
-import datetime
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from bot.database.models import (
     User,
@@ -19,22 +23,96 @@ from bot.database.models import (
     Reservation,
     ManualPayment,
     MediaAsset,
+    BroadcastCampaign,
+    ConversationState,
+    FsmRecord,
+    IpnEvent,
+    Operations,
+    UnfinishedOperations,
+    ScheduledJob,
 )
 from bot.database import Database
+from bot.database.catalog import catalog
+from bot.database.stats import shop_stats
+from bot.misc.dates import local_today
 
 
 def set_role(telegram_id: str, role: int) -> None:
     Database().session.query(User).filter(User.telegram_id == telegram_id).update(
         values={User.role_id: role})
     Database().session.commit()
-
-
-def update_balance(telegram_id: int | str, summ: int) -> None:
-    old_balance = User.balance
-    new_balance = old_balance + summ
-    Database().session.query(User).filter(User.telegram_id == telegram_id).update(
-        values={User.balance: new_balance})
-    Database().session.commit()
+    shop_stats.invalidate()
+
+
+def debit_in_transaction(session, telegram_id: int | str, amount: int) -> int | None:
+    """Take ``amount`` from the balance inside the caller's transaction if it covers it."""
+    return session.execute(
+        text('UPDATE users SET balance = balance - :amount '
+             'WHERE telegram_id = :telegram_id AND balance >= :amount '
+             'RETURNING balance'),
+        {'telegram_id': telegram_id, 'amount': amount},
+    ).scalar()
+
+
+def credit_in_transaction(session, telegram_id: int | str, amount: int) -> int | None:
+    """Add ``amount`` to the balance inside the caller's transaction."""
+    return session.execute(
+        text('UPDATE users SET balance = balance + :amount '
+             'WHERE telegram_id = :telegram_id '
+             'RETURNING balance'),
+        {'telegram_id': telegram_id, 'amount': amount},
+    ).scalar()
+
+
+def debit_if_sufficient(telegram_id: int | str, amount: int) -> int | None:
+    """Take ``amount`` from the balance only if it covers it; return the new balance or None."""
+    with Database().transaction() as session:
+        balance = debit_in_transaction(session, telegram_id, amount)
+    if balance is not None:
+        shop_stats.balance_changed(-amount)
+    return balance
+
+
+def top_up_in_transaction(session, operation_id: str) -> tuple[int, int, int | None] | None:
+    """Close an open top-up and credit it inside the caller's transaction.
+
+    Returns ``(user_id, value, message_id)``, or None when the operation is no
+    longer open (already completed or cancelled), so it is credited once.
+    """
+    row = session.execute(
+        text('DELETE FROM unfinished_operations WHERE operation_id = :operation_id '
+             'RETURNING user_id, operation_value, message_id'),
+        {'operation_id': operation_id},
+    ).first()
+    if row is None:
+        return None
+    user_id, value, message_id = row
+    session.add(Operations(user_id=user_id, operation_value=value, operation_time=datetime.datetime.utcnow()))
+    credit_in_transaction(session, user_id, value)
+    return user_id, value, message_id
+
+
+def complete_top_ups(operation_ids: list[str]) -> list[tuple[int, int, int | None]]:
+    """Close and credit open top-ups in one transaction; see ``top_up_in_transaction``."""
+    credited = []
+    with Database().transaction() as session:
+        for operation_id in operation_ids:
+            completed = top_up_in_transaction(session, operation_id)
+            if completed:
+                credited.append(completed)
+    for _, value, _ in credited:
+        shop_stats.top_up_recorded(value)
+        shop_stats.balance_changed(value)
+    return credited
+
+
+def credit_balance(telegram_id: int | str, amount: int) -> int | None:
+    """Add ``amount`` to the balance and return the new balance (None for an unknown user)."""
+    with Database().transaction() as session:
+        balance = credit_in_transaction(session, telegram_id, amount)
+    if balance is not None:
+        shop_stats.balance_changed(amount)
+    return balance
 
 
 def update_user_language(telegram_id: int, language: str) -> None:
@@ -54,15 +132,6 @@ def reset_lottery_tickets() -> None:
     Database().session.commit()
 
 
-def buy_item_for_balance(telegram_id: str, summ: int) -> int:
-    old_balance = User.balance
-    new_balance = old_balance - summ
-    Database().session.query(User).filter(User.telegram_id == telegram_id).update(
-        values={User.balance: new_balance})
-    Database().session.commit()
-    return Database().session.query(User.balance).filter(User.telegram_id == telegram_id).one()[0]
-
-
 def update_item(item_name: str, new_name: str, new_description: str, new_price: int,
                 new_category_name: str, new_delivery_description: str | None) -> None:
     Database().session.query(ItemValues).filter(ItemValues.item_name == item_name).update(
@@ -76,6 +145,7 @@ def update_item(item_name: str, new_name: str, new_description: str, new_price:
                 Goods.delivery_description: new_delivery_description}
     )
     Database().session.commit()
+    catalog.invalidate()
 
 
 def update_category(category_name: str, new_name: str) -> None:
@@ -84,6 +154,7 @@ def update_category(category_name: str, new_name: str) -> None:
     Database().session.query(Categories).filter(Categories.name == category_name).update(
         values={Categories.name: new_name})
     Database().session.commit()
+    catalog.invalidate()
 
 
 def update_promocode(code: str, discount: int | None = None, expires_at: str | None = None) -> None:
@@ -121,16 +192,21 @@ def clear_stock_notifications(item_name: str) -> None:
 def process_purchase_streak(telegram_id: int) -> None:
     """Update streak data after a successful purchase."""
     session = Database().session
+    advance_purchase_streak(session, telegram_id)
+    session.commit()
+
+
+def advance_purchase_streak(session, telegram_id: int) -> None:
+    """Update streak data inside the caller's transaction."""
     user = session.query(User).filter(User.telegram_id == telegram_id).one()
-    today = datetime.date.today()
+    today = local_today()
 
     if user.streak_discount:
         user.streak_discount = False
         user.purchase_streak = 0
 
     if user.last_purchase_date:
-        last_date = datetime.date.fromisoformat(user.last_purchase_date)
-        diff = (today - last_date).days
+        diff = (today - user.last_purchase_date).days
         if diff == 1:
             user.purchase_streak += 1
         elif diff > 1:
@@ -138,21 +214,19 @@ def process_purchase_streak(telegram_id: int) -> None:
     else:
         user.purchase_streak = 1
 
-    user.last_purchase_date = today.isoformat()
+    user.last_purchase_date = today
 
     if user.purchase_streak >= 3:
         user.purchase_streak = 0
         user.streak_discount = True
 
-    session.commit()
-
 
 def update_user_profile(
     user_id: int,
     city_id: int | None = None,
     district_id: int | None = None,
     status: str | None = None,
-    last_activity: str | None = None,
+    last_activity: datetime.datetime | None = None,
 ) -> None:
     session = Database().session
     profile = session.query(UserProfile).filter(UserProfile.user_id == user_id).first()
@@ -242,7 +316,7 @@ def update_review_status(review_id: int, status: str, moderator_id: int | None =
     review.status = status
     if moderator_id is not None:
         review.moderated_by = moderator_id
-        review.moderated_at = datetime.datetime.utcnow().isoformat()
+        review.moderated_at = datetime.datetime.utcnow()
     session.commit()
 
 
@@ -251,7 +325,8 @@ def release_reservation(reservation_id: int) -> None:
     reservation = session.query(Reservation).filter(Reservation.id == reservation_id).first()
     if reservation is None:
         return
-    if reservation.status == 'active' and not reservation.is_infinity and reservation.item_value:
+    restocked = reservation.status == 'active' and not reservation.is_infinity and reservation.item_value
+    if restocked:
         session.add(
             ItemValues(
                 name=reservation.item_name,
@@ -260,8 +335,83 @@ def release_reservation(reservation_id: int) -> None:
             )
         )
     reservation.status = 'released'
-    reservation.released_at = datetime.datetime.utcnow().isoformat()
+    reservation.released_at = datetime.datetime.utcnow()
+    item_name = reservation.item_name
     session.commit()
+    if restocked:
+        catalog.stock_added(item_name)
+
+
+def _release_reservations(session, *criteria, limit: int | None = None) -> tuple[list[str], list[str], int]:
+    """Release the active reservations matching ``criteria`` inside the caller's transaction.
+
+    Returns the names of restocked units (one per unit), the items among them
+    that were out of stock, and how many reservations were released.
+    """
+    query = session.query(
+        Reservation.id, Reservation.item_name, Reservation.item_value, Reservation.is_infinity
+    ).filter(Reservation.status == 'active', *criteria).order_by(Reservation.expires_at)
+    if limit is not None:
+        query = query.limit(limit)
+    released = query.all()
+    if not released:
+        return [], [], 0
+    units = [(name, value) for _, name, value, is_infinity in released if value and not is_infinity]
+    names = {name for name, _ in units}
+    in_stock = {
+        name for name, in session.query(ItemValues.item_name).filter(
+            ItemValues.item_name.in_(list(names))
+        ).distinct()
+    }
+    session.bulk_insert_mappings(
+        ItemValues, [{'item_name': name, 'value': value, 'is_infinity': False} for name, value in units]
+    )
+    session.query(Reservation).filter(Reservation.id.in_([row.id for row in released])).update(
+        {Reservation.status: 'released', Reservation.released_at: datetime.datetime.utcnow()},
+        synchronize_session=False,
+    )
+    return [name for name, _ in units], sorted(names - in_stock), len(released)
+
+
+def release_operation_reservation(session, operation_id: str) -> tuple[list[str], list[str]]:
+    """Put the operation's reservation back on sale inside the caller's transaction, if it is still active.
+
+    Returns the restocked unit names and the items that were out of stock.
+    """
+    units, restocked, _ = _release_reservations(session, Reservation.operation_id == operation_id)
+    return units, restocked
+
+
+def release_expired_reservations(expired_before: datetime.datetime, limit: int = 500) -> tuple[list[str], int]:
+    """Release up to ``limit`` active reservations that expired before ``expired_before``.
+
+    Their stock units go back to ``item_values`` and the reservations are marked
+    released in one transaction. Returns the names of items that were out of
+    stock and have units again (for restock notifications) and how many
+    reservations were released.
+    """
+    with Database().transaction() as session:
+        units, restocked, count = _release_reservations(
+            session, Reservation.expires_at < expired_before, limit=limit
+        )
+    for name, amount in Counter(units).items():
+        catalog.stock_added(name, amount)
+    return restocked, count
+
+
+def expire_operations(operation_ids: list[str]) -> list[str]:
+    """Cancel unpaid operations and release their reservations in one transaction.
+
+    Returns the names of items that were out of stock and have units again.
+    """
+    with Database().transaction() as session:
+        session.query(UnfinishedOperations).filter(
+            UnfinishedOperations.operation_id.in_(operation_ids)
+        ).delete(synchronize_session=False)
+        units, restocked, _ = _release_reservations(session, Reservation.operation_id.in_(operation_ids))
+    for name, amount in Counter(units).items():
+        catalog.stock_added(name, amount)
+    return restocked
 
 
 def complete_reservation(reservation_id: int) -> None:
@@ -270,7 +420,7 @@ def complete_reservation(reservation_id: int) -> None:
     if reservation is None:
         return
     reservation.status = 'completed'
-    reservation.released_at = datetime.datetime.utcnow().isoformat()
+    reservation.released_at = datetime.datetime.utcnow()
     session.commit()
 
 
@@ -309,3 +459,180 @@ def update_media_asset_title(asset_id: int, title: str | None = None, caption: s
         return
     Database().session.query(MediaAsset).filter(MediaAsset.id == asset_id).update(values)
     Database().session.commit()
+
+
+def update_broadcast_progress(campaign_id: int, cursor: int | None, sent: int, failed: int, blocked: int) -> None:
+    Database().session.query(BroadcastCampaign).filter(BroadcastCampaign.id == campaign_id).update(
+        {
+            BroadcastCampaign.cursor: cursor,
+            BroadcastCampaign.sent: sent,
+            BroadcastCampaign.failed: failed,
+            BroadcastCampaign.blocked: blocked,
+        }
+    )
+    Database().session.commit()
+
+
+def finish_broadcast_campaign(campaign_id: int, status: str = 'completed') -> None:
+    Database().session.query(BroadcastCampaign).filter(BroadcastCampaign.id == campaign_id).update(
+        {BroadcastCampaign.status: status, BroadcastCampaign.finished_at: datetime.datetime.utcnow()}
+    )
+    Database().session.commit()
+
+
+def finish_jobs(job_ids: list[int], status: str = 'done') -> None:
+    if not job_ids:
+        return
+    Database().session.query(ScheduledJob).filter(ScheduledJob.id.in_(job_ids)).update(
+        {ScheduledJob.status: status}, synchronize_session=False
+    )
+    Database().session.commit()
+
+
+def claim_jobs(job_ids: list[int], now: datetime.datetime, lease_until: datetime.datetime) -> list[dict]:
+    """Claim the due pending jobs among ``job_ids`` by moving their ``run_at`` to ``lease_until``.
+
+    Only one process gets each row. A job whose claimant dies before finishing
+    it is due again, and claimable, once the lease has passed.
+    """
+    if not job_ids:
+        return []
+    statement = text(
+        'UPDATE scheduled_jobs SET run_at = :lease_until '
+        "WHERE id IN :job_ids AND status = 'pending' AND run_at <= :now "
+        'RETURNING id, kind, payload, attempts'
+    ).bindparams(
+        bindparam('job_ids', expanding=True),
+        bindparam('now', type_=DateTime),
+        bindparam('lease_until', type_=DateTime),
+    )
+    with Database().transaction() as session:
+        rows = session.execute(statement, {'job_ids': job_ids, 'now': now, 'lease_until': lease_until}).all()
+    return [
+        {'id': job_id, 'kind': kind, 'payload': json.loads(payload), 'attempts': attempts}
+        for job_id, kind, payload, attempts in rows
+    ]
+
+
+def reschedule_job(job_id: int, run_at: datetime.datetime) -> None:
+    Database().session.query(ScheduledJob).filter(ScheduledJob.id == job_id).update(
+        {ScheduledJob.run_at: run_at, ScheduledJob.attempts: ScheduledJob.attempts + 1},
+        synchronize_session=False,
+    )
+    Database().session.commit()
+
+
+def save_conversation_state(upserts: list[tuple[str, str, float]], deleted: list[str]) -> None:
+    """Write state changes and drop expired entries in one transaction."""
+    now = datetime.datetime.utcnow()
+    with Database().transaction() as session:
+        if deleted:
+            session.query(ConversationState).filter(ConversationState.key.in_(deleted)).delete(
+                synchronize_session=False
+            )
+        if upserts:
+            statement = sqlite_insert(ConversationState)
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[ConversationState.key],
+                    set_={'value': statement.excluded.value, 'expires_at': statement.excluded.expires_at},
+                ),
+                [
+                    {'key': key, 'value': value, 'expires_at': datetime.datetime.utcfromtimestamp(expires_at)}
+                    for key, value, expires_at in upserts
+                ],
+            )
+        session.query(ConversationState).filter(ConversationState.expires_at <= now).delete(
+            synchronize_session=False
+        )
+
+
+def save_fsm_records(records: dict[tuple[int, int], dict]) -> dict[tuple[int, int], int]:
+    """Upsert FSM records keyed by ``(chat, user)``; empty records are deleted.
+
+    Every saved row gets a fresh write stamp, returned per key (0 for deleted
+    records), so a cached copy can be revalidated with ``get_fsm_version``.
+    """
+    version = time.time_ns()
+    rows, empty = [], []
+    for (chat, user), record in records.items():
+        if record['state'] is None and not record['data'] and not record['bucket']:
+            empty.append((chat, user))
+        else:
+            rows.append({
+                'chat': chat,
+                'user': user,
+                'state': record['state'],
+                'data': json.dumps(record['data'], default=str),
+                'bucket': json.dumps(record['bucket'], default=str),
+                'version': version,
+            })
+    with Database().transaction() as session:
+        for chat, user in empty:
+            session.query(FsmRecord).filter(FsmRecord.chat == chat, FsmRecord.user == user).delete(
+                synchronize_session=False
+            )
+        if rows:
+            statement = sqlite_insert(FsmRecord)
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[FsmRecord.chat, FsmRecord.user],
+                    set_={
+                        'state': statement.excluded.state,
+                        'data': statement.excluded.data,
+                        'bucket': statement.excluded.bucket,
+                        'version': statement.excluded.version,
+                    },
+                ),
+                rows,
+            )
+    return {key: 0 if key in empty else version for key in records}
+
+
+def apply_ipn_events(event_ids: list[int], paid_statuses: tuple[str, ...]) -> list[tuple[int, int, int | None]]:
+    """Apply pending IPN events and mark them done in the same transaction.
+
+    A paid status completes the payment's open top-up; anything else, or a
+    top-up that is no longer open, is only marked done. Returns the
+    ``(user_id, value, message_id)`` of every top-up credited.
+    """
+    credited = []
+    with Database().transaction() as session:
+        events = session.query(IpnEvent.id, IpnEvent.payment_id, IpnEvent.status).filter(
+            IpnEvent.id.in_(event_ids), IpnEvent.state == 'pending'
+        ).order_by(IpnEvent.id).all()
+        for event in events:
+            if event.status in paid_statuses:
+                completed = top_up_in_transaction(session, event.payment_id)
+                if completed:
+                    credited.append(completed)
+        session.query(IpnEvent).filter(IpnEvent.id.in_([event.id for event in events])).update(
+            {
+                IpnEvent.state: 'done',
+                IpnEvent.processed_at: datetime.datetime.utcnow(),
+                IpnEvent.attempts: IpnEvent.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+    for _, value, _ in credited:
+        shop_stats.top_up_recorded(value)
+        shop_stats.balance_changed(value)
+    return credited
+
+
+def fail_ipn_event(event_id: int, error: str) -> None:
+    Database().session.query(IpnEvent).filter(IpnEvent.id == event_id).update(
+        {IpnEvent.state: 'failed', IpnEvent.error: error, IpnEvent.attempts: IpnEvent.attempts + 1},
+        synchronize_session=False,
+    )
+    Database().session.commit()
+
+
+def requeue_failed_ipn_events(event_id: int | None = None) -> int:
+    """Queue failed IPN events (or just ``event_id``) for another attempt; return how many."""
+    query = Database().session.query(IpnEvent).filter(IpnEvent.state == 'failed')
+    if event_id is not None:
+        query = query.filter(IpnEvent.id == event_id)
+    count = query.update({IpnEvent.state: 'pending', IpnEvent.error: None}, synchronize_session=False)
+    Database().session.commit()
+    return count
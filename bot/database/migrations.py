@@ -0,0 +1,232 @@
+import datetime
+from typing import Callable, Sequence
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, Text, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from bot.logger_mesh import logger
+from bot.misc import EnvKeys
+
+
+def _has_column(op: Operations, table: str, column: str) -> bool:
+    return any(c['name'] == column for c in inspect(op.get_bind()).get_columns(table))
+
+
+def _add_column(op: Operations, table: str, column: Column) -> None:
+    if not _has_column(op, table, column.name):
+        op.add_column(table, column)
+
+
+def _create_index(op: Operations, name: str, table: str, columns: Sequence[str]) -> None:
+    if name not in {ix['name'] for ix in inspect(op.get_bind()).get_indexes(table)}:
+        op.create_index(name, table, list(columns))
+
+
+def _hot_lookup_indexes(op: Operations) -> None:
+    indexes = (
+        ('ix_item_values_item_name', 'item_values', ('item_name',)),
+        ('ix_bought_goods_buyer_id', 'bought_goods', ('buyer_id',)),
+        ('ix_bought_goods_bought_datetime', 'bought_goods', ('bought_datetime',)),
+        ('ix_unfinished_operations_operation_id', 'unfinished_operations', ('operation_id',)),
+        ('ix_unfinished_operations_user_id', 'unfinished_operations', ('user_id',)),
+        ('ix_stock_notifications_item_name', 'stock_notifications', ('item_name',)),
+        ('ix_user_achievements_user_code', 'user_achievements', ('user_id', 'achievement_code')),
+        ('ix_reservations_status_reserved_at', 'reservations', ('status', 'reserved_at')),
+        ('ix_reviews_status_created_at', 'reviews', ('status', 'created_at')),
+        ('ix_categories_parent_name', 'categories', ('parent_name',)),
+        ('ix_goods_category_name', 'goods', ('category_name',)),
+    )
+    for name, table, columns in indexes:
+        _create_index(op, name, table, columns)
+    op.execute('ANALYZE')
+
+
+def _legacy_columns(op: Operations) -> None:
+    """Columns that used to be added by hand with fix_db.py."""
+    _add_column(op, 'unfinished_operations', Column('message_id', Integer, nullable=True))
+    _add_column(op, 'users', Column('lottery_tickets', Integer, nullable=False, server_default='0'))
+    _add_column(op, 'users', Column('purchase_streak', Integer, nullable=False, server_default='0'))
+    _add_column(op, 'users', Column('last_purchase_date', Text, nullable=True))
+    _add_column(op, 'users', Column('streak_discount', Boolean, nullable=False, server_default='0'))
+
+
+def _seed_achievements(op: Operations) -> None:
+    codes = (
+        'start', 'first_purchase', 'first_topup', 'first_blackjack', 'first_coinflip',
+        'gift_sent', 'first_referral', 'five_purchases', 'streak_three', 'ten_referrals',
+    )
+    for code in codes:
+        op.execute(text('INSERT OR IGNORE INTO achievements (code) VALUES (:code)').bindparams(code=code))
+
+
+def _nullable_reseller_id(op: Operations) -> None:
+    """Early versions declared reseller_prices.reseller_id NOT NULL; the table is rebuilt empty."""
+    from bot.database.main import Database
+
+    conn = op.get_bind()
+    for column in inspect(conn).get_columns('reseller_prices'):
+        if column['name'] == 'reseller_id' and not column['nullable']:
+            op.drop_table('reseller_prices')
+            Database.BASE.metadata.tables['reseller_prices'].create(conn)
+            break
+
+
+# Timestamp columns written with the server clock (datetime.now() / message.date) before everything
+# was stored in UTC. They are assumed to be LEGACY_UTC_OFFSET_HOURS (GMT+3 by default) ahead of UTC;
+# set it to the old server's offset before this migration runs if that was different.
+_LOCAL_TIMESTAMPS = (
+    ('users', 'registration_date'),
+    ('bought_goods', 'bought_datetime'),
+    ('operations', 'operation_time'),
+    ('user_achievements', 'achieved_at'),
+)
+_UTC_TIMESTAMPS = (
+    ('user_profiles', 'last_activity'),
+    ('reviews', 'created_at'),
+    ('reviews', 'moderated_at'),
+    ('reservations', 'reserved_at'),
+    ('reservations', 'expires_at'),
+    ('reservations', 'released_at'),
+    ('manual_payments', 'created_at'),
+    ('media_assets', 'created_at'),
+)
+
+
+def _to_storage_format(value: str, shift: datetime.timedelta) -> str | None:
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    else:
+        parsed -= shift
+    # SQLAlchemy's SQLite DateTime format, so stored values compare in chronological order.
+    return parsed.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _utc_timestamps(op: Operations) -> None:
+    """Rewrite the mixed-format timestamp strings as UTC in the DateTime storage format."""
+    conn = op.get_bind()
+    offset = datetime.timedelta(hours=float(EnvKeys.LEGACY_UTC_OFFSET_HOURS))
+    columns = [(table, column, offset) for table, column in _LOCAL_TIMESTAMPS]
+    columns += [(table, column, datetime.timedelta(0)) for table, column in _UTC_TIMESTAMPS]
+    for table, column, shift in columns:
+        rows = conn.exec_driver_sql(f'SELECT rowid, {column} FROM {table} WHERE {column} IS NOT NULL').all()
+        nullable = next(c['nullable'] for c in inspect(conn).get_columns(table) if c['name'] == column)
+        updates = []
+        for rowid, value in rows:
+            normalized = _to_storage_format(str(value), shift)
+            if normalized is None:
+                # Left in place it would make every query loading the row raise: drop it, or stop here.
+                if not nullable:
+                    raise ValueError(
+                        f'Unparseable {table}.{column} value {value!r} (rowid {rowid}); fix it and restart'
+                    )
+                logger.warning(f'Clearing unparseable {table}.{column} value {value!r} (rowid {rowid})')
+                updates.append({'rowid': rowid, 'value': None})
+            elif normalized != value:
+                updates.append({'rowid': rowid, 'value': normalized})
+        if updates:
+            conn.execute(text(f'UPDATE {table} SET {column} = :value WHERE rowid = :rowid'), updates)
+
+
+def _sales_rollups(op: Operations) -> None:
+    from bot.database.rollups import rebuild_sales_rollups
+
+    rebuild_sales_rollups(op.get_bind())
+
+
+def _activity_indexes(op: Operations) -> None:
+    _create_index(op, 'ix_users_last_purchase_date', 'users', ('last_purchase_date',))
+    _create_index(op, 'ix_user_profiles_last_activity', 'user_profiles', ('last_activity',))
+    _create_index(op, 'ix_user_profiles_city_id', 'user_profiles', ('city_id',))
+
+
+def _create_tables(op: Operations, *names: str) -> None:
+    from bot.database.main import Database
+
+    for name in names:
+        Database.BASE.metadata.tables[name].create(op.get_bind(), checkfirst=True)
+
+
+def _broadcast_campaigns(op: Operations) -> None:
+    _create_tables(op, 'broadcast_campaigns')
+
+
+def _uploaded_files(op: Operations) -> None:
+    _create_tables(op, 'uploaded_files')
+
+
+def _scheduled_jobs(op: Operations) -> None:
+    _create_tables(op, 'scheduled_jobs')
+
+
+def _reservation_expiry_index(op: Operations) -> None:
+    _create_index(op, 'ix_reservations_status_expires_at', 'reservations', ('status', 'expires_at'))
+
+
+def _conversation_state(op: Operations) -> None:
+    _create_tables(op, 'conversation_state')
+
+
+def _fsm_records(op: Operations) -> None:
+    _create_tables(op, 'fsm_records')
+
+
+def _ipn_events(op: Operations) -> None:
+    _create_tables(op, 'ipn_events')
+
+
+def _operation_created_at(op: Operations) -> None:
+    _add_column(op, 'unfinished_operations', Column('created_at', DateTime, nullable=True))
+    # Operations opened before the column existed get a full payment window from now on.
+    op.execute(
+        text('UPDATE unfinished_operations SET created_at = :now WHERE created_at IS NULL')
+        .bindparams(now=datetime.datetime.utcnow())
+    )
+
+
+def _fsm_version(op: Operations) -> None:
+    _add_column(op, 'fsm_records', Column('version', BigInteger, nullable=False, server_default='0'))
+
+
+# Ordered schema steps; the position in the list (1-based) is the version it brings the database to.
+# Every step must tolerate a schema that create_all() has already brought up to date.
+MIGRATIONS: list[tuple[str, Callable[[Operations], None]]] = [
+    ('hot lookup indexes', _hot_lookup_indexes),
+    ('legacy fix_db columns', _legacy_columns),
+    ('seed achievements', _seed_achievements),
+    ('nullable reseller_prices.reseller_id', _nullable_reseller_id),
+    ('UTC DateTime timestamps', _utc_timestamps),
+    ('backfill sales rollups', _sales_rollups),
+    ('user activity indexes', _activity_indexes),
+    ('broadcast campaigns', _broadcast_campaigns),
+    ('uploaded file ids', _uploaded_files),
+    ('scheduled jobs', _scheduled_jobs),
+    ('reservation expiry index', _reservation_expiry_index),
+    ('persisted conversation state', _conversation_state),
+    ('FSM storage', _fsm_records),
+    ('IPN inbox', _ipn_events),
+    ('unfinished_operations.created_at', _operation_created_at),
+    ('fsm_records.version', _fsm_version),
+]
+
+HEAD = len(MIGRATIONS)
+
+
+def current_version(conn: Connection) -> int:
+    return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def upgrade(engine: Engine) -> None:
+    """Apply pending migrations, recording the schema version in ``PRAGMA user_version``."""
+    with engine.begin() as conn:
+        version = current_version(conn)
+        op = Operations(MigrationContext.configure(conn))
+        for number, (description, step) in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f'Applying schema migration {number}: {description}')
+            step(op)
+            conn.exec_driver_sql(f'PRAGMA user_version = {number}')
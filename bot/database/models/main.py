@@ -8,9 +8,14 @@ from sqlalchemy import (
     Text,
     Boolean,
     VARCHAR,
-    inspect,
+    Date,
+    DateTime,
+    Index,
+    UniqueConstraint,
 )
 from bot.database.main import Database
+from bot.database.migrations import HEAD, current_version, upgrade
+from bot.logger_mesh import logger
 from sqlalchemy.orm import relationship
 
 
@@ -85,17 +90,18 @@ class Role(Database.BASE):
 
 class User(Database.BASE):
     __tablename__ = 'users'
+    __table_args__ = (Index('ix_users_last_purchase_date', 'last_purchase_date'),)
     telegram_id = Column(BigInteger, nullable=False, unique=True, primary_key=True)
     username = Column(String(64), nullable=True)
     role_id = Column(Integer, ForeignKey('roles.id'), default=1)
     balance = Column(BigInteger, nullable=False, default=0)
     lottery_tickets = Column(Integer, nullable=False, default=0)
     purchase_streak = Column(Integer, nullable=False, default=0)
-    last_purchase_date = Column(VARCHAR, nullable=True)
+    last_purchase_date = Column(Date, nullable=True)
     streak_discount = Column(Boolean, nullable=False, default=False)
     language = Column(String(5), nullable=True)
     referral_id = Column(BigInteger, nullable=True)
-    registration_date = Column(VARCHAR, nullable=False)
+    registration_date = Column(DateTime, nullable=False)
     user_operations = relationship("Operations", back_populates="user_telegram_id")
     user_unfinished_operations = relationship("UnfinishedOperations", back_populates="user_telegram_id")
     user_goods = relationship("BoughtGoods", back_populates="user_telegram_id")
@@ -104,7 +110,7 @@ class User(Database.BASE):
     def __init__(self, telegram_id: int, registration_date: datetime.datetime, balance: int = 0,
                  referral_id=None, role_id: int = 1, language: str | None = None,
                  username: str | None = None, purchase_streak: int = 0,
-                 last_purchase_date: str | None = None, streak_discount: bool = False):
+                 last_purchase_date: datetime.date | None = None, streak_discount: bool = False):
         self.telegram_id = telegram_id
         self.username = username
         self.role_id = role_id
@@ -119,6 +125,7 @@ class User(Database.BASE):
 
 class Categories(Database.BASE):
     __tablename__ = 'categories'
+    __table_args__ = (Index('ix_categories_parent_name', 'parent_name'),)
     name = Column(String(100), primary_key=True, unique=True, nullable=False)
     parent_name = Column(String(100), nullable=True)
     allow_discounts = Column(Boolean, nullable=False, default=True)
@@ -140,6 +147,7 @@ class Categories(Database.BASE):
 
 class Goods(Database.BASE):
     __tablename__ = 'goods'
+    __table_args__ = (Index('ix_goods_category_name', 'category_name'),)
     name = Column(String(100), nullable=False, unique=True, primary_key=True)
     price = Column(BigInteger, nullable=False)
     description = Column(Text, nullable=False)
@@ -159,6 +167,7 @@ class Goods(Database.BASE):
 
 class ItemValues(Database.BASE):
     __tablename__ = 'item_values'
+    __table_args__ = (Index('ix_item_values_item_name', 'item_name'),)
     id = Column(Integer, nullable=False, primary_key=True)
     item_name = Column(String(100), ForeignKey('goods.name'), nullable=False)
     value = Column(Text, nullable=True)
@@ -173,16 +182,20 @@ class ItemValues(Database.BASE):
 
 class BoughtGoods(Database.BASE):
     __tablename__ = 'bought_goods'
+    __table_args__ = (
+        Index('ix_bought_goods_buyer_id', 'buyer_id'),
+        Index('ix_bought_goods_bought_datetime', 'bought_datetime'),
+    )
     id = Column(Integer, nullable=False, primary_key=True)
     item_name = Column(String(100), nullable=False)
     value = Column(Text, nullable=False)
     price = Column(BigInteger, nullable=False)
     buyer_id = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
-    bought_datetime = Column(VARCHAR, nullable=False)
+    bought_datetime = Column(DateTime, nullable=False)
     unique_id = Column(BigInteger, nullable=False, unique=True)
     user_telegram_id = relationship("User", back_populates="user_goods")
 
-    def __init__(self, name: str, value: str, price: int, bought_datetime: str, unique_id,
+    def __init__(self, name: str, value: str, price: int, bought_datetime: datetime.datetime, unique_id,
                  buyer_id: int = 0):
         self.item_name = name
         self.value = value
@@ -197,10 +210,10 @@ class Operations(Database.BASE):
     id = Column(Integer, nullable=False, primary_key=True)
     user_id = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
     operation_value = Column(BigInteger, nullable=False)
-    operation_time = Column(VARCHAR, nullable=False)
+    operation_time = Column(DateTime, nullable=False)
     user_telegram_id = relationship("User", back_populates="user_operations")
 
-    def __init__(self, user_id: int, operation_value: int, operation_time: str):
+    def __init__(self, user_id: int, operation_value: int, operation_time: datetime.datetime):
         self.user_id = user_id
         self.operation_value = operation_value
         self.operation_time = operation_time
@@ -208,11 +221,16 @@ class Operations(Database.BASE):
 
 class UnfinishedOperations(Database.BASE):
     __tablename__ = 'unfinished_operations'
+    __table_args__ = (
+        Index('ix_unfinished_operations_operation_id', 'operation_id'),
+        Index('ix_unfinished_operations_user_id', 'user_id'),
+    )
     id = Column(Integer, nullable=False, primary_key=True)
     user_id = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
     operation_value = Column(BigInteger, nullable=False)
     operation_id = Column(String(500), nullable=False)
     message_id = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, nullable=True)
     user_telegram_id = relationship("User", back_populates="user_unfinished_operations")
 
     def __init__(self, user_id: int, operation_value: int, operation_id: str, message_id: int | None = None):
@@ -220,6 +238,7 @@ class UnfinishedOperations(Database.BASE):
         self.operation_value = operation_value
         self.operation_id = operation_id
         self.message_id = message_id
+        self.created_at = datetime.datetime.utcnow()
 
 
 class Achievement(Database.BASE):
@@ -232,12 +251,13 @@ class Achievement(Database.BASE):
 
 class UserAchievement(Database.BASE):
     __tablename__ = 'user_achievements'
+    __table_args__ = (Index('ix_user_achievements_user_code', 'user_id', 'achievement_code'),)
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
     achievement_code = Column(String(50), ForeignKey('achievements.code'), nullable=False)
-    achieved_at = Column(VARCHAR, nullable=False)
+    achieved_at = Column(DateTime, nullable=False)
 
-    def __init__(self, user_id: int, achievement_code: str, achieved_at: str):
+    def __init__(self, user_id: int, achievement_code: str, achieved_at: datetime.datetime):
         self.user_id = user_id
         self.achievement_code = achievement_code
         self.achieved_at = achieved_at
@@ -280,6 +300,7 @@ class ResellerPrice(Database.BASE):
 
 class StockNotification(Database.BASE):
     __tablename__ = 'stock_notifications'
+    __table_args__ = (Index('ix_stock_notifications_item_name', 'item_name'),)
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
     item_name = Column(String(100), ForeignKey('goods.name'), nullable=False)
@@ -347,11 +368,15 @@ class ProductMetadata(Database.BASE):
 
 class UserProfile(Database.BASE):
     __tablename__ = 'user_profiles'
+    __table_args__ = (
+        Index('ix_user_profiles_last_activity', 'last_activity'),
+        Index('ix_user_profiles_city_id', 'city_id'),
+    )
     user_id = Column(BigInteger, ForeignKey('users.telegram_id'), primary_key=True)
     city_id = Column(Integer, ForeignKey('cities.id'), nullable=True)
     district_id = Column(Integer, ForeignKey('districts.id'), nullable=True)
     status = Column(String(32), nullable=False, default='active')
-    last_activity = Column(VARCHAR, nullable=True)
+    last_activity = Column(DateTime, nullable=True)
     city = relationship("City")
     district = relationship("District")
     user = relationship("User", back_populates="profile")
@@ -373,6 +398,7 @@ class UserProfile(Database.BASE):
 
 class Review(Database.BASE):
     __tablename__ = 'reviews'
+    __table_args__ = (Index('ix_reviews_status_created_at', 'status', 'created_at'),)
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
     item_name = Column(String(120), nullable=True)
@@ -380,8 +406,8 @@ class Review(Database.BASE):
     product_rating = Column(Integer, nullable=False)
     comment = Column(Text, nullable=True)
     status = Column(String(16), nullable=False, default='pending')
-    created_at = Column(VARCHAR, nullable=False)
-    moderated_at = Column(VARCHAR, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    moderated_at = Column(DateTime, nullable=True)
     moderated_by = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=True)
     user = relationship('User', foreign_keys=[user_id])
     moderator = relationship('User', foreign_keys=[moderated_by], uselist=False)
@@ -394,7 +420,7 @@ class Review(Database.BASE):
         product_rating: int,
         comment: str | None,
         status: str = 'pending',
-        created_at: str | None = None,
+        created_at: datetime.datetime | None = None,
     ):
         self.user_id = user_id
         self.item_name = item_name
@@ -402,11 +428,15 @@ class Review(Database.BASE):
         self.product_rating = product_rating
         self.comment = comment
         self.status = status
-        self.created_at = created_at or datetime.datetime.utcnow().isoformat()
+        self.created_at = created_at or datetime.datetime.utcnow()
 
 
 class Reservation(Database.BASE):
     __tablename__ = 'reservations'
+    __table_args__ = (
+        Index('ix_reservations_status_reserved_at', 'status', 'reserved_at'),
+        Index('ix_reservations_status_expires_at', 'status', 'expires_at'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
     item_name = Column(String(100), nullable=False)
@@ -414,9 +444,9 @@ class Reservation(Database.BASE):
     is_infinity = Column(Boolean, nullable=False, default=False)
     operation_id = Column(String(255), nullable=True, unique=True)
     status = Column(String(16), nullable=False, default='active')
-    reserved_at = Column(VARCHAR, nullable=False)
-    expires_at = Column(VARCHAR, nullable=True)
-    released_at = Column(VARCHAR, nullable=True)
+    reserved_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=True)
+    released_at = Column(DateTime, nullable=True)
     user = relationship('User')
 
     def __init__(
@@ -426,7 +456,7 @@ class Reservation(Database.BASE):
         item_value: str | None,
         is_infinity: bool,
         operation_id: str | None,
-        expires_at: str | None = None,
+        expires_at: datetime.datetime | None = None,
         status: str = 'active',
     ):
         self.user_id = user_id
@@ -436,7 +466,7 @@ class Reservation(Database.BASE):
         self.operation_id = operation_id
         self.expires_at = expires_at
         self.status = status
-        self.reserved_at = datetime.datetime.utcnow().isoformat()
+        self.reserved_at = datetime.datetime.utcnow()
 
 
 class ManualPayment(Database.BASE):
@@ -446,7 +476,7 @@ class ManualPayment(Database.BASE):
     amount = Column(BigInteger, nullable=False)
     currency = Column(String(16), nullable=False, default='EUR')
     note = Column(Text, nullable=True)
-    created_at = Column(VARCHAR, nullable=False)
+    created_at = Column(DateTime, nullable=False)
     created_by = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
     status = Column(String(16), nullable=False, default='completed')
     user = relationship('User', foreign_keys=[user_id])
@@ -467,7 +497,7 @@ class ManualPayment(Database.BASE):
         self.note = note
         self.status = status
         self.created_by = created_by
-        self.created_at = datetime.datetime.utcnow().isoformat()
+        self.created_at = datetime.datetime.utcnow()
 
 
 class MediaAsset(Database.BASE):
@@ -479,7 +509,7 @@ class MediaAsset(Database.BASE):
     title = Column(String(255), nullable=True)
     caption = Column(Text, nullable=True)
     created_by = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
-    created_at = Column(VARCHAR, nullable=False)
+    created_at = Column(DateTime, nullable=False)
     user = relationship('User')
 
     def __init__(
@@ -497,16 +527,159 @@ class MediaAsset(Database.BASE):
         self.title = title
         self.created_by = created_by
         self.file_unique_id = file_unique_id
-        self.created_at = datetime.datetime.utcnow().isoformat()
+        self.created_at = datetime.datetime.utcnow()
+
+
+class SalesRollup(Database.BASE):
+    """Per-day sales totals, kept in step with ``bought_goods`` by ``add_bought_item``.
+
+    ``city_id`` and ``product_type_id`` are 0 when the buyer had no city or the
+    item no product type at the time of the sale.
+    """
+    __tablename__ = 'sales_rollups'
+    __table_args__ = (
+        UniqueConstraint('day', 'item_name', 'city_id', 'product_type_id', name='uq_sales_rollups_key'),
+    )
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    item_name = Column(String(100), nullable=False)
+    city_id = Column(Integer, nullable=False, default=0)
+    product_type_id = Column(Integer, nullable=False, default=0)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(BigInteger, nullable=False, default=0)
+
+
+class BroadcastCampaign(Database.BASE):
+    __tablename__ = 'broadcast_campaigns'
+    __table_args__ = (Index('ix_broadcast_campaigns_status', 'status'),)
+    id = Column(Integer, primary_key=True)
+    created_by = Column(BigInteger, ForeignKey('users.telegram_id'), nullable=False)
+    text = Column(Text, nullable=False)
+    segment = Column(String(32), nullable=False, default='all')
+    segment_value = Column(String(120), nullable=True)
+    status = Column(String(16), nullable=False, default='running')
+    # Last telegram_id handled; recipients are walked in ascending id order.
+    cursor = Column(BigInteger, nullable=True)
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)
+    chat_id = Column(BigInteger, nullable=True)
+    message_id = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __init__(
+        self,
+        created_by: int,
+        text: str,
+        segment: str = 'all',
+        segment_value: str | None = None,
+        total: int = 0,
+        chat_id: int | None = None,
+        message_id: int | None = None,
+    ):
+        self.created_by = created_by
+        self.text = text
+        self.segment = segment
+        self.segment_value = segment_value
+        self.status = 'running'
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.created_at = datetime.datetime.utcnow()
+
+
+class UploadedFile(Database.BASE):
+    """Telegram ``file_id`` of a file we uploaded, keyed by its content hash and send method."""
+    __tablename__ = 'uploaded_files'
+    __table_args__ = (UniqueConstraint('content_hash', 'kind', name='uq_uploaded_files_key'),)
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    kind = Column(String(16), nullable=False)
+    file_id = Column(String(255), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    def __init__(self, content_hash: str, kind: str, file_id: str):
+        self.content_hash = content_hash
+        self.kind = kind
+        self.file_id = file_id
+        self.created_at = datetime.datetime.utcnow()
+
+
+class ScheduledJob(Database.BASE):
+    """A deferred task run by the job scheduler; ``payload`` is JSON."""
+    __tablename__ = 'scheduled_jobs'
+    __table_args__ = (Index('ix_scheduled_jobs_status_run_at', 'status', 'run_at'),)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(32), nullable=False)
+    run_at = Column(DateTime, nullable=False)
+    payload = Column(Text, nullable=False, default='{}')
+    status = Column(String(16), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False)
+
+    def __init__(self, kind: str, run_at: datetime.datetime, payload: str = '{}'):
+        self.kind = kind
+        self.run_at = run_at
+        self.payload = payload
+        self.status = 'pending'
+        self.attempts = 0
+        self.created_at = datetime.datetime.utcnow()
+
+
+class ConversationState(Database.BASE):
+    """A persisted ``TgConfig.STATE`` entry; ``key`` and ``value`` are JSON."""
+    __tablename__ = 'conversation_state'
+    key = Column(Text, primary_key=True)
+    value = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class FsmRecord(Database.BASE):
+    """aiogram FSM state, data and bucket of one chat/user pair; ``data`` and ``bucket`` are JSON."""
+    __tablename__ = 'fsm_records'
+    chat = Column(BigInteger, primary_key=True)
+    user = Column(BigInteger, primary_key=True)
+    state = Column(Text, nullable=True)
+    data = Column(Text, nullable=False, default='{}')
+    bucket = Column(Text, nullable=False, default='{}')
+    # Write stamp of the last save, compared by workers to revalidate their cached copy.
+    version = Column(BigInteger, nullable=False, default=0, server_default='0')
+
+
+class IpnEvent(Database.BASE):
+    """A NOWPayments IPN as received; applied by the inbox worker, at most once per payment and status."""
+    __tablename__ = 'ipn_events'
+    __table_args__ = (
+        UniqueConstraint('payment_id', 'status', name='uq_ipn_events_payment_status'),
+        Index('ix_ipn_events_state_id', 'state', 'id'),
+    )
+    id = Column(Integer, primary_key=True)
+    payment_id = Column(String(64), nullable=False)
+    status = Column(String(32), nullable=False)
+    payload = Column(Text, nullable=False)
+    state = Column(String(16), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    received_at = Column(DateTime, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
 
 
 def register_models():
     engine = Database().engine
-    inspector = inspect(engine)
-    if 'reseller_prices' in inspector.get_table_names():
-        for column in inspector.get_columns('reseller_prices'):
-            if column['name'] == 'reseller_id' and not column['nullable']:
-                ResellerPrice.__table__.drop(engine)
-                break
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version == HEAD:
+        # Schema and seed data are current: nothing to introspect on a restart.
+        return
+    if version > HEAD:
+        logger.warning(f'Database schema version {version} is newer than this code ({HEAD})')
+        return
     Database.BASE.metadata.create_all(engine)
+    upgrade(engine)
+    # Roles are only reseeded with a schema change; add a migration when they change.
     Role.insert_roles()
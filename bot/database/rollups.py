@@ -0,0 +1,52 @@
+import datetime
+
+from sqlalchemy import text
+
+from bot.database.main import Database
+from bot.logger_mesh import logger
+from bot.misc.dates import LOCAL_OFFSET, SQLITE_LOCAL_MODIFIER
+
+_RECORD_SALE = text(
+    'INSERT INTO sales_rollups (day, item_name, city_id, product_type_id, orders, revenue) '
+    'VALUES (:day, :item_name, '
+    'COALESCE((SELECT city_id FROM user_profiles WHERE user_id = :buyer_id), 0), '
+    'COALESCE((SELECT product_type_id FROM product_metadata WHERE item_name = :item_name), 0), '
+    '1, :price) '
+    'ON CONFLICT (day, item_name, city_id, product_type_id) DO UPDATE SET '
+    'orders = orders + excluded.orders, revenue = revenue + excluded.revenue'
+)
+
+_REBUILD = text(
+    'INSERT INTO sales_rollups (day, item_name, city_id, product_type_id, orders, revenue) '
+    f"SELECT date(b.bought_datetime, '{SQLITE_LOCAL_MODIFIER}'), b.item_name, "
+    'COALESCE(p.city_id, 0), COALESCE(m.product_type_id, 0), COUNT(*), SUM(b.price) '
+    'FROM bought_goods b '
+    'LEFT JOIN user_profiles p ON p.user_id = b.buyer_id '
+    'LEFT JOIN product_metadata m ON m.item_name = b.item_name '
+    'GROUP BY 1, 2, 3, 4'
+)
+
+
+def record_sale(session, item_name: str, price: int, buyer_id: int, bought_time: datetime.datetime) -> None:
+    """Add one sale to its daily rollup row inside the caller's transaction."""
+    day = (bought_time + LOCAL_OFFSET).date()
+    session.execute(
+        _RECORD_SALE,
+        {'day': day.isoformat(), 'item_name': item_name, 'buyer_id': buyer_id, 'price': price},
+    )
+
+
+def rebuild_sales_rollups(conn=None) -> None:
+    """Recompute every rollup row from ``bought_goods``."""
+    if conn is not None:
+        conn.execute(text('DELETE FROM sales_rollups'))
+        conn.execute(_REBUILD)
+        return
+    with Database().transaction() as session:
+        session.execute(text('DELETE FROM sales_rollups'))
+        session.execute(_REBUILD)
+    logger.info('Sales rollups rebuilt from bought_goods')
+
+
+if __name__ == '__main__':
+    rebuild_sales_rollups()
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from sqlalchemy import func, select
+
+from bot.database.catalog import catalog
+from bot.database.main import Database
+from bot.database.models import BoughtGoods, Operations, User
+from bot.misc.dates import local_day_bounds, local_today
+
+
+class ShopStats:
+    """Counters for the admin statistics screen.
+
+    A snapshot is loaded with one query and then kept current by the write
+    methods, which bump the cached counters in place. The TTL bounds drift from
+    writes that do not report here (role changes invalidate instead).
+    """
+
+    TTL = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: dict | None = None
+        self._day = None
+        self._loaded_at = 0.0
+
+    def _load(self) -> dict:
+        today = local_today()
+        start, end = local_day_bounds(today)
+
+        def scalar(column, *criteria):
+            query = select(func.coalesce(column, 0))
+            if criteria:
+                query = query.where(*criteria)
+            return query.scalar_subquery()
+
+        query = select(
+            scalar(func.count(User.telegram_id), User.registration_date >= start, User.registration_date < end)
+            .label('users_today'),
+            scalar(func.count(User.telegram_id), User.role_id > 1).label('admins'),
+            scalar(func.count(User.telegram_id)).label('users'),
+            scalar(func.sum(User.balance)).label('balance'),
+            scalar(func.sum(BoughtGoods.price), BoughtGoods.bought_datetime >= start,
+                   BoughtGoods.bought_datetime < end).label('orders_today'),
+            scalar(func.sum(BoughtGoods.price)).label('orders'),
+            scalar(func.count(BoughtGoods.id)).label('sold'),
+            scalar(func.sum(Operations.operation_value), Operations.operation_time >= start,
+                   Operations.operation_time < end).label('operations_today'),
+            scalar(func.sum(Operations.operation_value)).label('operations'),
+        )
+        with Database().engine.connect() as conn:
+            values = dict(conn.execute(query).mappings().one())
+        with self._lock:
+            self._values, self._day, self._loaded_at = values, today, time.monotonic()
+        return values
+
+    def snapshot(self) -> dict:
+        """Return all statistics counters, reloading them when stale."""
+        with self._lock:
+            values = self._values
+            fresh = (
+                values is not None
+                and self._day == local_today()
+                and time.monotonic() - self._loaded_at < self.TTL
+            )
+            if fresh:
+                values = dict(values)
+        if not fresh:
+            values = dict(self._load())
+        values.update(catalog.counts())
+        return values
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._values = None
+
+    def _bump(self, **deltas) -> None:
+        with self._lock:
+            if self._values is None:
+                return
+            for key, delta in deltas.items():
+                self._values[key] += delta
+
+    def user_registered(self, is_admin: bool = False) -> None:
+        self._bump(users=1, users_today=1, admins=int(is_admin))
+
+    def balance_changed(self, delta: int) -> None:
+        self._bump(balance=delta)
+
+    def sale_recorded(self, price: int) -> None:
+        self._bump(orders=price, orders_today=price, sold=1)
+
+    def top_up_recorded(self, amount: int) -> None:
+        self._bump(operations=amount, operations_today=amount)
+
+
+shop_stats = ShopStats()
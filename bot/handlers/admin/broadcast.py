@@ -1,27 +1,21 @@
-import asyncio
-
 from aiogram import Dispatcher
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
-from aiogram.utils.exceptions import BotBlocked
 
 from bot.database.methods import (
     check_role,
-    get_all_user_ids,
+    count_segment_users,
+    create_broadcast_campaign,
     get_cities,
     get_regions,
-    get_resellers,
-    get_user_ids_by_city,
-    get_user_ids_by_region,
-    get_user_ids_by_status,
-    get_user_ids_without_activity,
     get_user_language,
 )
 from bot.database.models import Permission
 from bot.handlers.other import get_bot_user_ids
-from bot.keyboards import back, close
+from bot.keyboards import back
 from bot.localization import t
 from bot.logger_mesh import logger
 from bot.misc import TgConfig
+from bot.services.broadcast import start_campaign
 from bot.utils.feature_config import is_feature_enabled as is_enabled
 
 
@@ -81,23 +75,6 @@ def _regions_markup(lang: str, user_id: int) -> InlineKeyboardMarkup:
     return markup
 
 
-def _resolve_recipients(filter_data: tuple[str, str | int | None]) -> list[int]:
-    filter_type, value = filter_data
-    if filter_type == 'active':
-        return get_user_ids_by_status(True)
-    if filter_type == 'inactive':
-        return get_user_ids_by_status(False)
-    if filter_type == 'no_activity':
-        return get_user_ids_without_activity()
-    if filter_type == 'resellers':
-        return [row[0] for row in get_resellers()]
-    if filter_type == 'city' and value is not None:
-        return get_user_ids_by_city(int(value))
-    if filter_type == 'region' and value:
-        return get_user_ids_by_region(str(value))
-    return get_all_user_ids()
-
-
 async def _prompt_for_message(call: CallbackQuery, lang: str, user_id: int) -> None:
     bot = call.bot
     TgConfig.STATE[user_id] = 'waiting_for_message'
@@ -202,9 +179,9 @@ async def broadcast_messages(message: Message):
     message_id = TgConfig.STATE.get(f'{user_id}_message_id')
     TgConfig.STATE[user_id] = None
     await bot.delete_message(chat_id=message.chat.id, message_id=message.message_id)
-    filter_data = TgConfig.STATE.pop(_filter_key(user_id), ('all', None))
-    recipients = _resolve_recipients(filter_data)
-    if not recipients:
+    filter_type, value = TgConfig.STATE.pop(_filter_key(user_id), ('all', None))
+    total = count_segment_users(filter_type, value)
+    if not total:
         await bot.edit_message_text(
             t(lang, 'broadcast_no_recipients'),
             chat_id=message.chat.id,
@@ -212,25 +189,27 @@ async def broadcast_messages(message: Message):
             reply_markup=back('console'),
         )
         return
-    sent = 0
-    for recipient in recipients:
-        await asyncio.sleep(0.1)
-        try:
-            await bot.send_message(chat_id=int(recipient), text=msg, reply_markup=close())
-            sent += 1
-        except BotBlocked:
-            continue
+    campaign_id = create_broadcast_campaign(
+        user_id,
+        msg,
+        filter_type,
+        str(value) if value is not None else None,
+        total,
+        chat_id=message.chat.id,
+        message_id=message_id,
+    )
     await bot.edit_message_text(
-        t(lang, 'broadcast_completed', count=sent),
+        t(lang, 'broadcast_progress', done=0, total=total, sent=0, blocked=0, failed=0),
         chat_id=message.chat.id,
         message_id=message_id,
-        reply_markup=back('console'),
     )
+    start_campaign(bot, campaign_id)
     logger.info(
-        "Broadcast by %s sent to %s users using filter %s",
+        "Broadcast campaign %s by %s started for %s users using filter %s",
+        campaign_id,
         user_id,
-        sent,
-        filter_data,
+        total,
+        (filter_type, value),
     )
 
 
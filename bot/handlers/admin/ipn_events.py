@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from aiogram import Dispatcher
+from aiogram.types import Message
+
+from bot.database import run_db
+from bot.database.methods import check_role, count_failed_ipn_events, get_user_language, requeue_failed_ipn_events
+from bot.database.models import Permission
+from bot.localization import t
+from bot.services.ipn_inbox import wake
+
+
+async def ipn_replay_command(message: Message) -> None:
+    """``/ipn_replay [event_id]``: queue failed NOWPayments IPN events for another attempt."""
+    user_id = message.from_user.id
+    lang = get_user_language(user_id) or 'en'
+    if not check_role(user_id) & Permission.OWN:
+        await message.reply(t(lang, 'insufficient_rights'))
+        return
+    arg = message.get_args().strip()
+    if arg and not arg.isdigit():
+        await message.reply(t(lang, 'ipn_replay_usage'))
+        return
+    if not arg and not await run_db(count_failed_ipn_events):
+        await message.reply(t(lang, 'ipn_replay_none'))
+        return
+    count = await run_db(requeue_failed_ipn_events, int(arg) if arg else None)
+    if count:
+        wake()
+    await message.reply(t(lang, 'ipn_replay_done', count=count))
+
+
+def register_ipn_events(dp: Dispatcher) -> None:
+    dp.register_message_handler(ipn_replay_command, commands=['ipn_replay'], state='*')
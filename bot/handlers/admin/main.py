@@ -20,6 +20,7 @@ from bot.handlers.admin.reviews import register_reviews_management
 from bot.handlers.admin.reservations import register_reservations_management
 from bot.handlers.admin.manual_payments import register_manual_payments
 from bot.handlers.admin.media import register_media_library
+from bot.handlers.admin.ipn_events import register_ipn_events
 from bot.handlers.other import get_bot_user_ids
 
 
@@ -93,3 +94,4 @@ def register_admin_handlers(dp: Dispatcher) -> None:
     register_reservations_management(dp)
     register_manual_payments(dp)
     register_media_library(dp)
+    register_ipn_events(dp)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import datetime
 from decimal import Decimal, InvalidOperation
 
 from aiogram import Dispatcher
@@ -13,13 +14,14 @@ from bot.database.methods import (
     create_manual_payment_record,
     create_operation,
     get_manual_payments,
-    update_balance,
+    credit_balance,
 )
 from bot.database.models import Permission
 from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import manual_payments_menu
 from bot.localization import t
 from bot.misc import TgConfig
+from bot.misc.dates import format_local
 from bot.utils.feature_config import feature_disabled_text, is_enabled
 
 
@@ -155,8 +157,8 @@ async def manual_payment_note_step(message: Message) -> None:
     if target_id is None or amount is None:
         return
     amount_value = int(amount)
-    update_balance(target_id, amount_value)
-    create_operation(target_id, amount_value, message.date.isoformat())
+    credit_balance(target_id, amount_value)
+    create_operation(target_id, amount_value, datetime.datetime.utcnow())
     create_manual_payment_record(
         user_id=target_id,
         amount=amount_value,
@@ -201,7 +203,7 @@ async def manual_payments_history(call: CallbackQuery) -> None:
                     amount=f'{entry.amount:.2f}',
                     admin=_format_user_display(entry.admin if hasattr(entry, 'admin') else check_user(entry.created_by)),
                     note=entry.note or '-',
-                    created=entry.created_at,
+                    created=format_local(entry.created_at),
                 )
             )
         text = '\n'.join(lines)
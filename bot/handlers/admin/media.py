@@ -16,6 +16,7 @@ from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import media_library_menu, media_asset_actions, media_list_keyboard
 from bot.localization import t
 from bot.misc import TgConfig
+from bot.misc.dates import format_local
 from bot.utils.feature_config import feature_disabled_text, is_enabled
 
 
@@ -128,7 +129,7 @@ async def media_list(call: CallbackQuery) -> None:
     lines = [t(lang, 'media_list_header')]
     markup = media_list_keyboard(assets, lang)
     for asset in assets:
-        lines.append(t(lang, 'media_list_line', asset_id=asset.id, media_type=asset.file_type, created=asset.created_at))
+        lines.append(t(lang, 'media_list_line', asset_id=asset.id, media_type=asset.file_type, created=format_local(asset.created_at)))
     await bot.edit_message_text(
         '\n'.join(lines),
         chat_id=call.message.chat.id,
@@ -152,7 +153,7 @@ async def media_view(call: CallbackQuery) -> None:
         'media_detail',
         asset_id=asset.id,
         media_type=asset.file_type,
-        created=asset.created_at,
+        created=format_local(asset.created_at),
         caption=asset.caption or '-',
     )
     await bot.edit_message_text(
@@ -4,9 +4,10 @@ import random
 
 from bot.database.methods import (
     check_role,
+    count_segment_users,
+    create_broadcast_campaign,
     get_users_with_tickets,
     reset_lottery_tickets,
-    get_all_users,
     get_user_language,
 )
 from bot.database.models import Permission
@@ -20,6 +21,7 @@ from bot.keyboards import (
 )
 from bot.misc import TgConfig
 from bot.localization import t
+from bot.services.broadcast import start_campaign
 from bot.utils.feature_config import feature_disabled_text, is_enabled
 
 
@@ -209,13 +211,9 @@ async def lottery_broadcast_message(message: Message):
     user_id = message.from_user.id
     if TgConfig.STATE.get(user_id) != 'lottery_broadcast_message':
         return
-    text = message.text
-    users = get_all_users()
-    for uid, in users:
-        try:
-            await bot.send_message(uid, text)
-        except Exception:
-            continue
+    # Delivered in the background as a bulk campaign, like an admin broadcast.
+    campaign_id = create_broadcast_campaign(user_id, message.text, 'all', None, count_segment_users('all'))
+    start_campaign(bot, campaign_id)
     reset_lottery_tickets()
     TgConfig.STATE.pop('lottery_winner', None)
     TgConfig.STATE[user_id] = None
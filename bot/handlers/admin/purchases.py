@@ -18,6 +18,8 @@ from bot.keyboards import (
     purchase_info_menu,
 )
 from bot.misc import TgConfig
+from bot.misc.dates import format_local
+from bot.services.media import send_media
 from bot.localization import t
 
 
@@ -71,7 +73,7 @@ async def purchase_info_callback_handler(call: CallbackQuery):
             desc = f.read()
     text = (
         f"User {username}\n"
-        f"Time: {purchase['bought_datetime']} GMT+3\n"
+        f"Time: {format_local(purchase['bought_datetime'])} GMT+3\n"
         f"Product: {purchase['item_name']} ({purchase['price']}€)\n"
         f"Crypto: N/A\n"
         f"Category: {parent_cat or '-'} / {item_info['category_name']}\n"
@@ -103,11 +105,7 @@ async def view_purchase_handler(call: CallbackQuery):
         with open(desc_file) as f:
             desc = f.read()
     if os.path.isfile(path):
-        with open(path, 'rb') as media:
-            if path.endswith('.mp4'):
-                await bot.send_video(user_id, media, caption=desc or None)
-            else:
-                await bot.send_photo(user_id, media, caption=desc or None)
+        await send_media(bot, user_id, path, caption=desc or None)
     else:
         await bot.send_message(user_id, purchase['value'])
     await call.answer()
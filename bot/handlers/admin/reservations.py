@@ -15,6 +15,7 @@ from bot.database.models import Permission
 from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import reservations_list_markup, reservation_actions_keyboard
 from bot.localization import t
+from bot.misc.dates import format_local
 from bot.utils import notify_restock
 from bot.utils.feature_config import feature_disabled_text, is_enabled
 
@@ -69,8 +70,8 @@ async def reservation_view(call: CallbackQuery) -> None:
         user=reservation.user_id,
         item=reservation.item_name,
         status=reservation.status,
-        reserved_at=reservation.reserved_at,
-        expires_at=reservation.expires_at or '-',
+        reserved_at=format_local(reservation.reserved_at),
+        expires_at=format_local(reservation.expires_at),
     )
     await bot.edit_message_text(
         text,
@@ -16,6 +16,7 @@ from bot.database.models import Permission
 from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import reviews_menu, reviews_list_markup, review_actions_keyboard
 from bot.localization import t
+from bot.misc.dates import format_local
 from bot.utils.feature_config import feature_disabled_text, is_enabled
 
 
@@ -94,7 +95,7 @@ async def review_view(call: CallbackQuery) -> None:
         product=review.product_rating,
         comment=comment,
         status=status_text,
-        created=review.created_at,
+        created=format_local(review.created_at),
     )
     await bot.edit_message_text(
         body,
@@ -133,7 +134,7 @@ async def review_update(call: CallbackQuery) -> None:
             product=updated.product_rating,
             comment=comment,
             status=status_text,
-            created=updated.created_at,
+            created=format_local(updated.created_at),
         )
         await bot.edit_message_text(
             text,
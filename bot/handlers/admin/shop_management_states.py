@@ -4,7 +4,7 @@ import shutil
 import datetime
 
 from aiogram import Dispatcher
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, InputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.exceptions import ChatNotFound
 
 from bot.localization import t
@@ -27,20 +27,8 @@ from bot.database.methods import (
     get_all_subcategories,
     get_category_parent,
     get_item_info,
-    get_user_count,
     get_user_language,
-    select_admins,
-    select_all_operations,
-    select_all_orders,
     select_bought_item,
-    select_count_bought_items,
-    select_count_categories,
-    select_count_goods,
-    select_count_items,
-    select_today_operations,
-    select_today_orders,
-    select_today_users,
-    select_users_balance,
     update_category,
     update_item,
     create_promocode,
@@ -52,13 +40,17 @@ from bot.database.methods import (
 from bot.utils import generate_internal_name, display_name, notify_restock
 from bot.utils.feature_config import is_feature_enabled as is_enabled
 from bot.utils.files import get_next_file_path
+from bot.database import run_db
 from bot.database.models import Permission
+from bot.database.stats import shop_stats
 from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import (shop_management, goods_management, categories_management, back, item_management,
                            question_buttons, promo_codes_management, promo_expiry_keyboard, promo_codes_list,
                            promo_manage_actions)
 from bot.logger_mesh import logger
 from bot.misc import TgConfig, EnvKeys
+from bot.misc.dates import format_local
+from bot.services.media import send_media
 
 
 def _feature_disabled(user) -> str:
@@ -651,7 +643,7 @@ async def photo_info_callback_handler(call: CallbackQuery):
                                 chat_id=call.message.chat.id,
                                 message_id=call.message.message_id)
     try:
-        await bot.send_photo(call.message.chat.id, InputFile(info['file']))
+        await send_media(bot, call.message.chat.id, info['file'], 'photo')
     except Exception:
         pass
 
@@ -777,26 +769,26 @@ async def statistics_callback_handler(call: CallbackQuery):
     TgConfig.STATE[user_id] = None
     role = check_role(user_id)
     if role & Permission.SHOP_MANAGE:
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        stats = await run_db(shop_stats.snapshot)
         await bot.edit_message_text('Shop statistics:\n'
                                     '➖➖➖➖➖➖➖➖➖➖➖➖➖\n'
                                     '**◽USERS**\n'
-                                    f'◾️Users in last 24h: {select_today_users(today)}\n'
-                                    f'◾️Total administrators: {select_admins()}\n'
-                                    f'◾️Total users: {get_user_count()}\n'
+                                    f'◾️Users in last 24h: {stats["users_today"]}\n'
+                                    f'◾️Total administrators: {stats["admins"]}\n'
+                                    f'◾️Total users: {stats["users"]}\n'
                                     '➖➖➖➖➖➖➖➖➖➖➖➖➖\n'
                                     '◽**FUNDS**\n'
-                                    f'◾Sales in 24h: {select_today_orders(today)}€\n'
-                                    f'◾Items sold for: {select_all_orders()}€\n'
-                                    f'◾Top-ups in 24h: {select_today_operations(today)}€\n'
-                                    f'◾Funds in system: {select_users_balance()}€\n'
-                                    f'◾Total topped up: {select_all_operations()}€\n'
+                                    f'◾Sales in 24h: {stats["orders_today"]}€\n'
+                                    f'◾Items sold for: {stats["orders"]}€\n'
+                                    f'◾Top-ups in 24h: {stats["operations_today"]}€\n'
+                                    f'◾Funds in system: {stats["balance"]}€\n'
+                                    f'◾Total topped up: {stats["operations"]}€\n'
                                     '➖➖➖➖➖➖➖➖➖➖➖➖➖\n'
                                     '◽**OTHER**\n'
-                                    f'◾Items: {select_count_items()}pcs.\n'
-                                    f'◾Positions: {select_count_goods()}pcs.\n'
-                                    f'◾Categories: {select_count_categories()}pcs.\n'
-                                    f'◾Items sold: {select_count_bought_items()}pcs.',
+                                    f'◾Items: {stats["items"]}pcs.\n'
+                                    f'◾Positions: {stats["goods"]}pcs.\n'
+                                    f'◾Categories: {stats["categories"]}pcs.\n'
+                                    f'◾Items sold: {stats["sold"]}pcs.',
                                     chat_id=call.message.chat.id,
                                     message_id=call.message.message_id,
                                     reply_markup=back('shop_management'),
@@ -1597,7 +1589,7 @@ async def process_item_show(message: Message):
             message_id=message_id,
             text=f'**Item**: <code>{item["item_name"]}</code>\n'
                  f'**Price**: <code>{item["price"]}</code>€\n'
-                 f'**Purchase date**: <code>{item["bought_datetime"]}</code>\n'
+                 f'**Purchase date**: <code>{format_local(item["bought_datetime"])}</code>\n'
                  f'**Buyer**: <code>{item["buyer_id"]}</code>\n'
                  f'**Unique operation ID**: <code>{item["unique_id"]}</code>\n'
                  f'**Value**:\n<code>{item["value"]}</code>',
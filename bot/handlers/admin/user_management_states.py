@@ -6,9 +6,10 @@ from aiogram.utils.exceptions import BotBlocked
 
 from bot.keyboards import back, user_manage_check, user_management, user_items_list, close
 from bot.database.methods import check_role, check_user, check_user_by_username, select_user_operations, select_user_items, \
-    check_role_name_by_id, check_user_referrals, select_bought_items, set_role, create_operation, update_balance, \
+    check_role_name_by_id, check_user_referrals, select_bought_items, set_role, create_operation, credit_balance, \
     bought_items_list
 from bot.misc import TgConfig
+from bot.misc.dates import format_local
 from bot.database.models import Permission
 from bot.handlers.other import get_bot_user_ids
 from bot.logger_mesh import logger
@@ -80,7 +81,7 @@ async def user_profile_view(call: CallbackQuery):
             f"👤 <b>Referral</b> — <code>{user.referral_id}</code>\n"
             f"👥 <b>User's referrals</b> — {referrals}\n"
             f"🎛 <b>Role</b> — {role}\n"
-            f"🕢 <b>Registration date</b> — <code>{user.registration_date}</code>\n"
+            f"🕢 <b>Registration date</b> — <code>{format_local(user.registration_date)}</code>\n"
         ),
         parse_mode='HTML',
         reply_markup=user_management(
@@ -200,10 +201,8 @@ async def process_replenish_user_balance(message: Message):
             reply_markup=back(f'check-user_{user_data}')
         )
         return
-    current_time = datetime.datetime.now()
-    formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
-    create_operation(user_data, msg, formatted_time)
-    update_balance(user_data, msg)
+    create_operation(user_data, int(msg), datetime.datetime.utcnow())
+    credit_balance(user_data, int(msg))
     user_info = await bot.get_chat(user_data)
     await bot.edit_message_text(
         chat_id=message.chat.id,
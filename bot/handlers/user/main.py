@@ -2,7 +2,6 @@ import asyncio
 import datetime
 import os
 import random
-import shutil
 from io import BytesIO
 from urllib.parse import urlparse
 import html
@@ -31,18 +30,18 @@ import contextlib
 
 
 from aiogram import Dispatcher
-from aiogram.types import Message, CallbackQuery, ChatType, InlineKeyboardMarkup, InlineKeyboardButton, InputFile
+from aiogram.types import Message, CallbackQuery, ChatType, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.exceptions import MessageNotModified
 
+from bot.database import run_db
 from bot.database.methods import (
     get_role_id_by_name, create_user, check_role, check_user,
     get_all_categories, get_all_items, select_bought_items, get_bought_item_info, get_item_info,
-    select_item_values_amount, get_user_balance, get_item_value, buy_item, add_bought_item, buy_item_for_balance,
+    select_item_values_amount, get_user_balance, get_item_value, claim_item_value, debit_if_sufficient,
     select_user_operations, select_user_items, start_operation,
-    select_unfinished_operations, get_user_referral, finish_operation, update_balance, create_operation,
-    bought_items_list, check_value, get_subcategories, get_category_parent, get_user_language, update_user_language,
-    get_unfinished_operation, get_user_unfinished_operation, get_promocode, add_values_to_item, update_lottery_tickets,
-    can_use_discount, can_get_referral_reward,
+    select_unfinished_operations, finish_operation, credit_balance, complete_top_ups,
+    bought_items_list, check_value, get_subcategories, get_user_language, update_user_language,
+    get_unfinished_operation, get_user_unfinished_operation, get_promocode, add_values_to_item,
     can_use_discount,
     has_user_achievement, get_achievement_users, grant_achievement, get_user_count,
     get_out_of_stock_categories, get_out_of_stock_subcategories, get_out_of_stock_items,
@@ -52,7 +51,7 @@ from bot.database.methods import (
 )
 from bot.handlers.other import get_bot_user_ids
 from bot.keyboards import (
-    main_menu, categories_list, goods_list, subcategories_list, user_items_list, back, item_info,
+    main_menu, categories_list, goods_list, subcategories_list, user_items_list, back, home_markup, item_info,
     profile, rules, payment_menu, close, crypto_choice, crypto_invoice_menu, blackjack_controls,
     blackjack_bet_input_menu, blackjack_end_menu, blackjack_history_menu, feedback_menu,
     feedback_reason_menu,
@@ -61,20 +60,19 @@ from bot.keyboards import (
     crypto_choice_purchase, notify_categories_list, notify_subcategories_list, notify_goods_list)
 
 from bot.localization import t
-from bot.database.methods.update import (
-    process_purchase_streak,
-    mark_reservation_completed_by_operation,
-    release_reservation,
-)
+from bot.database.methods.update import release_reservation
 from bot.logger_mesh import logger
 from bot.misc import TgConfig, EnvKeys
-from bot.misc.payment import quick_pay, check_payment_status
-from bot.misc.nowpayments import create_payment, check_payment
+from bot.misc.dates import format_local, utcnow
+from bot.misc.payment import IN_PROGRESS_STATUSES, PAID_STATUSES, quick_pay, check_payment_status
+from bot.misc.nowpayments import NowPaymentsError, create_payment, check_payment
+from bot.services.media import send_media
+from bot.services.outbound import NOTIFICATION, priority
+from bot.services.purchase import PurchaseService
+from bot.services.scheduler import scheduler
 from bot.utils import display_name, notify_restock
 from bot.utils.feature_config import feature_disabled_text, is_enabled
-from bot.utils.notifications import notify_owner_of_purchase
 from bot.utils.level import get_level_info
-from bot.utils.files import cleanup_item_file
 
 
 CRYPTO_PAYMENT_MAP = {
@@ -87,6 +85,9 @@ CRYPTO_PAYMENT_MAP = {
     'TON': 'TON',
 }
 
+# Seconds before an invoice whose payment is still settling is checked again.
+INVOICE_RECHECK_DELAY = 300
+
 
 def build_menu_text(user_obj, balance: float, purchases: int, streak: int, lang: str) -> str:
     """Return main menu text with loyalty status and streak."""
@@ -121,15 +122,19 @@ async def request_feedback(bot, user_id: int, lang: str, item_name: str) -> None
     )
 
 
-async def schedule_feedback(bot, user_id: int, lang: str, item_name: str) -> None:
-    """Send feedback request after a 1-hour delay."""
+async def schedule_feedback(user_id: int, lang: str, item_name: str) -> None:
+    """Queue a feedback request for 1 hour after the purchase."""
     if not is_enabled("reviews"):
         return
-    try:
-        await asyncio.sleep(3600)  # 1 hour
-        await request_feedback(bot, user_id, lang, item_name)
-    except Exception as e:
-        logger.error(f"Feedback request failed for {user_id}: {e}")
+    await scheduler.schedule('feedback_request', 3600, {'user_id': user_id, 'lang': lang, 'item': item_name})
+
+
+@scheduler.handler('feedback_request')
+async def _feedback_request_job(bot, payload: dict) -> None:
+    if not is_enabled("reviews"):
+        return
+    with priority(NOTIFICATION):
+        await request_feedback(bot, payload['user_id'], payload['lang'], payload['item'])
 
 
 async def ensure_feature_enabled(feature: str, event: CallbackQuery | Message) -> bool:
@@ -174,6 +179,60 @@ async def _restore_reservation(bot, purchase_data: dict | None) -> None:
             await notify_restock(bot, item_name)
 
 
+async def schedule_invoice_expiry(operation_id: str, user_id: int, lang: str, provider: str,
+                                  purchase: dict | None = None) -> None:
+    """Cancel the invoice after ``PAYMENT_TIME`` unless it has been paid by then."""
+    payload = {
+        'operation_id': operation_id,
+        'user_id': user_id,
+        'lang': lang,
+        'provider': provider,
+        'purchase': purchase,
+    }
+    await scheduler.schedule('invoice_expiry', int(TgConfig.PAYMENT_TIME), payload)
+
+
+@scheduler.handler('invoice_expiry')
+async def _invoice_expiry_job(bot, payload: dict) -> None:
+    operation_id = payload['operation_id']
+    user_id = payload['user_id']
+    lang = payload['lang']
+    info = await run_db(get_unfinished_operation, operation_id)
+    if not info:
+        return
+    _, _, message_id = info
+    if payload['provider'] == 'yoomoney':
+        status = await check_payment_status(operation_id)
+    else:
+        status = await check_payment(operation_id)
+    if status in PAID_STATUSES:
+        return
+    if status in IN_PROGRESS_STATUSES:
+        # The payment is still settling: look again later rather than cancel a paid invoice.
+        await scheduler.schedule('invoice_expiry', INVOICE_RECHECK_DELAY, payload)
+        return
+    await run_db(finish_operation, operation_id)
+    purchase = payload.get('purchase')
+    if purchase is None:
+        await bot.send_message(user_id, t(lang, 'invoice_cancelled'))
+        return
+    # The in-memory copy is gone after a restart; the payload keeps what is needed to restore stock.
+    purchase_data = TgConfig.STATE.pop(f'purchase_{operation_id}', None) or purchase
+    await _restore_reservation(bot, purchase_data)
+    TgConfig.STATE.pop(f'{user_id}_pending_item', None)
+    TgConfig.STATE.pop(f'{user_id}_price', None)
+    TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
+    TgConfig.STATE.pop(f'{user_id}_deduct', None)
+    reserve_msg_id = TgConfig.STATE.pop(f'{user_id}_reserve_msg', None) or purchase.get('reserve_msg_id')
+    for msg_id in (message_id, reserve_msg_id):
+        if msg_id:
+            try:
+                await bot.delete_message(user_id, msg_id)
+            except Exception:
+                pass
+    await bot.send_message(user_id, t(lang, 'invoice_cancelled'), reply_markup=home_markup(lang))
+
+
 async def _finalize_review(
     bot,
     user_id: int,
@@ -249,8 +308,7 @@ async def start(message: Message):
     TgConfig.STATE[user_id] = None
 
     owner = get_role_id_by_name('OWNER')
-    current_time = datetime.datetime.now()
-    formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
+    current_time = utcnow()
 
     referral_id = None
     if len(message.text) > 7:
@@ -271,14 +329,14 @@ async def start(message: Message):
                 referral_id = None
 
     user_role = owner if str(user_id) == EnvKeys.OWNER_ID else 1
-    create_user(telegram_id=user_id, registration_date=formatted_time, referral_id=referral_id, role=user_role,
+    create_user(telegram_id=user_id, registration_date=current_time, referral_id=referral_id, role=user_role,
                 username=message.from_user.username)
     role_data = check_role(user_id)
     user_db = check_user(user_id)
 
     user_lang = user_db.language
     if not has_user_achievement(user_id, 'start'):
-        grant_achievement(user_id, 'start', formatted_time)
+        grant_achievement(user_id, 'start', current_time)
         logger.info(f"User {user_id} unlocked achievement start")
         if user_lang:
             await bot.send_message(user_id, t(user_lang, 'achievement_unlocked', name=t(user_lang, 'achievement_start')))
@@ -301,8 +359,7 @@ async def start(message: Message):
     markup = main_menu(role_data, TgConfig.CHANNEL_URL, TgConfig.PRICE_LIST_URL, user_lang)
     text = build_menu_text(message.from_user, balance, purchases, user_db.purchase_streak, user_lang)
     try:
-        with open(TgConfig.START_PHOTO_PATH, 'rb') as photo:
-            await bot.send_photo(user_id, photo)
+        await send_media(bot, user_id, TgConfig.START_PHOTO_PATH, 'photo')
     except Exception:
         pass
     await bot.send_message(user_id, text, reply_markup=markup)
@@ -348,15 +405,10 @@ async def pavogti_item_callback(call: CallbackQuery):
                 with open(desc_path) as f:
                     media_caption = f.read()
     if media_path:
-        with open(media_path, 'rb') as mf:
-            if media_path.endswith('.mp4'):
-                await bot.send_video(user_id, mf, caption=media_caption)
-            else:
-                await bot.send_photo(user_id, mf, caption=media_caption)
+        await send_media(bot, user_id, media_path, caption=media_caption)
     value = get_item_value(item_name)
     if value and os.path.isfile(value['value']):
-        with open(value['value'], 'rb') as photo:
-            await bot.send_photo(user_id, photo, caption=info['description'])
+        await send_media(bot, user_id, value['value'], 'photo', caption=info['description'])
     else:
         await bot.send_message(user_id, info['description'])
 
@@ -611,19 +663,17 @@ async def feedback_comment_message(message: Message):
 async def start_blackjack_game(call: CallbackQuery, bet: int):
     bot, user_id = await get_bot_user_ids(call)
     await call.answer()
-    balance = get_user_balance(user_id)
     if bet <= 0:
         await call.answer('❌ Invalid bet')
         return
     if bet > 5:
         await call.answer('❌ Maximum bet is 5€', show_alert=True)
         return
-    if bet > balance:
+    if debit_if_sufficient(user_id, bet) is None:
         markup = InlineKeyboardMarkup().add(
             InlineKeyboardButton('💳 Top up balance', callback_data='replenish_balance'))
         await bot.send_message(user_id, "❌ You don't have that much money", reply_markup=markup)
         return
-    buy_item_for_balance(user_id, bet)
     deck = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11] * 4
     random.shuffle(deck)
     player = [deck.pop(), deck.pop()]
@@ -641,7 +691,7 @@ async def start_blackjack_game(call: CallbackQuery, bet: int):
     try:
         msg = await bot.send_message(user_id, text, reply_markup=blackjack_controls())
     except Exception:
-        update_balance(user_id, bet)
+        credit_balance(user_id, bet)
         TgConfig.STATE.pop(f'{user_id}_blackjack', None)
         await call.answer('❌ Game canceled, bet refunded', show_alert=True)
         return
@@ -685,7 +735,7 @@ async def blackjack_move_handler(call: CallbackQuery):
                 'date': datetime.datetime.now().strftime('%Y-%m-%d')
             })
             if stats['games'] == 1 and not has_user_achievement(user_id, 'first_blackjack'):
-                ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                ts = utcnow()
                 grant_achievement(user_id, 'first_blackjack', ts)
                 await bot.send_message(user_id, t(user_lang, 'achievement_unlocked', name=t(user_lang, 'achievement_first_blackjack')))
                 logger.info(f"User {user_id} unlocked achievement first_blackjack")
@@ -707,12 +757,12 @@ async def blackjack_move_handler(call: CallbackQuery):
         dealer_total = blackjack_hand_value(dealer)
         text = format_blackjack_state(player, dealer, hide_dealer=False)
         if dealer_total > 21 or player_total > dealer_total:
-            update_balance(user_id, bet * 2)
+            credit_balance(user_id, bet * 2)
             text += f'\n\nYou win {bet}€!'
             result = 'win'
             profit = bet
         elif player_total == dealer_total:
-            update_balance(user_id, bet)
+            credit_balance(user_id, bet)
             text += '\n\nPush.'
             result = 'push'
             profit = 0
@@ -729,7 +779,7 @@ async def blackjack_move_handler(call: CallbackQuery):
         stats = TgConfig.BLACKJACK_STATS.setdefault(user_id, {'games':0,'wins':0,'losses':0,'profit':0,'history':[]})
         stats['games'] += 1
         if stats['games'] == 1 and not has_user_achievement(user_id, 'first_blackjack'):
-            ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            ts = utcnow()
             grant_achievement(user_id, 'first_blackjack', ts)
             await bot.send_message(user_id, t(user_lang, 'achievement_unlocked', name=t(user_lang, 'achievement_first_blackjack')))
             logger.info(f"User {user_id} unlocked achievement first_blackjack")
@@ -848,23 +898,18 @@ async def coinflip_receive_bet(message: Message):
     if bet <= 0 or bet > 5:
         await bot.send_message(user_id, '❌ Invalid bet (max 5€)', reply_markup=back('coinflip'))
         return
-    balance = get_user_balance(user_id)
-    if bet > balance and state == 'coinflip_bot_enter_bet':
-        markup = InlineKeyboardMarkup().add(
-            InlineKeyboardButton(t(user_lang, 'top_up'), callback_data='replenish_balance'))
-        await bot.send_message(user_id, t(user_lang, 'not_enough_balance'), reply_markup=markup)
-        TgConfig.STATE[user_id] = None
-        TgConfig.STATE.pop(f'{user_id}_coinflip_side', None)
-        return
     if state == 'coinflip_bot_enter_bet':
         TgConfig.STATE[user_id] = None
         TgConfig.STATE.pop(f'{user_id}_coinflip_side', None)
-        buy_item_for_balance(user_id, bet)
+        if debit_if_sufficient(user_id, bet) is None:
+            markup = InlineKeyboardMarkup().add(
+                InlineKeyboardButton(t(user_lang, 'top_up'), callback_data='replenish_balance'))
+            await bot.send_message(user_id, t(user_lang, 'not_enough_balance'), reply_markup=markup)
+            return
         result = random.choice(['heads', 'tails'])
         gif_path = TgConfig.HEADS_GIF if result == 'heads' else TgConfig.TAILS_GIF
         try:
-            with open(gif_path, 'rb') as f:
-                await bot.send_animation(user_id, f)
+            await send_media(bot, user_id, gif_path, 'animation')
         except Exception:
             pass
         await asyncio.sleep(4)
@@ -872,12 +917,12 @@ async def coinflip_receive_bet(message: Message):
         stats = TgConfig.COINFLIP_STATS.setdefault(user_id, {'games':0,'wins':0,'losses':0,'profit':0})
         stats['games'] += 1
         if stats['games'] == 1 and not has_user_achievement(user_id, 'first_coinflip'):
-            ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            ts = utcnow()
             grant_achievement(user_id, 'first_coinflip', ts)
             await bot.send_message(user_id, t(user_lang, 'achievement_unlocked', name=t(user_lang, 'achievement_first_coinflip')))
             logger.info(f"User {user_id} unlocked achievement first_coinflip")
         if win:
-            update_balance(user_id, bet * 2)
+            credit_balance(user_id, bet * 2)
             stats['wins'] += 1
             stats['profit'] += bet
             text = t(user_lang, 'win', amount=bet)
@@ -920,8 +965,7 @@ async def coinflip_create_confirm_handler(call: CallbackQuery):
     if stored_bet != bet or stored_side != side:
         await call.answer('Expired', show_alert=True)
         return
-    balance = get_user_balance(user_id)
-    if bet > balance:
+    if debit_if_sufficient(user_id, bet) is None:
         markup = InlineKeyboardMarkup().add(
             InlineKeyboardButton(t(user_lang, 'top_up'), callback_data='replenish_balance'))
         await bot.edit_message_text(t(user_lang, 'not_enough_balance'),
@@ -929,7 +973,6 @@ async def coinflip_create_confirm_handler(call: CallbackQuery):
                                     message_id=call.message.message_id,
                                     reply_markup=markup)
         return
-    buy_item_for_balance(user_id, bet)
     room_id = random.randint(100000, 999999)
     while room_id in TgConfig.COINFLIP_ROOMS:
         room_id = random.randint(100000, 999999)
@@ -959,7 +1002,7 @@ async def coinflip_cancel_handler(call: CallbackQuery):
     if not room or room['creator'] != user_id:
         await call.answer('Unable to cancel', show_alert=True)
         return
-    update_balance(user_id, room['bet'])
+    credit_balance(user_id, room['bet'])
     await bot.edit_message_text(t(user_lang, 'game_cancelled'),
                                 chat_id=call.message.chat.id,
                                 message_id=call.message.message_id,
@@ -1021,21 +1064,21 @@ async def coinflip_join_handler(call: CallbackQuery):
         await call.answer('Game not found', show_alert=True)
         return
     bet = room['bet']
-    balance = get_user_balance(user_id)
-    if bet > balance:
+    if debit_if_sufficient(user_id, bet) is None:
+        # Keep the room open for someone who can cover the bet.
+        TgConfig.COINFLIP_ROOMS[room_id] = room
         markup = InlineKeyboardMarkup().add(
             InlineKeyboardButton(t(user_lang, 'top_up'), callback_data='replenish_balance'))
         await bot.send_message(user_id, t(user_lang, 'not_enough_balance'), reply_markup=markup)
         return
-    buy_item_for_balance(user_id, bet)
     creator_id = room['creator']
     creator_side = room['side']
     join_side = 'tails' if creator_side == 'heads' else 'heads'
     result = random.choice(['heads', 'tails'])
     gif_path = TgConfig.HEADS_GIF if result == 'heads' else TgConfig.TAILS_GIF
     try:
-        await bot.send_animation(creator_id, InputFile(gif_path))
-        await bot.send_animation(user_id, InputFile(gif_path))
+        await send_media(bot, creator_id, gif_path, 'animation')
+        await send_media(bot, user_id, gif_path, 'animation')
     except Exception:
         pass
     await asyncio.sleep(4)
@@ -1043,12 +1086,12 @@ async def coinflip_join_handler(call: CallbackQuery):
         winner_id, loser_id = creator_id, user_id
     else:
         winner_id, loser_id = user_id, creator_id
-    update_balance(winner_id, bet * 2)
+    credit_balance(winner_id, bet * 2)
     for pid, win in ((winner_id, True), (loser_id, False)):
         stats = TgConfig.COINFLIP_STATS.setdefault(pid, {'games':0,'wins':0,'losses':0,'profit':0})
         stats['games'] += 1
         if stats['games'] == 1 and not has_user_achievement(pid, 'first_coinflip'):
-            ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            ts = utcnow()
             grant_achievement(pid, 'first_coinflip', ts)
             plang = get_user_language(pid) or 'en'
             await bot.send_message(pid, t(plang, 'achievement_unlocked', name=t(plang, 'achievement_first_coinflip')))
@@ -1077,7 +1120,7 @@ async def coinflip_join_handler(call: CallbackQuery):
 async def shop_callback_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
     TgConfig.STATE[user_id] = None
-    categories = get_all_categories()
+    categories = await run_db(get_all_categories)
     markup = categories_list(categories)
     await bot.edit_message_text('🏪 Shop categories',
                                 chat_id=call.message.chat.id,
@@ -1121,9 +1164,9 @@ async def item_info_callback_handler(call: CallbackQuery):
     item_name = call.data[5:]
     bot, user_id = await get_bot_user_ids(call)
     TgConfig.STATE[user_id] = None
-    item_info_list = get_item_info(item_name, user_id)
+    item_info_list = await run_db(get_item_info, item_name, user_id)
     category = item_info_list['category_name']
-    lang = get_user_language(user_id) or 'en'
+    lang = await run_db(get_user_language, user_id) or 'en'
     price = item_info_list["price"]
     markup = item_info(item_name, category, lang)
     caption = (
@@ -1142,11 +1185,7 @@ async def item_info_callback_handler(call: CallbackQuery):
     message_id = call.message.message_id
     if preview_path:
         await bot.delete_message(chat_id, message_id)
-        with open(preview_path, 'rb') as media:
-            if preview_path.endswith('.mp4'):
-                await bot.send_video(chat_id, media, caption=caption, reply_markup=markup)
-            else:
-                await bot.send_photo(chat_id, media, caption=caption, reply_markup=markup)
+        await send_media(bot, chat_id, preview_path, caption=caption, reply_markup=markup)
     else:
         await bot.edit_message_text(
             caption,
@@ -1156,15 +1195,6 @@ async def item_info_callback_handler(call: CallbackQuery):
         )
 
 
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-
-# Inline markup for Home button
-def home_markup(lang: str = 'en'):
-    return InlineKeyboardMarkup().add(
-        InlineKeyboardButton(t(lang, 'back_home'), callback_data="home_menu")
-    )
-
-
 async def gift_callback_handler(call: CallbackQuery):
     if not await ensure_feature_enabled("gift", call):
         return
@@ -1300,208 +1330,56 @@ async def buy_item_callback_handler(call: CallbackQuery):
     item_name = call.data[4:]
     bot, user_id = await get_bot_user_ids(call)
     msg = call.message.message_id
-    item_info_list = get_item_info(item_name, user_id)
+    item_info_list = await run_db(get_item_info, item_name, user_id)
     item_price = TgConfig.STATE.get(f'{user_id}_price', item_info_list["price"])
-    user_balance = get_user_balance(user_id)
-    lang = get_user_language(user_id) or 'en'
-    purchases_before = select_user_items(user_id)
+    user_balance = await run_db(get_user_balance, user_id)
+    lang = await run_db(get_user_language, user_id) or 'en'
     gift_to = TgConfig.STATE.get(f'{user_id}_gift_to')
     gift_name = TgConfig.STATE.get(f'{user_id}_gift_name')
 
     if user_balance >= item_price:
-        value_data = get_item_value(item_name)
-
-        if value_data:
-            # remove from stock immediately
-            buy_item(value_data['id'], value_data['is_infinity'])
-
-            current_time = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
-            formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
-            new_balance = buy_item_for_balance(user_id, item_price)
-            if gift_to:
-                add_bought_item(value_data['item_name'], value_data['value'], item_price, gift_to, formatted_time)
-                add_bought_item(value_data['item_name'], f'Gifted to @{gift_name}', item_price, user_id, formatted_time)
-            else:
-                add_bought_item(value_data['item_name'], value_data['value'], item_price, user_id, formatted_time)
-
-            referral_id = get_user_referral(user_id)
-            if referral_id and TgConfig.REFERRAL_PERCENT and can_get_referral_reward(value_data['item_name']):
-                reward = round(item_price * TgConfig.REFERRAL_PERCENT / 100, 2)
-                update_balance(referral_id, reward)
-                ref_lang = get_user_language(referral_id) or 'en'
-                await bot.send_message(
-                    referral_id,
-                    t(ref_lang, 'referral_reward', amount=f'{reward:.2f}', user=call.from_user.first_name),
-                    reply_markup=close(),
-                )
-            purchases = purchases_before + 1
-            level_before, _, _ = get_level_info(purchases_before, lang)
-            level_after, _, _ = get_level_info(purchases, lang)
-            if level_after != level_before:
-                await bot.send_message(
-                    user_id,
-                    t(lang, 'level_up', level=level_after),
-                )
-
-            username = (
-                f'@{call.from_user.username}'
-                if call.from_user.username
-                else call.from_user.full_name
-            )
-            parent_cat = get_category_parent(item_info_list['category_name'])
-
-            photo_desc = ''
-            file_path = None
-            if os.path.isfile(value_data['value']):
-                desc_file = f"{value_data['value']}.txt"
-                if os.path.isfile(desc_file):
-                    with open(desc_file) as f:
-                        photo_desc = f.read()
-                with open(value_data['value'], 'rb') as media:
-                    caption = (
-                        f'✅ Item purchased. **Balance**: <i>{new_balance}</i>€\n'
-                        f'📦 Purchases: {purchases}'
-                    )
-                    if photo_desc:
-                        caption += f'\n\n{photo_desc}'
-                    if gift_to:
-                        recipient_lang = get_user_language(gift_to) or 'en'
-                        recipient_caption = t(recipient_lang, 'gift_received', item=value_data['item_name'], user=username)
-                        if value_data['value'].endswith('.mp4'):
-                            await bot.send_video(gift_to, media, caption=recipient_caption, parse_mode='HTML')
-                        else:
-                            await bot.send_photo(gift_to, media, caption=recipient_caption, parse_mode='HTML')
-                    else:
-                        if value_data['value'].endswith('.mp4'):
-                            await bot.send_video(
-                                chat_id=call.message.chat.id,
-                                video=media,
-                                caption=caption,
-                                parse_mode='HTML'
-                            )
-                        else:
-                            await bot.send_photo(
-                                chat_id=call.message.chat.id,
-                                photo=media,
-                                caption=caption,
-                                parse_mode='HTML'
-                            )
-                sold_folder = os.path.join(os.path.dirname(value_data['value']), 'Sold')
-                os.makedirs(sold_folder, exist_ok=True)
-                file_path = os.path.join(sold_folder, os.path.basename(value_data['value']))
-                shutil.move(value_data['value'], file_path)
-                if os.path.isfile(desc_file):
-                    shutil.move(desc_file, os.path.join(sold_folder, os.path.basename(desc_file)))
-                log_path = os.path.join('assets', 'purchases.txt')
-                with open(log_path, 'a') as log_file:
-                    log_file.write(f"{formatted_time} user:{user_id} item:{item_name} price:{item_price}\n")
-
-                if not gift_to:
-                    await bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=msg,
-                        text=f'✅ Item purchased. 📦 Total Purchases: {purchases}',
-                        reply_markup=back(f'item_{item_name}')
-                    )
-
-                cleanup_item_file(value_data['value'])
-                if os.path.isfile(desc_file):
-                    cleanup_item_file(desc_file)
-            else:
-                text = (
-                    f'✅ Item purchased. **Balance**: <i>{new_balance}</i>€\n'
-                    f'📦 Purchases: {purchases}\n\n{value_data["value"]}'
-                )
-                if gift_to:
-                    recipient_lang = get_user_language(gift_to) or 'en'
-                    await bot.send_message(gift_to, t(recipient_lang, 'gift_received', item=value_data['item_name'], user=username))
-                else:
-                    await bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=msg,
-                        text=text,
-                        parse_mode='HTML',
-                        reply_markup=home_markup(get_user_language(user_id) or 'en')
-                    )
-                photo_desc = value_data['value']
-
-            update_lottery_tickets(user_id, 1)
-            await bot.send_message(user_id, t(lang, 'lottery_ticket_awarded'))
-            process_purchase_streak(user_id)
+        result = await PurchaseService(bot).purchase(
+            call.from_user,
+            call.message.chat.id,
+            msg,
+            item_name,
+            item_price,
+            lang,
+            gift_to=gift_to,
+            gift_name=gift_name,
+        )
+        if result['status'] == 'completed':
             reserve_msg_id = TgConfig.STATE.pop(f'{user_id}_reserve_msg', None)
             if reserve_msg_id:
                 try:
                     await bot.delete_message(user_id, reserve_msg_id)
                 except Exception:
                     pass
-            if gift_to:
-                await bot.send_message(user_id, t(lang, 'gift_sent', user=f'@{gift_name}'), reply_markup=back('profile'))
-                if not has_user_achievement(user_id, 'gift_sent'):
-                    ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    grant_achievement(user_id, 'gift_sent', ts)
-                    await bot.send_message(user_id, t(lang, 'achievement_unlocked', name=t(lang, 'achievement_gift_sent')))
-                    logger.info(f"User {user_id} unlocked achievement gift_sent")
-            else:
-                try:
-                    await bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=msg,
-                        text=f'✅ Item purchased. 📦 Total Purchases: {purchases}',
-                        reply_markup=back(f'item_{item_name}')
-                    )
-                except MessageNotModified:
-                    pass
+            recipient = gift_to or user_id
+            recipient_lang = await run_db(get_user_language, recipient) or lang
+            await schedule_feedback(recipient, recipient_lang, result['value']['item_name'])
             TgConfig.STATE.pop(f'{user_id}_gift_to', None)
             TgConfig.STATE.pop(f'{user_id}_gift_name', None)
-            if not has_user_achievement(user_id, 'first_purchase'):
-                grant_achievement(user_id, 'first_purchase', formatted_time)
-                await bot.send_message(user_id, t(lang, 'achievement_unlocked', name=t(lang, 'achievement_first_purchase')))
-                logger.info(f"User {user_id} unlocked achievement first_purchase")
-
-            recipient = gift_to or user_id
-            recipient_lang = get_user_language(recipient) or lang
-            asyncio.create_task(schedule_feedback(bot, recipient, recipient_lang, value_data['item_name']))
-
-            try:
-                await notify_owner_of_purchase(
-                    bot,
-                    username,
-                    formatted_time,
-                    value_data['item_name'],
-                    item_price,
-                    parent_cat,
-                    item_info_list['category_name'],
-                    photo_desc,
-                    file_path,
-                )
-
-                user_info = await bot.get_chat(user_id)
-                logger.info(
-                    f"User {user_id} ({user_info.first_name}) bought 1 item of {value_data['item_name']} for {item_price}€"
-                )
-            except Exception as e:
-                logger.error(f"Purchase post-processing failed for {user_id}: {e}")
-
             TgConfig.STATE.pop(f'{user_id}_pending_item', None)
             TgConfig.STATE.pop(f'{user_id}_price', None)
             TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
             return
+        if result['status'] == 'out_of_stock':
+            await bot.edit_message_text(chat_id=call.message.chat.id,
+                                        message_id=msg,
+                                        text='❌ Item out of stock',
+                                        reply_markup=back(f'item_{item_name}'))
+            TgConfig.STATE.pop(f'{user_id}_pending_item', None)
+            TgConfig.STATE.pop(f'{user_id}_price', None)
+            TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
+            TgConfig.STATE.pop(f'{user_id}_gift_to', None)
+            TgConfig.STATE.pop(f'{user_id}_gift_name', None)
+            return
+        # Another purchase or bet spent the money in the meantime.
+        user_balance = await run_db(get_user_balance, user_id)
 
-            if not gift_to:
-                await bot.edit_message_text(chat_id=call.message.chat.id,
-                                            message_id=msg,
-                                            text='❌ Item out of stock',
-                                            reply_markup=back(f'item_{item_name}'))
-        TgConfig.STATE.pop(f'{user_id}_pending_item', None)
-        TgConfig.STATE.pop(f'{user_id}_price', None)
-        TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
-        TgConfig.STATE.pop(f'{user_id}_gift_to', None)
-        TgConfig.STATE.pop(f'{user_id}_gift_name', None)
-        return
-
-    lang = get_user_language(user_id) or 'en'
     # Ensure the item is available before prompting for payment method.
-    if not get_item_value(item_name):
+    if not await run_db(get_item_value, item_name):
         await bot.edit_message_text(
             chat_id=call.message.chat.id,
             message_id=msg,
@@ -1567,7 +1445,7 @@ async def purchase_crypto_payment(call: CallbackQuery):
                 pass
         await bot.send_message(user_id, t(lang, 'payment_cancelled'))
 
-    value_data = get_item_value(item_name)
+    value_data = claim_item_value(item_name)
     if not value_data:
         await bot.edit_message_text(
             chat_id=call.message.chat.id,
@@ -1580,16 +1458,24 @@ async def purchase_crypto_payment(call: CallbackQuery):
         TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
         TgConfig.STATE.pop(f'{user_id}_deduct', None)
         return
-    if not value_data['is_infinity']:
-        buy_item(value_data['id'], value_data['is_infinity'])
     reserved = value_data
 
     amount = price - deduct
-    payment_id, address, pay_amount = create_payment(float(amount), currency)
+    try:
+        payment_id, address, pay_amount = await create_payment(float(amount), currency)
+    except NowPaymentsError as e:
+        logger.error(f"NOWPayments invoice for user {user_id} failed: {e}")
+        await _restore_reservation(bot, {'item': item_name, 'reserved': reserved})
+        TgConfig.STATE.pop(f'{user_id}_pending_item', None)
+        TgConfig.STATE.pop(f'{user_id}_price', None)
+        TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
+        TgConfig.STATE.pop(f'{user_id}_deduct', None)
+        await call.answer(t(lang, 'payment_unavailable'), show_alert=True)
+        return
 
     sleep_time = int(TgConfig.PAYMENT_TIME)
-    expires_at_dt = datetime.datetime.utcnow() + datetime.timedelta(seconds=sleep_time)
-    expires_at = expires_at_dt.strftime('%H:%M')
+    expires_at_dt = utcnow() + datetime.timedelta(seconds=sleep_time)
+    expires_at = format_local(expires_at_dt, '%H:%M')
     reservation_id = None
     if reserved:
         reservation_id = create_reservation_record(
@@ -1598,7 +1484,7 @@ async def purchase_crypto_payment(call: CallbackQuery):
             item_value=reserved.get('value'),
             is_infinity=reserved.get('is_infinity', False),
             operation_id=payment_id,
-            expires_at=expires_at_dt.isoformat(),
+            expires_at=expires_at_dt,
         )
     markup = crypto_invoice_menu(payment_id, lang)
     text = t(
@@ -1642,30 +1528,12 @@ async def purchase_crypto_payment(call: CallbackQuery):
     }
     TgConfig.STATE[user_id] = None
 
-    await asyncio.sleep(sleep_time)
-    info = get_unfinished_operation(payment_id)
-    if info:
-        user_id_db, _, message_id = info
-        status = await check_payment_async(payment_id)
-        if status not in ('finished', 'confirmed', 'sending'):
-            finish_operation(payment_id)
-            purchase_data = TgConfig.STATE.pop(f'purchase_{payment_id}', None)
-            await _restore_reservation(bot, purchase_data)
-            TgConfig.STATE.pop(f'{user_id}_pending_item', None)
-            TgConfig.STATE.pop(f'{user_id}_price', None)
-            TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
-            TgConfig.STATE.pop(f'{user_id}_deduct', None)
-            reserve_msg_id = TgConfig.STATE.pop(f'{user_id}_reserve_msg', None)
-            try:
-                await bot.delete_message(user_id_db, message_id)
-            except Exception:
-                pass
-            if reserve_msg_id:
-                try:
-                    await bot.delete_message(user_id_db, reserve_msg_id)
-                except Exception:
-                    pass
-            await bot.send_message(user_id, t(lang, 'invoice_cancelled'), reply_markup=home_markup(lang))
+    await schedule_invoice_expiry(payment_id, user_id, lang, 'nowpayments', {
+        'item': item_name,
+        'reserved': reserved,
+        'reservation_id': reservation_id,
+        'reserve_msg_id': reserve_msg.message_id,
+    })
  
 
 async def cancel_purchase(call: CallbackQuery):
@@ -1747,7 +1615,7 @@ async def bought_item_info_callback_handler(call: CallbackQuery):
     await bot.edit_message_text(
         f'**Item**: <code>{display_name(item["item_name"])}</code>\n'
         f'**Price**: <code>{item["price"]}</code>€\n'
-        f'**Purchase date**: <code>{item["bought_datetime"]}</code>',
+        f'**Purchase date**: <code>{format_local(item["bought_datetime"])}</code>',
         chat_id=call.message.chat.id,
         message_id=call.message.message_id,
         parse_mode='HTML',
@@ -1784,14 +1652,14 @@ async def profile_callback_handler(call: CallbackQuery):
     bot, user_id = await get_bot_user_ids(call)
     user = call.from_user
     TgConfig.STATE[user_id] = None
-    user_info = check_user(user_id)
-    user_lang = get_user_language(user_info, 'en')
+    user_info = await run_db(check_user, user_id)
+    user_lang = user_info.language or 'en'
     balance_raw = user_info.balance
-    operations = select_user_operations(user_id) or []
+    operations = await run_db(select_user_operations, user_id) or []
     total_topped = sum((Decimal(str(value)) for value in operations), Decimal("0"))
     balance_amount = Decimal(str(balance_raw or 0)).quantize(Decimal("0.01"))
     total_amount = total_topped.quantize(Decimal("0.01"))
-    items = select_user_items(user_id)
+    items = await run_db(select_user_items, user_id)
     markup = profile(items, user_lang)
 
     safe_name = html.escape(
@@ -1996,14 +1864,7 @@ async def pay_yoomoney(call: CallbackQuery):
                                      f'**❗️ After payment press "Check payment"**',
                                 reply_markup=markup)
     start_operation(user_id, amount, label, call.message.message_id)
-    await asyncio.sleep(sleep_time)
-    info = get_unfinished_operation(label)
-    if info:
-        _, _, _ = info
-        status = await check_payment_status(label)
-        if status not in ('paid', 'success'):
-            finish_operation(label)
-            await bot.send_message(user_id, t(lang, 'invoice_cancelled'))
+    await schedule_invoice_expiry(label, user_id, lang, 'yoomoney')
 
 
 async def crypto_payment(call: CallbackQuery):
@@ -2020,13 +1881,16 @@ async def crypto_payment(call: CallbackQuery):
         await call.answer(text='❌ Invoice not found')
         return
 
-    payment_id, address, pay_amount = create_payment(float(amount), currency)
+    lang = get_user_language(user_id) or 'en'
+    try:
+        payment_id, address, pay_amount = await create_payment(float(amount), currency)
+    except NowPaymentsError as e:
+        logger.error(f"NOWPayments invoice for user {user_id} failed: {e}")
+        await call.answer(t(lang, 'payment_unavailable'), show_alert=True)
+        return
 
     sleep_time = int(TgConfig.PAYMENT_TIME)
-    lang = get_user_language(user_id) or 'en'
-    expires_at = (
-        datetime.datetime.utcnow() + datetime.timedelta(seconds=sleep_time)
-    ).strftime('%H:%M')
+    expires_at = format_local(utcnow() + datetime.timedelta(seconds=sleep_time), '%H:%M')
     markup = crypto_invoice_menu(payment_id, lang)
     text = t(
         lang,
@@ -2052,14 +1916,7 @@ async def crypto_payment(call: CallbackQuery):
         reply_markup=markup,
     )
     start_operation(user_id, amount, payment_id, sent.message_id)
-    await asyncio.sleep(sleep_time)
-    info = get_unfinished_operation(payment_id)
-    if info:
-        _, _, _ = info
-        status = await check_payment_async(payment_id)
-        if status not in ('finished', 'confirmed', 'sending'):
-            finish_operation(payment_id)
-            await bot.send_message(user_id, t(lang, 'invoice_cancelled'))
+    await schedule_invoice_expiry(payment_id, user_id, lang, 'nowpayments')
 
 
 async def checking_payment(call: CallbackQuery):
@@ -2073,22 +1930,16 @@ async def checking_payment(call: CallbackQuery):
         lang = get_user_language(user_id_db) or 'en'
         payment_status = await check_payment_status(label)
         if payment_status is None:
-            payment_status = await check_payment_async(label)
-        if payment_status in ("success", "paid", "finished", "confirmed", "sending"):
-            current_time = datetime.datetime.now()
-            formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
-            referral_id = get_user_referral(user_id)
-            finish_operation(label)
-
+            try:
+                payment_status = await check_payment(label)
+            except NowPaymentsError as e:
+                logger.error(f"Payment status check for {label} failed: {e}")
+        if payment_status in PAID_STATUSES:
             purchase_data = TgConfig.STATE.pop(f'purchase_{label}', None)
             if purchase_data:
-                mark_reservation_completed_by_operation(label)
                 item_name = purchase_data['item']
-                price = purchase_data['price']
-                deduct = purchase_data['deduct']
                 reserved = purchase_data.get('reserved')
                 gift_to = purchase_data.get('gift_to')
-                gift_name = purchase_data.get('gift_name')
                 reserve_msg_id = TgConfig.STATE.pop(f'{user_id}_reserve_msg', None)
                 if reserve_msg_id:
                     try:
@@ -2096,208 +1947,47 @@ async def checking_payment(call: CallbackQuery):
                     except Exception:
                         pass
 
-                if referral_id and TgConfig.REFERRAL_PERCENT and can_get_referral_reward(item_name):
-                    reward = round(price * TgConfig.REFERRAL_PERCENT / 100, 2)
-                    update_balance(referral_id, reward)
-                    ref_lang = get_user_language(referral_id) or 'en'
-                    await bot.send_message(
-                        referral_id,
-                        t(ref_lang, 'referral_reward', amount=f'{reward:.2f}', user=call.from_user.first_name),
-                        reply_markup=close(),
-                    )
-
-                create_operation(user_id, operation_value, formatted_time)
-                update_balance(user_id, operation_value)
-                item_info_list = get_item_info(item_name, user_id)
-
-                if reserved:
-                    value_data = reserved
+                result = await PurchaseService(bot).purchase(
+                    call.from_user,
+                    call.message.chat.id,
+                    message_id,
+                    item_name,
+                    purchase_data['price'],
+                    lang,
+                    gift_to=gift_to,
+                    gift_name=purchase_data.get('gift_name'),
+                    reserved=reserved,
+                    top_up=(label, operation_value),
+                    back_to='profile',
+                )
+                # The purchase released the reservation itself if nothing was bought.
+                for restocked in result['restocked']:
+                    await notify_restock(bot, restocked)
+                if result['status'] == 'insufficient':
+                    # The top-up stays on the balance.
+                    await bot.send_message(user_id, t(lang, 'not_enough_balance'))
+                elif result['status'] == 'out_of_stock':
+                    await bot.send_message(user_id, '❌ Item out of stock')
                 else:
-                    value_data = get_item_value(item_name)
-                    if value_data:
-                        buy_item(value_data['id'], value_data['is_infinity'])
-                if value_data:
-                    new_balance = buy_item_for_balance(user_id, price)
-                    if gift_to:
-                        add_bought_item(value_data['item_name'], value_data['value'], price, gift_to, formatted_time)
-                        purchase_id = add_bought_item(value_data['item_name'], f'Gifted to @{gift_name}', price, user_id, formatted_time)
-                    else:
-                        purchase_id = add_bought_item(value_data['item_name'], value_data['value'], price, user_id, formatted_time)
-
-                    purchases = select_user_items(user_id)
-                    photo_desc = ''
-                    file_path = None
-                    if os.path.isfile(value_data['value']):
-                        desc_file = f"{value_data['value']}.txt"
-                        if os.path.isfile(desc_file):
-                            with open(desc_file) as f:
-                                photo_desc = f.read()
-                        with open(value_data['value'], 'rb') as media:
-                            caption = (
-                                f'✅ Item purchased. **Balance**: <i>{new_balance}</i>€\n'
-                                f'📦 Purchases: {purchases}'
-                            )
-                            if photo_desc:
-                                caption += f'\n\n{photo_desc}'
-                            if gift_to:
-                                recipient_lang = get_user_language(gift_to) or 'en'
-                                recipient_caption = t(
-                                    recipient_lang,
-                                    'gift_received',
-                                    item=value_data['item_name'],
-                                    user=username
-                                )
-                                if value_data['value'].endswith('.mp4'):
-                                    await bot.send_video(
-                                        gift_to,
-                                        media,
-                                        caption=recipient_caption,
-                                        parse_mode='HTML'
-                                    )
-                                else:
-                                    await bot.send_photo(
-                                        gift_to,
-                                        media,
-                                        caption=recipient_caption,
-                                        parse_mode='HTML'
-                                    )
-                            else:
-                                if value_data['value'].endswith('.mp4'):
-                                    await bot.send_video(
-                                        chat_id=call.message.chat.id,
-                                        video=media,
-                                        caption=caption,
-                                        parse_mode='HTML'
-                                    )
-                                else:
-                                    await bot.send_photo(
-                                        chat_id=call.message.chat.id,
-                                        photo=media,
-                                        caption=caption,
-                                        parse_mode='HTML'
-                                    )
-
-
-                        sold_folder = os.path.join(os.path.dirname(value_data['value']), 'Sold')
-                        os.makedirs(sold_folder, exist_ok=True)
-                        file_path = os.path.join(sold_folder, os.path.basename(value_data['value']))
-                        shutil.move(value_data['value'], file_path)
-                        if os.path.isfile(desc_file):
-                            shutil.move(desc_file, os.path.join(sold_folder, os.path.basename(desc_file)))
-                        cleanup_item_file(value_data['value'])
-                        if os.path.isfile(desc_file):
-                            cleanup_item_file(desc_file)
-                    else:
-                        if gift_to:
-                            recipient_lang = get_user_language(gift_to) or 'en'
-                            await bot.send_message(
-                                gift_to,
-                                t(
-                                    recipient_lang,
-                                    'gift_received',
-                                    item=value_data['item_name'],
-                                    user=username
-                                )
-                            )
-                        else:
-                            await bot.send_message(
-                                call.message.chat.id,
-                                value_data['value']
-                            )
-
-
-
-                    parent_cat = get_category_parent(item_info_list['category_name'])
-                    username = f'@{call.from_user.username}' if call.from_user.username else call.from_user.full_name
-                    await notify_owner_of_purchase(
-                        bot,
-                        username,
-                        formatted_time,
-                        value_data['item_name'],
-                        price,
-                        parent_cat,
-                        item_info_list['category_name'],
-                        photo_desc,
-                        file_path,
-                    )
-                    if gift_to:
-                        await bot.send_message(user_id, t(lang, 'gift_sent', user=f'@{gift_name}'), reply_markup=back('profile'))
-                        if not has_user_achievement(user_id, 'gift_sent'):
-                            ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                            grant_achievement(user_id, 'gift_sent', ts)
-                            await bot.send_message(user_id, t(lang, 'achievement_unlocked', name=t(lang, 'achievement_gift_sent')))
-                            logger.info(f"User {user_id} unlocked achievement gift_sent")
-
-
-
-                    if gift_to:
-                        await bot.send_message(user_id, t(lang, 'gift_sent', user=f'@{gift_name}'), reply_markup=back('profile'))
-                    else:
-                        try:
-                            await bot.edit_message_text(
-                                chat_id=call.message.chat.id,
-                                message_id=message_id,
-                                text=f'✅ Item purchased. 📦 Total Purchases: {purchases}',
-                                reply_markup=back('profile')
-                            )
-                        except MessageNotModified:
-                            pass
-                    update_lottery_tickets(user_id, 1)
-                    await bot.send_message(user_id, t(lang, 'lottery_ticket_awarded'))
-                    process_purchase_streak(user_id)
-                    if not has_user_achievement(user_id, 'first_purchase'):
-                        grant_achievement(user_id, 'first_purchase', formatted_time)
-                        await bot.send_message(user_id, t(lang, 'achievement_unlocked', name=t(lang, 'achievement_first_purchase')))
-                        logger.info(f"User {user_id} unlocked achievement first_purchase")
                     TgConfig.STATE.pop(f'{user_id}_pending_item', None)
                     TgConfig.STATE.pop(f'{user_id}_price', None)
                     TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
                     TgConfig.STATE.pop(f'{user_id}_deduct', None)
                     recipient = gift_to or user_id
                     recipient_lang = get_user_language(recipient) or lang
-                    asyncio.create_task(schedule_feedback(bot, recipient, recipient_lang, value_data['item_name']))
-                    await bot.send_message(user_id, t(lang, 'top_up_completed'))
-                    if not has_user_achievement(user_id, 'first_topup'):
-                        ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        grant_achievement(user_id, 'first_topup', ts)
-                        await bot.send_message(user_id, t(lang, 'achievement_unlocked', name=t(lang, 'achievement_first_topup')))
-                        logger.info(f"User {user_id} unlocked achievement first_topup")
-
-                    try:
-                        await bot.edit_message_text(
-                            chat_id=call.message.chat.id,
-                            message_id=message_id,
-                            text=f'✅ Item purchased. 📦 Total Purchases: {purchases}',
-                            reply_markup=back('profile')
-                        )
-                    except MessageNotModified:
-                        pass
-
-                    TgConfig.STATE.pop(f'{user_id}_pending_item', None)
-                    TgConfig.STATE.pop(f'{user_id}_price', None)
-                    TgConfig.STATE.pop(f'{user_id}_promo_applied', None)
-
-                    await bot.send_message(user_id, t(lang, 'top_up_completed'))
-
-                    recipient = gift_to or user_id
-                    recipient_lang = get_user_language(recipient) or lang
-                    asyncio.create_task(schedule_feedback(bot, recipient, recipient_lang, value_data['item_name']))
-
-                else:
-                    await bot.send_message(user_id, '❌ Item out of stock')
+                    await schedule_feedback(recipient, recipient_lang, result['value']['item_name'])
             else:
-
-
-
-                create_operation(user_id, operation_value, formatted_time)
-                update_balance(user_id, operation_value)
+                if not complete_top_ups([label]):
+                    # Already credited by the IPN inbox or reconciliation, which told the user.
+                    await call.answer()
+                    return
                 await bot.edit_message_text(chat_id=call.message.chat.id,
                                             message_id=message_id,
                                             text=f'✅ Balance topped up by {operation_value}€',
                                             reply_markup=back('profile'))
                 await bot.send_message(user_id, t(lang, 'top_up_completed'))
                 if not has_user_achievement(user_id, 'first_topup'):
-                    ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    ts = utcnow()
                     grant_achievement(user_id, 'first_topup', ts)
                     await bot.send_message(user_id, t(lang, 'achievement_unlocked', name=t(lang, 'achievement_first_topup')))
                     logger.info(f"User {user_id} unlocked achievement first_topup")
@@ -2403,8 +2093,7 @@ async def set_language(call: CallbackQuery):
     text = build_menu_text(call.from_user, balance, purchases, user.purchase_streak, lang_code)
 
     try:
-        with open(TgConfig.START_PHOTO_PATH, 'rb') as photo:
-            await bot.send_photo(user_id, photo)
+        await send_media(bot, user_id, TgConfig.START_PHOTO_PATH, 'photo')
     except Exception:
         pass
 
@@ -2548,33 +2237,3 @@ def register_user_handlers(dp: Dispatcher):
     dp.register_callback_query_handler(pavogti_item_callback,
                                        lambda c: c.data.startswith('pavogti_item_'))
 
-
-# --- async wrapper injected by fix ---
-async def check_payment_async(payment_id):
-    """Async wrapper around check_payment to ensure proper aiohttp session handling.
-    If a sync check_payment exists, run it in thread executor; otherwise, if an async
-    version exists, await it. Also ensures sessions are properly closed.
-    """
-    import asyncio
-    try:
-        # Prefer existing async function
-        from bot.services.payments import check_payment as existing_check
-        if asyncio.iscoroutinefunction(existing_check):
-            return await existing_check(payment_id)
-        else:
-            # Run sync function without blocking loop
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, existing_check, payment_id)
-    except Exception:
-        # Fallback: if local check_payment exists in this module
-        try:
-            if 'check_payment' in globals():
-                _cp = globals()['check_payment']
-                import asyncio as _asyncio
-                if _asyncio.iscoroutinefunction(_cp):
-                    return await _cp(payment_id)
-                loop = _asyncio.get_event_loop()
-                return await loop.run_in_executor(None, _cp, payment_id)
-        except Exception:
-            raise
-# --- end async wrapper ---
\ No newline at end of file
@@ -1,25 +1,17 @@
-from flask import Flask, request, abort
-import datetime
-import hmac
 import hashlib
-import asyncio
+import hmac
+import json
+
 from aiogram import Bot
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from bot.localization import t
-
-from bot.misc import EnvKeys, TgConfig
-from bot.database import Database
-from bot.database.models.main import UnfinishedOperations
-from bot.database.methods import (
-    finish_operation,
-    create_operation,
-    update_balance,
-    get_user_referral,
-    get_user_language,
-)
+from aiohttp import web
+
+from bot.database import run_db
+from bot.database.methods import record_ipn_event
 from bot.logger_mesh import logger
+from bot.misc import EnvKeys
+from bot.services.ipn_inbox import start_ipn_worker, wake
 
-app = Flask(__name__)
+_runner: web.AppRunner | None = None
 
 
 def verify_signature(data: bytes, signature: str | None) -> bool:
@@ -35,53 +27,55 @@ def verify_signature(data: bytes, signature: str | None) -> bool:
     return hmac.compare_digest(calc, signature)
 
 
-@app.route("/nowpayments-ipn", methods=["POST"])
-@app.route("/", methods=["POST"])  # fallback if IPN path omitted
-def nowpayments_ipn():
-    if not verify_signature(request.data, request.headers.get("x-nowpayments-sig")):
-        abort(400)
+async def nowpayments_ipn(request: web.Request) -> web.Response:
+    body = await request.read()
+    if not verify_signature(body, request.headers.get("x-nowpayments-sig")):
+        raise web.HTTPBadRequest()
 
     # try to parse JSON regardless of Content-Type header
-    data = request.get_json(force=True, silent=True) or {}
-    payment_id = str(data.get("payment_id"))
+    try:
+        data = json.loads(body) or {}
+    except ValueError:
+        data = {}
+    payment_id = str(data.get("payment_id") or '')
     status = data.get("payment_status")
     if not payment_id or not status:
-        return "", 400
-
-    if status in ("finished", "confirmed", "sending", "paid", "partially_paid"):
-        session = Database().session
-        record = (
-            session.query(UnfinishedOperations)
-            .filter(UnfinishedOperations.operation_id == payment_id)
-            .first()
-        )
-        if record:
-            value = record.operation_value
-            user_id = record.user_id
-            message_id = record.message_id
-            finish_operation(payment_id)
-            formatted_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            create_operation(user_id, value, formatted_time)
-            update_balance(user_id, value)
-
-            # Referral bonuses apply only to purchases, not balance top-ups
-
-            logger.info(
-                "NOWPayments IPN confirmed payment %s for user %s", payment_id, user_id
-            )
-
-            # notify user and delete invoice
-            bot = Bot(token=EnvKeys.TOKEN, parse_mode="HTML")
-            lang = get_user_language(user_id) or 'en'
-            markup = InlineKeyboardMarkup().add(
-                InlineKeyboardButton(t(lang, 'back_home'), callback_data='home_menu')
-            )
-            asyncio.run(bot.delete_message(chat_id=user_id, message_id=message_id))
-            asyncio.run(
-                bot.send_message(
-                    chat_id=user_id,
-                    text=t(lang, 'payment_successful', amount=value),
-                    reply_markup=markup,
-                )
-            )
-    return "", 200
+        raise web.HTTPBadRequest()
+
+    # Acknowledge as soon as the event is stored; the inbox worker applies it.
+    if await run_db(record_ipn_event, payment_id, str(status), body.decode(errors='replace')):
+        wake()
+    else:
+        logger.info("Duplicate NOWPayments IPN %s/%s ignored", payment_id, status)
+    return web.Response()
+
+
+def add_ipn_routes(app: web.Application) -> None:
+    app.router.add_post("/nowpayments-ipn", nowpayments_ipn)
+    app.router.add_post("/", nowpayments_ipn)  # fallback if IPN path omitted
+
+
+def create_ipn_app(bot: Bot) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024)
+    app['bot'] = bot
+    add_ipn_routes(app)
+    return app
+
+
+async def start_ipn_server(bot: Bot) -> None:
+    """Serve IPNs on the running event loop, with the inbox worker sharing the dispatcher's bot."""
+    global _runner
+    if _runner is not None:
+        return
+    start_ipn_worker(bot)
+    _runner = web.AppRunner(create_ipn_app(bot))
+    await _runner.setup()
+    await web.TCPSite(_runner, EnvKeys.IPN_HOST, int(EnvKeys.IPN_PORT)).start()
+    logger.info("IPN server listening on %s:%s", EnvKeys.IPN_HOST, EnvKeys.IPN_PORT)
+
+
+async def stop_ipn_server() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
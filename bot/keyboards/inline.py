@@ -695,6 +695,13 @@ def back(callback: str, lang: str | None = None) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
 
 
+def home_markup(lang: str = 'en') -> InlineKeyboardMarkup:
+    inline_keyboard = [
+        [InlineKeyboardButton(t(lang, 'back_home'), callback_data='home_menu')]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+
+
 def payment_menu(url: str, label: str, lang: str) -> InlineKeyboardMarkup:
     """Return markup for fiat payment invoices."""
     inline_keyboard = [
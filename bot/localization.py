@@ -105,6 +105,7 @@ LANGUAGES = {
         'broadcast_no_regions': 'No regions configured yet.',
         'broadcast_no_recipients': '❌ No recipients match the selected segment.',
         'broadcast_completed': '✅ Broadcast sent to {count} users.',
+        'broadcast_progress': '📤 Broadcasting… {done}/{total}\n✅ Sent: {sent}\n🚫 Blocked: {blocked}\n⚠️ Failed: {failed}',
         'choose_language': 'Please choose a language',
         'invoice_message': (
             '🧾 <b>Payment Invoice Created</b>\n\n'
@@ -120,6 +121,7 @@ LANGUAGES = {
         'payment_successful': '✅ Payment confirmed. Balance increased by {amount}€',
         'back_home': 'Back Home',
         'invoice_cancelled': 'Payment failed/expired. Your items are no longer reserved.',
+        'payment_unavailable': '❌ Crypto payments are temporarily unavailable. Please try again in a few minutes.',
         'total_purchases': '📦 Total Purchases: {count}',
         'streak': '🔥 Streak: {days} days',
         'note': '⚠️ Note: No refunds. Please ensure you send the exact amount for payments, as underpayments will not be confirmed.',
@@ -154,6 +156,9 @@ LANGUAGES = {
         'tools': '🧰 Tools',
         'lottery': '🎟️ Lottery',
         'insufficient_rights': 'Insufficient rights',
+        'ipn_replay_done': '🔁 {count} failed IPN event(s) queued for replay.',
+        'ipn_replay_none': 'No failed IPN events.',
+        'ipn_replay_usage': 'Usage: /ipn_replay [event id]',
         'back_button': '🔙 Back',
         'user_not_found': '❌ User not found.',
         'assistant_choose_action': 'Choose an action:',
@@ -450,6 +455,7 @@ LANGUAGES = {
         'broadcast_no_regions': 'Регионы еще не настроены.',
         'broadcast_no_recipients': '❌ Нет получателей для выбранного сегмента.',
         'broadcast_completed': '✅ Рассылка отправлена {count} пользователям.',
+        'broadcast_progress': '📤 Рассылка… {done}/{total}\n✅ Отправлено: {sent}\n🚫 Заблокировали: {blocked}\n⚠️ Ошибки: {failed}',
         'choose_language': 'Пожалуйста, выберите язык',
         'invoice_message': (
             '🧾 <b>Создан инвойс на оплату</b>\n\n'
@@ -465,6 +471,7 @@ LANGUAGES = {
         'payment_successful': '✅ Платёж подтверждён. Баланс пополнен на {amount}€',
         'back_home': 'Назад домой',
         'invoice_cancelled': 'Оплата не завершена/истекла. Ваши товары больше не зарезервированы.',
+        'payment_unavailable': '❌ Оплата криптовалютой временно недоступна. Попробуйте через несколько минут.',
         'total_purchases': '📦 Всего покупок: {count}',
         'streak': '🔥 Серия: {days} дн.',
         'note': '⚠️ Возврат средств невозможен. Отправляйте точную сумму, недоплаты не подтверждаются.',
@@ -499,6 +506,9 @@ LANGUAGES = {
         'tools': '🧰 Инструменты',
         'lottery': '🎟️ Лотерея',
         'insufficient_rights': 'Недостаточно прав',
+        'ipn_replay_done': '🔁 Повторная обработка IPN-событий: {count}.',
+        'ipn_replay_none': 'Нет неудавшихся IPN-событий.',
+        'ipn_replay_usage': 'Использование: /ipn_replay [id события]',
         'back_button': '🔙 Назад',
         'user_not_found': '❌ Пользователь не найден.',
         'assistant_choose_action': 'Выберите действие:',
@@ -792,6 +802,7 @@ LANGUAGES = {
         'broadcast_no_regions': 'Regionai dar nesukonfigūruoti.',
         'broadcast_no_recipients': '❌ Pasirinktai auditorijai vartotojų nėra.',
         'broadcast_completed': '✅ Pranešimas išsiųstas {count} vartotojams.',
+        'broadcast_progress': '📤 Siunčiama… {done}/{total}\n✅ Išsiųsta: {sent}\n🚫 Užblokavo: {blocked}\n⚠️ Nepavyko: {failed}',
         'choose_language': 'Pasirinkite kalbą',
         'invoice_message': (
             '🧾 <b>Sukurta mokėjimo sąskaita</b>\n\n'
@@ -807,6 +818,7 @@ LANGUAGES = {
         'payment_successful': '✅ Mokėjimas patvirtintas. Balansas padidintas {amount}€',
         'back_home': 'Grįžti į pradžią',
         'invoice_cancelled': 'Mokėjimas nepavyko/baigėsi. Jūsų prekės nebėra rezervuotos.',
+        'payment_unavailable': '❌ Mokėjimai kriptovaliuta laikinai neveikia. Bandykite po kelių minučių.',
         'total_purchases': '📦 Viso pirkinių: {count}',
         'streak': '🔥 Serija: {days} d.',
         'note': '⚠️ Pastaba: grąžinimų nėra. Įsitikinkite, kad siunčiate tikslią sumą, nes nepakankamos sumos nebus patvirtintos.',
@@ -841,6 +853,9 @@ LANGUAGES = {
         'tools': '🧰 Įrankiai',
         'lottery': '🎟️ Loterija',
         'insufficient_rights': 'Nepakanka teisių',
+        'ipn_replay_done': '🔁 Pakartotinai apdorojami IPN įvykiai: {count}.',
+        'ipn_replay_none': 'Nepavykusių IPN įvykių nėra.',
+        'ipn_replay_usage': 'Naudojimas: /ipn_replay [įvykio id]',
         'back_button': '🔙 Grįžti atgal',
         'user_not_found': '❌ Vartotojas nerastas.',
         'assistant_choose_action': 'Pasirinkite veiksmą:',
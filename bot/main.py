@@ -1,21 +1,33 @@
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from aiogram.utils import executor
-from aiogram import Bot, Dispatcher
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram import Dispatcher
 
 from bot.filters import register_all_filters
 from bot.misc import EnvKeys
+from bot.misc.nowpayments import nowpayments
 from bot.handlers import register_all_handlers
 from bot.handlers.admin.feature_toggle import register_feature_toggle_handler
 from bot.handlers.other import verify_control_chat_access
+from bot.ipn_server import start_ipn_server, stop_ipn_server
 from bot.database.models import register_models
+from bot.database.fsm_storage import SQLiteStorage
 from bot.logger_mesh import logger
 from bot.database.methods import ensure_owner_account
+from bot.services.broadcast import resume_campaigns
+from bot.services.ipn_inbox import start_ipn_worker
+from bot.services.outbound import OutboundBot
+from bot.services.reconciliation import start_reconciliation
+from bot.services.scheduler import scheduler
+from bot.services.state_sync import flush_state, restore_state, start_state_sync
+from bot.webhook import start_webhook
 
 async def __on_start_up(dp: Dispatcher) -> None:
     register_all_filters(dp)
     register_all_handlers(dp)
     register_feature_toggle_handler(dp)
     register_models()
+    await restore_state()
+    start_state_sync()
 
     ensure_owner_account(EnvKeys.OWNER_ID)
 
@@ -36,9 +48,27 @@ async def __on_start_up(dp: Dispatcher) -> None:
         logger.warning("OWNER_ID is not set or invalid; cannot send startup ping.")
 
     await verify_control_chat_access(dp.bot)
+    await resume_campaigns(dp.bot)
+    await scheduler.start(dp.bot)
+    start_reconciliation(dp.bot)
+    if EnvKeys.WEBHOOK_URL:
+        # IPNs arrive on the webhook server.
+        start_ipn_worker(dp.bot)
+    else:
+        await start_ipn_server(dp.bot)
+
+
+async def __on_shut_down(dp: Dispatcher) -> None:
+    await stop_ipn_server()
+    await flush_state()
+    await nowpayments.close()
 
 
 def start_bot():
-    bot = Bot(token=EnvKeys.TOKEN, parse_mode='HTML')
-    dp = Dispatcher(bot, storage=MemoryStorage())
-    executor.start_polling(dp, skip_updates=False, on_startup=__on_start_up)
\ No newline at end of file
+    server = TelegramAPIServer.from_base(EnvKeys.TELEGRAM_API_URL) if EnvKeys.TELEGRAM_API_URL else TELEGRAM_PRODUCTION
+    bot = OutboundBot(token=EnvKeys.TOKEN, parse_mode='HTML', server=server)
+    dp = Dispatcher(bot, storage=SQLiteStorage())
+    if EnvKeys.WEBHOOK_URL:
+        start_webhook(dp, on_startup=__on_start_up, on_shutdown=__on_shut_down)
+    else:
+        executor.start_polling(dp, skip_updates=False, on_startup=__on_start_up, on_shutdown=__on_shut_down)
\ No newline at end of file
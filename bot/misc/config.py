@@ -1,9 +1,11 @@
 from abc import ABC
 from typing import Final
 
+from bot.misc.state import StateStore
+
 
 class TgConfig(ABC):
-    STATE: Final = {}
+    STATE: Final = StateStore()
     BASKETS: Final = {}
     BLACKJACK_STATS: Final = {}
     COINFLIP_STATS: Final = {}
@@ -0,0 +1,31 @@
+import datetime
+
+# Timestamps are stored as naive UTC; the shop and its admins read them in GMT+3.
+LOCAL_OFFSET = datetime.timedelta(hours=3)
+# The same offset as an SQLite date-function modifier.
+SQLITE_LOCAL_MODIFIER = '+3 hours'
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+def local_now() -> datetime.datetime:
+    return utcnow() + LOCAL_OFFSET
+
+
+def local_today() -> datetime.date:
+    return local_now().date()
+
+
+def format_local(value: datetime.datetime | None, fmt: str = '%Y-%m-%d %H:%M:%S') -> str:
+    """Render a stored UTC timestamp in shop time; ``-`` when there is none."""
+    if value is None:
+        return '-'
+    return (value + LOCAL_OFFSET).strftime(fmt)
+
+
+def local_day_bounds(day: datetime.date) -> tuple[datetime.datetime, datetime.datetime]:
+    """Return the half-open UTC range ``[start, end)`` covering a shop-local day."""
+    start = datetime.datetime.combine(day, datetime.time.min) - LOCAL_OFFSET
+    return start, start + datetime.timedelta(days=1)
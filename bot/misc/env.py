@@ -18,6 +18,19 @@ class EnvKeys(ABC):
     SHK_MERCHANT_ID: Final = os.environ.get('SHK_MERCHANT_ID')
     NOWPAYMENTS_API_KEY: Final = os.environ.get('NOWPAYMENTS_API_KEY', 'PHXJH8R-3F3MRDT-M28PW7S-E0MV698')
 
+    NOWPAYMENTS_API_URL: Final = os.environ.get('NOWPAYMENTS_API_URL', 'https://api.nowpayments.io/v1')
     NOWPAYMENTS_IPN_URL: Final = os.environ.get('NOWPAYMENTS_IPN_URL')
     NOWPAYMENTS_IPN_SECRET: Final = os.environ.get('NOWPAYMENTS_IPN_SECRET')
+    IPN_HOST: Final = os.environ.get('IPN_HOST', '0.0.0.0')
+    IPN_PORT: Final = os.environ.get('IPN_PORT', '5000')
+    # Hours the old server clock was ahead of UTC; only read when legacy timestamps are converted.
+    LEGACY_UTC_OFFSET_HOURS: Final = os.environ.get('LEGACY_UTC_OFFSET_HOURS', '3')
 
+
+    # Base URL of the Bot API server; point it at a local fake server to drive the bot in tests.
+    TELEGRAM_API_URL: Final = os.environ.get('TELEGRAM_API_URL')
+    # Setting WEBHOOK_URL switches from long polling to webhooks served on IPN_HOST:IPN_PORT.
+    WEBHOOK_URL: Final = os.environ.get('WEBHOOK_URL')
+    WEBHOOK_PATH: Final = os.environ.get('WEBHOOK_PATH', '/telegram-webhook')
+    WEBHOOK_SECRET: Final = os.environ.get('WEBHOOK_SECRET')
+    WEBHOOK_MAX_CONNECTIONS: Final = os.environ.get('WEBHOOK_MAX_CONNECTIONS', '40')
@@ -1,42 +1,152 @@
-import requests
+import asyncio
+import time
 from typing import Tuple
 
+import aiohttp
+
 from .env import EnvKeys
 
-API_BASE = "https://api.nowpayments.io/v1"
+API_BASE = EnvKeys.NOWPAYMENTS_API_URL
 API_KEY = EnvKeys.NOWPAYMENTS_API_KEY
 
 IPN_URL = EnvKeys.NOWPAYMENTS_IPN_URL
 
 
+class NowPaymentsError(Exception):
+    """NOWPayments could not be reached or rejected the request."""
+
+
+class CircuitOpenError(NowPaymentsError):
+    """Requests are short-circuited after repeated failures."""
+
+
+class CircuitBreaker:
+    """Fail fast after ``threshold`` consecutive failures, then let one probe through every ``reset_after`` seconds."""
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if time.monotonic() - self._opened_at >= self.reset_after:
+            # Half-open: this request is the probe; another failure re-opens the circuit.
+            self._opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self.threshold:
+            self._opened_at = time.monotonic()
+
+
+class NowPaymentsClient:
+    """NOWPayments API client on one pooled keep-alive ``aiohttp`` session.
+
+    Every request has a strict timeout. Status checks are retried with
+    exponential backoff on network errors, 429 and 5xx. Payment creation is
+    only retried when the request provably never reached the API (connection
+    failures, 429, 503), so a lost response cannot create a second invoice.
+    ``base_url`` comes from ``NOWPAYMENTS_API_URL``, which can point at a
+    local mock server.
+    """
+
+    MAX_ATTEMPTS = 3
+    BACKOFF = 0.5
+    TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+    POOL_SIZE = 20
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    UNSENT_STATUSES = {429, 503}
+
+    def __init__(self, base_url: str, api_key: str | None, ipn_url: str | None = None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.ipn_url = ipn_url
+        self.breaker = CircuitBreaker()
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.POOL_SIZE, keepalive_timeout=30),
+                timeout=self.TIMEOUT,
+                headers={'x-api-key': self.api_key or ''},
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _request(self, method: str, path: str, *, idempotent: bool, **kwargs) -> dict | None:
+        """Send a request and return its JSON body, or None for 404."""
+        if not self.breaker.allow():
+            raise CircuitOpenError('NOWPayments is unavailable')
+        session = self._get_session()
+        retry_statuses = self.RETRY_STATUSES if idempotent else self.UNSENT_STATUSES
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                async with session.request(method, f'{self.base_url}{path}', **kwargs) as resp:
+                    if resp.status == 404:
+                        self.breaker.record_success()
+                        return None
+                    if resp.status not in retry_statuses:
+                        if resp.status >= 400:
+                            if resp.status >= 500:
+                                self.breaker.record_failure()
+                            else:
+                                self.breaker.record_success()
+                            raise NowPaymentsError(f'{method} {path} returned {resp.status}: {await resp.text()}')
+                        data = await resp.json(content_type=None)
+                        self.breaker.record_success()
+                        return data
+                    error = NowPaymentsError(f'{method} {path} returned {resp.status}')
+            except aiohttp.ClientConnectorError as e:
+                error = NowPaymentsError(f'{method} {path} failed: {e}')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = NowPaymentsError(f'{method} {path} failed: {e!r}')
+                if not idempotent:
+                    self.breaker.record_failure()
+                    raise error from e
+            if attempt < self.MAX_ATTEMPTS:
+                await asyncio.sleep(self.BACKOFF * 2 ** (attempt - 1))
+        self.breaker.record_failure()
+        raise error
+
+    async def create_payment(self, amount_eur: float, pay_currency: str) -> Tuple[str, str, float]:
+        """Create a payment and return payment_id, pay_address and pay_amount."""
+        payload = {
+            "price_amount": amount_eur,
+            "price_currency": "eur",
+            "pay_currency": pay_currency.lower(),
+        }
+        if self.ipn_url:
+            payload["ipn_callback_url"] = self.ipn_url
+        data = await self._request('POST', '/payment', idempotent=False, json=payload)
+        if data is None:
+            raise NowPaymentsError('POST /payment returned 404')
+        return str(data["payment_id"]), data["pay_address"], float(data["pay_amount"])
+
+    async def check_payment(self, payment_id: str) -> str | None:
+        """Return payment status string for given payment id."""
+        data = await self._request('GET', f'/payment/{payment_id}', idempotent=True)
+        return data.get("payment_status") if data else None
+
+
+nowpayments = NowPaymentsClient(API_BASE, API_KEY, IPN_URL)
+
+
+async def create_payment(amount_eur: float, pay_currency: str) -> Tuple[str, str, float]:
+    return await nowpayments.create_payment(amount_eur, pay_currency)
+
 
-def create_payment(amount_eur: float, pay_currency: str) -> Tuple[str, str, float]:
-    """Create a payment and return payment_id, pay_address and pay_amount."""
-    headers = {
-        "x-api-key": API_KEY,
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "price_amount": amount_eur,
-        "price_currency": "eur",
-        "pay_currency": pay_currency.lower(),
-    }
-
-    if IPN_URL:
-        payload["ipn_callback_url"] = IPN_URL
-
-    resp = requests.post(f"{API_BASE}/payment", json=payload, headers=headers)
-    resp.raise_for_status()
-    data = resp.json()
-    return str(data["payment_id"]), data["pay_address"], float(data["pay_amount"])
-
-
-def check_payment(payment_id: str) -> str | None:
-    """Return payment status string for given payment id."""
-    headers = {"x-api-key": API_KEY}
-    resp = requests.get(f"{API_BASE}/payment/{payment_id}", headers=headers)
-    if resp.status_code == 404:
-        return None
-    resp.raise_for_status()
-    data = resp.json()
-    return data.get("payment_status")
+async def check_payment(payment_id: str) -> str | None:
+    return await nowpayments.check_payment(payment_id)
@@ -1,6 +1,18 @@
+import asyncio
+import datetime
+import time
+from collections import OrderedDict
+
 from yoomoney import Quickpay, Client
 import random
-from bot.misc import EnvKeys
+from bot.misc import EnvKeys, TgConfig
+from bot.misc.dates import utcnow
+
+
+# Provider statuses (YooMoney and NOWPayments) of an invoice that has been paid.
+PAID_STATUSES = ("success", "paid", "finished", "confirmed", "sending")
+# A payment was seen but is not settled yet: such an invoice must not be closed.
+IN_PROGRESS_STATUSES = ("confirming", "partially_paid")
 
 
 def quick_pay(message):
@@ -17,8 +29,92 @@ def quick_pay(message):
     return label, url
 
 
-async def check_payment_status(label: str):
-    client = Client(EnvKeys.ACCESS_TOKEN)
-    history = client.operation_history(label=label)
-    for operation in history.operations:
-        return operation.status
+class YooMoneyHistory:
+    """Shared, briefly cached snapshot of recent YooMoney operations.
+
+    Every status lookup within ``TTL`` seconds is answered from one history
+    fetch covering all invoices that can still be open, so many users
+    checking at once cost a single API call. Concurrent lookups that find
+    the snapshot stale wait on the same fetch, and the blocking ``yoomoney``
+    client runs in a worker thread instead of on the event loop. A label the
+    snapshot cannot vouch for (an invoice older than its window, e.g. after
+    an outage) is looked up on its own, so it is never taken for unpaid.
+    """
+
+    TTL = 10
+    PAGE_SIZE = 100
+    # Invoices older than their payment window plus this margin are no longer in the snapshot.
+    WINDOW_MARGIN = datetime.timedelta(hours=1)
+    MAX_LOOKUPS = 1024
+
+    def __init__(self, token: str | None):
+        self.token = token
+        self._statuses: dict[str, str] = {}
+        self._since: datetime.datetime | None = None
+        self._fetched_at = 0.0
+        self._refresh: asyncio.Task | None = None
+        self._lookups: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+
+    def _fetch(self) -> tuple[datetime.datetime, dict[str, str]]:
+        client = Client(self.token)
+        # The API takes a naive time; read as UTC or as Moscow time, UTC starts no later.
+        since = utcnow() - datetime.timedelta(seconds=int(TgConfig.PAYMENT_TIME)) - self.WINDOW_MARGIN
+        statuses: dict[str, str] = {}
+        start_record = None
+        while True:
+            history = client.operation_history(from_date=since, start_record=start_record, records=self.PAGE_SIZE)
+            for operation in history.operations:
+                # Newest first: keep the latest status of each label.
+                if operation.label and operation.label not in statuses:
+                    statuses[operation.label] = operation.status
+            start_record = getattr(history, 'next_record', None)
+            if not start_record:
+                return since, statuses
+
+    def _fetch_label(self, label: str) -> str | None:
+        history = Client(self.token).operation_history(label=label, records=1)
+        return next((operation.status for operation in history.operations), None)
+
+    async def _refreshed(self) -> dict[str, str]:
+        task = self._refresh
+        if task is None or task.done():
+            task = self._refresh = asyncio.create_task(asyncio.to_thread(self._fetch))
+        # Shielded: one caller being cancelled must not cancel the fetch the others wait on.
+        since, statuses = await asyncio.shield(task)
+        if self._statuses is not statuses:
+            self._since, self._statuses, self._fetched_at = since, statuses, time.monotonic()
+        return statuses
+
+    async def _lookup(self, label: str) -> str | None:
+        cached = self._lookups.get(label)
+        if cached is not None and time.monotonic() - cached[1] < self.TTL:
+            return cached[0]
+        status = await asyncio.to_thread(self._fetch_label, label)
+        self._lookups[label] = (status, time.monotonic())
+        self._lookups.move_to_end(label)
+        while len(self._lookups) > self.MAX_LOOKUPS:
+            self._lookups.popitem(last=False)
+        return status
+
+    async def status(self, label: str, created_at: datetime.datetime | None = None) -> str | None:
+        """Return the status of the payment with ``label``, or None when it has not been paid.
+
+        ``created_at`` (UTC) lets an invoice inside the snapshot's window be
+        answered without a lookup of its own.
+        """
+        if time.monotonic() - self._fetched_at < self.TTL:
+            statuses = self._statuses
+        else:
+            statuses = await self._refreshed()
+        if label in statuses:
+            return statuses[label]
+        if created_at is not None and self._since is not None and created_at >= self._since:
+            return None
+        return await self._lookup(label)
+
+
+yoomoney_history = YooMoneyHistory(EnvKeys.ACCESS_TOKEN)
+
+
+async def check_payment_status(label: str, created_at: datetime.datetime | None = None):
+    return await yoomoney_history.status(label, created_at)
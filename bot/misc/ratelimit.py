@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Asyncio token bucket: ``rate`` tokens per second, bursting up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def is_full(self) -> bool:
+        """True when the bucket is idle, i.e. forgetting it loses no state."""
+        now = time.monotonic()
+        self._refill(now)
+        return self._tokens >= self.capacity and now >= self._resume_at and not self._lock.locked()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for ``seconds``, e.g. after a flood-wait response."""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take ``tokens`` without waiting; return 0 on success, else the seconds until they are available."""
+        now = time.monotonic()
+        if now < self._resume_at:
+            return self._resume_at - now
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._resume_at:
+                    await asyncio.sleep(self._resume_at - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
@@ -0,0 +1,240 @@
+import json
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator, MutableMapping
+
+_USER_KEY = re.compile(r'^(\d+)_')
+_PREFIX_KEY = re.compile(r'^([a-z]+)_')
+
+
+def namespace_of(key: Hashable) -> str:
+    """Group a state key: ``123`` and ``'123_price'`` belong to user 123, ``'purchase_x'`` to ``purchase``."""
+    if isinstance(key, int):
+        return str(key)
+    if isinstance(key, str):
+        match = _USER_KEY.match(key) or _PREFIX_KEY.match(key)
+        if match:
+            return match.group(1)
+    return 'global'
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'size', 'encoded')
+
+    def __init__(self, value: Any, expires_at: float, size: int, encoded: str | None):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.encoded = encoded
+
+
+class StateStore(MutableMapping):
+    """Conversation state for handlers: a dict with TTLs, namespaces and a memory cap.
+
+    Keys keep the ad-hoc shapes the handlers already use (a user id, or
+    ``'<user_id>_<field>'``, ``'purchase_<invoice>'``...); ``namespace_of``
+    groups them per user so a user's state can be listed or cleared at once.
+    An entry expires ``ttl_for(key)`` seconds after it was last read or
+    written, and once the approximate size of all values exceeds
+    ``MAX_BYTES`` the least recently used entries are evicted.
+
+    Values that survive a JSON round trip unchanged are persistable: the
+    changes since the last call are handed out by ``drain_changes`` and fed
+    back with ``load``, which is how state outlives a restart. Everything else
+    stays in memory only. Reading an entry marks it as changed too, because
+    handlers mutate the dicts they get back in place.
+    """
+
+    DEFAULT_TTL = 24 * 3600
+    # Keys starting with these prefixes get their own lifetime.
+    PREFIX_TTLS = {
+        'purchase_': 2 * 3600,
+        'photo_info_': 3600,
+        'lottery_winner': 7 * 24 * 3600,
+    }
+    MAX_BYTES = 32 * 1024 * 1024
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._namespaces: dict[str, set] = {}
+        self._bytes = 0
+        self._touched: set = set()
+        self._deleted: set = set()
+        self.evicted = 0
+        self.expired = 0
+
+    def ttl_for(self, key: Hashable) -> int:
+        if isinstance(key, str):
+            for prefix, ttl in self.PREFIX_TTLS.items():
+                if key.startswith(prefix):
+                    return ttl
+        return self.DEFAULT_TTL
+
+    @staticmethod
+    def _encode(value: Any) -> str | None:
+        try:
+            encoded = json.dumps(value)
+        except (TypeError, ValueError):
+            return None
+        return encoded if json.loads(encoded) == value else None
+
+    def _drop(self, key: Hashable) -> _Entry:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        keys = self._namespaces.get(namespace_of(key))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._namespaces[namespace_of(key)]
+        self._touched.discard(key)
+        if entry.encoded is not None:
+            self._deleted.add(key)
+        return entry
+
+    def _store(self, key: Hashable, value: Any, expires_at: float, size: int, encoded: str | None) -> None:
+        if key in self._entries:
+            previous = self._drop(key)
+            # ``encoded`` is what was last persisted; it stays until the next drain.
+            encoded = encoded or previous.encoded
+        self._entries[key] = _Entry(value, expires_at, size, encoded)
+        self._namespaces.setdefault(namespace_of(key), set()).add(key)
+        self._bytes += size
+        self._deleted.discard(key)
+        while self._bytes > self.MAX_BYTES and len(self._entries) > 1:
+            self._drop(next(iter(self._entries)))
+            self.evicted += 1
+
+    def _live(self, key: Hashable) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if entry.expires_at <= now:
+            self._drop(key)
+            self.expired += 1
+            return None
+        entry.expires_at = now + self.ttl_for(key)
+        self._entries.move_to_end(key)
+        self._touched.add(key)
+        return entry
+
+    def __getitem__(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                raise KeyError(key)
+            return entry.value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._store(key, value, time.time() + self.ttl_for(key), sys.getsizeof(value), None)
+            self._touched.add(key)
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            if self._live(key) is None:
+                raise KeyError(key)
+            self._drop(key)
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.expires_at > time.time()
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            now = time.time()
+            return iter([key for key, entry in self._entries.items() if entry.expires_at > now])
+
+    def __len__(self) -> int:
+        with self._lock:
+            now = time.time()
+            return sum(1 for entry in self._entries.values() if entry.expires_at > now)
+
+    def user_keys(self, user_id: int) -> list[Hashable]:
+        """Return every key in the namespace of ``user_id``."""
+        with self._lock:
+            return list(self._namespaces.get(str(user_id), ()))
+
+    def clear_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in self.user_keys(user_id):
+                self._drop(key)
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry and return how many there were."""
+        with self._lock:
+            now = time.time()
+            stale = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+            for key in stale:
+                self._drop(key)
+            self.expired += len(stale)
+            return len(stale)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'namespaces': len(self._namespaces),
+                'bytes': self._bytes,
+                'evicted': self.evicted,
+                'expired': self.expired,
+            }
+
+    def drain_changes(self) -> tuple[list[tuple[str, str, float]], list[str]]:
+        """Return ``(upserts, deletions)`` of persistable entries since the last call.
+
+        Upserts are ``(encoded key, encoded value, expires_at)``; keys are
+        JSON-encoded so integer and string keys stay distinct.
+        """
+        with self._lock:
+            upserts = []
+            for key in self._touched:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                encoded = self._encode(entry.value)
+                size = len(encoded) if encoded is not None else sys.getsizeof(entry.value)
+                self._bytes += size - entry.size
+                entry.size = size
+                if encoded is not None:
+                    upserts.append((json.dumps(key), encoded, entry.expires_at))
+                elif entry.encoded is not None:
+                    # No longer persistable: remove the stale copy.
+                    self._deleted.add(key)
+                entry.encoded = encoded
+            deleted = [json.dumps(key) for key in self._deleted if key not in self._entries]
+            self._touched.clear()
+            self._deleted.clear()
+            return upserts, deleted
+
+    def requeue(self, upserts: list[tuple[str, str, float]], deleted: list[str]) -> None:
+        """Put drained changes back after they failed to save."""
+        with self._lock:
+            for encoded_key, _, _ in upserts:
+                key = json.loads(encoded_key)
+                if key in self._entries:
+                    self._touched.add(key)
+            for encoded_key in deleted:
+                key = json.loads(encoded_key)
+                if key not in self._entries:
+                    self._deleted.add(key)
+
+    def load(self, rows: list[tuple[str, str, float]]) -> int:
+        """Restore persisted ``(encoded key, encoded value, expires_at)`` rows; return how many were live."""
+        loaded = 0
+        with self._lock:
+            now = time.time()
+            for encoded_key, encoded, expires_at in rows:
+                if expires_at <= now:
+                    continue
+                key = json.loads(encoded_key)
+                if key in self._entries:
+                    continue
+                self._store(key, json.loads(encoded), expires_at, len(encoded), encoded)
+                loaded += 1
+        return loaded
@@ -21,7 +21,7 @@ REQUIRED_MODULES = [
     "xrpl",
     "web3",
     "bitcoinrpc",
-    "flask",
+    "aiohttp",
 ]
 
 def ensure_requirements() -> None:
@@ -43,16 +43,9 @@ def ensure_requirements() -> None:
             "requirements.txt",
         ])
 
-from threading import Thread
 from bot.main import start_bot
-from bot.ipn_server import app as ipn_app
-
-def run_ipn() -> None:
-    ipn_app.run(host="0.0.0.0", port=5000)
 
 if __name__ == '__main__':
     ensure_requirements()
-    # Start the IPN (HTTP) server in a daemon thread
-    Thread(target=run_ipn, daemon=True).start()
-    # Then start the Telegram bot (blocking)
+    # Starts the Telegram bot (blocking, polling or webhook); the IPN server runs on its event loop
     start_bot()
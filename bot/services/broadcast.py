@@ -0,0 +1,140 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.utils.exceptions import (
+    BotBlocked,
+    ChatNotFound,
+    MessageNotModified,
+    TelegramAPIError,
+    UserDeactivated,
+)
+
+from bot.database import run_db
+from bot.database.methods import (
+    finish_broadcast_campaign,
+    get_broadcast_campaign,
+    get_running_broadcast_campaigns,
+    get_segment_user_ids_page,
+    get_user_language,
+    update_broadcast_progress,
+)
+from bot.keyboards import back, close
+from bot.localization import t
+from bot.logger_mesh import logger
+from bot.services.outbound import BULK, priority
+
+# Rate limiting and flood-wait retries happen in the outbound dispatcher; this
+# only bounds how many campaign messages sit in its bulk lane at once.
+CONCURRENCY = 20
+BATCH_SIZE = 100
+PROGRESS_INTERVAL = 3
+
+_tasks: dict[int, asyncio.Task] = {}
+
+
+async def _deliver(bot: Bot, chat_id: int, text: str) -> str:
+    """Send one campaign message and classify the outcome as sent, blocked or failed."""
+    try:
+        await bot.send_message(chat_id=chat_id, text=text, reply_markup=close())
+        return 'sent'
+    except (BotBlocked, UserDeactivated, ChatNotFound):
+        return 'blocked'
+    except TelegramAPIError as e:
+        logger.warning("Broadcast to %s failed: %s", chat_id, e)
+        return 'failed'
+
+
+async def _report(bot: Bot, campaign, lang: str, counts: dict[str, int], finished: bool = False) -> None:
+    if not campaign.chat_id or not campaign.message_id:
+        return
+    if finished:
+        text = t(lang, 'broadcast_completed', count=counts['sent'])
+        markup = back('console')
+    else:
+        done = sum(counts.values())
+        text = t(lang, 'broadcast_progress', done=done, total=max(campaign.total, done), **counts)
+        markup = None
+    try:
+        await bot.edit_message_text(
+            text,
+            chat_id=campaign.chat_id,
+            message_id=campaign.message_id,
+            reply_markup=markup,
+        )
+    except MessageNotModified:
+        pass
+    except TelegramAPIError as e:
+        logger.debug("Could not update broadcast %s progress: %s", campaign.id, e)
+
+
+async def run_campaign(bot: Bot, campaign_id: int) -> None:
+    """Deliver a campaign from its saved cursor, persisting progress after every batch.
+
+    Delivery is at-least-once: a crash between sending a batch and saving its
+    cursor resends that batch on resume.
+    """
+    campaign = await run_db(get_broadcast_campaign, campaign_id)
+    if campaign is None or campaign.status != 'running':
+        return
+    lang = await run_db(get_user_language, campaign.created_by) or 'en'
+    counts = {'sent': campaign.sent, 'failed': campaign.failed, 'blocked': campaign.blocked}
+    cursor = campaign.cursor
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    last_report = 0.0
+
+    async def send(chat_id: int) -> str:
+        async with semaphore:
+            with priority(BULK):
+                return await _deliver(bot, chat_id, campaign.text)
+
+    try:
+        while True:
+            batch = await run_db(
+                get_segment_user_ids_page, campaign.segment, campaign.segment_value, cursor, BATCH_SIZE
+            )
+            if not batch:
+                break
+            for outcome in await asyncio.gather(*(send(chat_id) for chat_id in batch)):
+                counts[outcome] += 1
+            cursor = batch[-1]
+            await run_db(
+                update_broadcast_progress, campaign_id, cursor, counts['sent'], counts['failed'], counts['blocked']
+            )
+            if loop.time() - last_report >= PROGRESS_INTERVAL:
+                last_report = loop.time()
+                await _report(bot, campaign, lang, counts)
+    except asyncio.CancelledError:
+        # Shutdown: the campaign stays running and resumes from the saved cursor.
+        raise
+    except Exception:
+        logger.exception("Broadcast campaign %s aborted", campaign_id)
+        await run_db(finish_broadcast_campaign, campaign_id, 'failed')
+        return
+    await run_db(finish_broadcast_campaign, campaign_id)
+    await _report(bot, campaign, lang, counts, finished=True)
+    logger.info(
+        "Broadcast campaign %s by %s finished: %s sent, %s blocked, %s failed",
+        campaign_id,
+        campaign.created_by,
+        counts['sent'],
+        counts['blocked'],
+        counts['failed'],
+    )
+
+
+def start_campaign(bot: Bot, campaign_id: int) -> asyncio.Task:
+    """Run a campaign in the background; a campaign already running is not started twice."""
+    task = _tasks.get(campaign_id)
+    if task is None or task.done():
+        task = asyncio.create_task(run_campaign(bot, campaign_id))
+        _tasks[campaign_id] = task
+        task.add_done_callback(lambda _: _tasks.pop(campaign_id, None))
+    return task
+
+
+async def resume_campaigns(bot: Bot) -> None:
+    """Restart every campaign left running by a previous process."""
+    for campaign in await run_db(get_running_broadcast_campaigns):
+        logger.info("Resuming broadcast campaign %s after id %s", campaign.id, campaign.cursor)
+        start_campaign(bot, campaign.id)
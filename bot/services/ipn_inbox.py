@@ -0,0 +1,100 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.database import run_db
+from bot.database.methods import (
+    apply_ipn_events,
+    fail_ipn_event,
+    get_pending_ipn_event_ids,
+    get_user_language,
+)
+from bot.localization import t
+from bot.logger_mesh import logger
+from bot.misc.payment import PAID_STATUSES
+
+BATCH_SIZE = 100
+# Fallback poll; new IPNs wake the worker straight away.
+POLL_INTERVAL = 30
+
+_wakeup: asyncio.Event | None = None
+_task: asyncio.Task | None = None
+
+
+def wake() -> None:
+    """Tell the worker a new IPN is waiting."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def process_pending(bot: Bot) -> int:
+    """Apply every pending IPN event in batches; return how many were processed."""
+    processed = 0
+    while True:
+        event_ids = await run_db(get_pending_ipn_event_ids, BATCH_SIZE)
+        if not event_ids:
+            return processed
+        try:
+            credited = await run_db(apply_ipn_events, event_ids, PAID_STATUSES)
+        except Exception as e:
+            logger.error("Applying IPN batch failed, retrying events one by one: %s", e)
+            credited = await _apply_one_by_one(event_ids)
+        processed += len(event_ids)
+        await asyncio.gather(*(notify_top_up(bot, *top_up) for top_up in credited))
+
+
+async def _apply_one_by_one(event_ids: list[int]) -> list[tuple[int, int, int | None]]:
+    """Isolate the events that broke a batch: each failing one is parked as failed for replay."""
+    credited = []
+    for event_id in event_ids:
+        try:
+            credited += await run_db(apply_ipn_events, [event_id], PAID_STATUSES)
+        except Exception as e:
+            logger.error("IPN event %s failed: %s", event_id, e)
+            await run_db(fail_ipn_event, event_id, repr(e))
+    return credited
+
+
+async def notify_top_up(bot: Bot, user_id: int, value: int, message_id: int | None) -> None:
+    """Delete the invoice and tell the user about the top-up."""
+    logger.info("Credited top-up of %s to user %s", value, user_id)
+    lang = await run_db(get_user_language, user_id) or 'en'
+    markup = InlineKeyboardMarkup().add(
+        InlineKeyboardButton(t(lang, 'back_home'), callback_data='home_menu')
+    )
+    if message_id:
+        try:
+            await bot.delete_message(chat_id=user_id, message_id=message_id)
+        except Exception:
+            pass
+    try:
+        await bot.send_message(
+            chat_id=user_id,
+            text=t(lang, 'payment_successful', amount=value),
+            reply_markup=markup,
+        )
+    except Exception as e:
+        logger.error("Top-up notification to %s failed: %s", user_id, e)
+
+
+async def _run(bot: Bot) -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            await process_pending(bot)
+        except Exception:
+            logger.exception("IPN inbox worker failed")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_ipn_worker(bot: Bot) -> asyncio.Task:
+    """Start the inbox worker; its first pass applies events left over from before a restart."""
+    global _wakeup, _task
+    if _task is None or _task.done():
+        _wakeup = asyncio.Event()
+        _task = asyncio.create_task(_run(bot))
+    return _task
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+
+from aiogram import Bot
+from aiogram.types import Message
+from aiogram.utils.exceptions import BadRequest, WrongFileIdentifier
+
+from bot.database import run_db
+from bot.database.methods import delete_uploaded_file_id, get_uploaded_file_id, save_uploaded_file_id
+from bot.logger_mesh import logger
+
+_SEND_METHODS = {
+    'photo': 'send_photo',
+    'video': 'send_video',
+    'animation': 'send_animation',
+    'document': 'send_document',
+}
+
+# Entries kept in each memo below; the least recently used are dropped first.
+MAX_CACHED = 2048
+# (path, mtime_ns, size) -> sha256 of the file contents
+_hashes: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+# (sha256, kind) -> Telegram file_id
+_file_ids: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+
+def _cached(memo: OrderedDict, key):
+    value = memo.get(key)
+    if value is not None:
+        memo.move_to_end(key)
+    return value
+
+
+def _remember(memo: OrderedDict, key, value) -> None:
+    memo[key] = value
+    memo.move_to_end(key)
+    while len(memo) > MAX_CACHED:
+        memo.popitem(last=False)
+
+
+def media_kind(path: str) -> str:
+    """Send method used for a stored media file: videos for ``.mp4``, photos otherwise."""
+    return 'video' if path.lower().endswith('.mp4') else 'photo'
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _content_hash(path: str) -> str:
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    content_hash = _cached(_hashes, key)
+    if content_hash is None:
+        content_hash = await asyncio.get_running_loop().run_in_executor(None, _hash_file, path)
+        _remember(_hashes, key, content_hash)
+    return content_hash
+
+
+def _uploaded_file_id(message: Message, kind: str) -> str | None:
+    if kind == 'photo':
+        return message.photo[-1].file_id if message.photo else None
+    # Telegram may deliver an uploaded GIF or video as a document instead.
+    media = getattr(message, kind, None) or message.document
+    return media.file_id if media else None
+
+
+async def send_media(bot: Bot, chat_id: int, path: str, kind: str | None = None, **kwargs) -> Message:
+    """Send a file from disk, reusing the ``file_id`` of an earlier upload of the same content.
+
+    The first send uploads the file and remembers the returned ``file_id``;
+    if Telegram later rejects a remembered id the file is uploaded again.
+    """
+    kind = kind or media_kind(path)
+    send = getattr(bot, _SEND_METHODS[kind])
+    content_hash = await _content_hash(path)
+    key = (content_hash, kind)
+    file_id = _cached(_file_ids, key)
+    if file_id is None:
+        file_id = await run_db(get_uploaded_file_id, content_hash, kind)
+    if file_id:
+        try:
+            message = await send(chat_id, file_id, **kwargs)
+            _remember(_file_ids, key, file_id)
+            return message
+        except BadRequest as e:
+            if not isinstance(e, WrongFileIdentifier) and 'file' not in str(e).lower():
+                raise
+            logger.warning("Cached file_id for %s rejected (%s); uploading again", path, e)
+            _file_ids.pop(key, None)
+            await run_db(delete_uploaded_file_id, content_hash, kind)
+    with open(path, 'rb') as media:
+        message = await send(chat_id, media, **kwargs)
+    file_id = _uploaded_file_id(message, kind)
+    if file_id:
+        _remember(_file_ids, key, file_id)
+        await run_db(save_uploaded_file_id, content_hash, kind, file_id)
+    return message
@@ -0,0 +1,281 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.utils.exceptions import NetworkError, RetryAfter
+
+from bot.logger_mesh import logger
+from bot.misc.ratelimit import TokenBucket
+
+# Lanes in the order they are served: a queued transactional message always
+# goes out before notifications, and those before bulk traffic.
+TRANSACTIONAL = 0
+NOTIFICATION = 1
+BULK = 2
+LANES = {TRANSACTIONAL: 'transactional', NOTIFICATION: 'notification', BULK: 'bulk'}
+
+_lane = contextvars.ContextVar('outbound_lane', default=TRANSACTIONAL)
+
+# API methods that post into a chat and count against Telegram's flood limits.
+SEND_METHODS = frozenset({
+    'sendMessage', 'forwardMessage', 'copyMessage', 'sendPhoto', 'sendAudio', 'sendDocument',
+    'sendVideo', 'sendAnimation', 'sendVoice', 'sendVideoNote', 'sendMediaGroup', 'sendLocation',
+    'sendVenue', 'sendContact', 'sendPoll', 'sendDice', 'sendSticker', 'sendInvoice', 'sendGame',
+    'editMessageText', 'editMessageCaption', 'editMessageMedia', 'editMessageReplyMarkup',
+})
+
+
+@contextlib.contextmanager
+def priority(lane: int):
+    """Send every message issued inside the block on ``lane``."""
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def _rewind(files: dict | None) -> bool:
+    """Seek upload streams back to the start; False when one can no longer be read."""
+    for value in (files or {}).values():
+        stream = getattr(value, 'file', value)
+        if isinstance(stream, tuple):
+            stream = stream[-1]
+        if not hasattr(stream, 'seek'):
+            continue
+        if getattr(stream, 'closed', False):
+            return False
+        try:
+            stream.seek(0)
+        except (OSError, ValueError):
+            return False
+    return True
+
+
+class _Job:
+    __slots__ = ('chat_id', 'call', 'files', 'future', 'queued_at', 'attempt', 'admitted')
+
+    def __init__(self, chat_id, call, files, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.call = call
+        self.files = files
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.attempt = 1
+        # True once the job holds a token from its chat's bucket.
+        self.admitted = False
+
+
+class OutboundDispatcher:
+    """Process-wide queue every outgoing Telegram message passes through.
+
+    Workers take jobs in lane order and send them under a global token bucket
+    and a per-chat bucket, retrying flood-wait and network errors. A job whose
+    chat is out of tokens is parked with that chat's backlog and requeued when
+    the chat may send again, so a burst to one chat never holds a worker and
+    other chats keep moving.
+    """
+
+    # Telegram allows about 30 messages per second overall, one per second in a
+    # private chat (with short bursts) and 20 per minute in a group.
+    GLOBAL_RATE = 28
+    PRIVATE_RATE, PRIVATE_BURST = 1, 3
+    GROUP_RATE, GROUP_BURST = 20 / 60, 3
+    WORKERS = 16
+    MAX_ATTEMPTS = 5
+    MAX_CHAT_BUCKETS = 10000
+    METRICS_INTERVAL = 300
+
+    def __init__(self):
+        self._queue: asyncio.PriorityQueue | None = None
+        self._seq = itertools.count()
+        self._global = TokenBucket(self.GLOBAL_RATE)
+        self._chats: dict[Any, TokenBucket] = {}
+        # Per-chat backlogs of (lane, seq, job) heaps waiting for the chat's bucket.
+        self._parked: dict[Any, list] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._queued = {lane: 0 for lane in LANES}
+        self._stats = {lane: {'sent': 0, 'retried': 0, 'failed': 0, 'wait': 0.0} for lane in LANES}
+
+    def _ensure_started(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.WORKERS)]
+        self._tasks.append(asyncio.create_task(self._log_metrics()))
+
+    @staticmethod
+    def _chat_key(chat_id):
+        try:
+            return int(chat_id)
+        except (TypeError, ValueError):
+            return str(chat_id)
+
+    def _chat_bucket(self, key) -> TokenBucket:
+        bucket = self._chats.get(key)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_CHAT_BUCKETS:
+                self._chats = {k: b for k, b in self._chats.items() if k in self._parked or not b.is_full()}
+            if isinstance(key, int) and key > 0:
+                bucket = TokenBucket(self.PRIVATE_RATE, self.PRIVATE_BURST)
+            else:
+                bucket = TokenBucket(self.GROUP_RATE, self.GROUP_BURST)
+            self._chats[key] = bucket
+        return bucket
+
+    def _put(self, lane: int, seq: int, job: _Job) -> None:
+        self._queued[lane] += 1
+        self._queue.put_nowait((lane, seq, job))
+
+    async def submit(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        chat_id=None,
+        files: dict | None = None,
+        lane: int | None = None,
+    ) -> Any:
+        """Queue ``call`` on ``lane`` (the current context's lane by default) and await its result."""
+        self._ensure_started()
+        lane = _lane.get() if lane is None else lane
+        future = asyncio.get_running_loop().create_future()
+        self._put(lane, next(self._seq), _Job(chat_id, call, files, future))
+        return await future
+
+    async def _worker(self) -> None:
+        while True:
+            lane, seq, job = await self._queue.get()
+            self._queued[lane] -= 1
+            try:
+                if self._admit(lane, seq, job):
+                    await self._run(lane, seq, job)
+            except Exception:
+                logger.exception("Outbound worker failed on a %s job", LANES[lane])
+            finally:
+                self._queue.task_done()
+
+    def _admit(self, lane: int, seq: int, job: _Job) -> bool:
+        """Take a token from the job's chat, or park the job behind that chat's backlog."""
+        if job.chat_id is None or job.admitted:
+            return True
+        key = self._chat_key(job.chat_id)
+        parked = self._parked.get(key)
+        if parked is None:
+            wait = self._chat_bucket(key).try_acquire()
+            if not wait:
+                return True
+            parked = self._parked[key] = []
+            asyncio.get_running_loop().call_later(wait, self._unpark, key)
+        heapq.heappush(parked, (lane, seq, job))
+        self._queued[lane] += 1
+        return False
+
+    def _unpark(self, key) -> None:
+        """Requeue the chat's next parked job once its bucket has a token, in lane and arrival order."""
+        parked = self._parked[key]
+        while parked and parked[0][2].future.done():
+            lane, _, _ = heapq.heappop(parked)
+            self._queued[lane] -= 1
+        if not parked:
+            del self._parked[key]
+            return
+        wait = self._chat_bucket(key).try_acquire()
+        if wait:
+            asyncio.get_running_loop().call_later(wait, self._unpark, key)
+            return
+        lane, seq, job = heapq.heappop(parked)
+        self._queued[lane] -= 1
+        job.admitted = True
+        self._put(lane, seq, job)
+        if parked:
+            asyncio.get_running_loop().call_soon(self._unpark, key)
+        else:
+            del self._parked[key]
+
+    async def _run(self, lane: int, seq: int, job: _Job) -> None:
+        if job.future.done():
+            return
+        stats = self._stats[lane]
+        if job.attempt == 1:
+            stats['wait'] += time.monotonic() - job.queued_at
+        await self._global.acquire()
+        try:
+            result = await job.call()
+        except RetryAfter as e:
+            logger.warning("Flood control on chat %s, waiting %ss", job.chat_id, e.timeout)
+            self._global.pause(e.timeout)
+            if job.chat_id is not None:
+                self._chat_bucket(self._chat_key(job.chat_id)).pause(e.timeout)
+            self._retry(lane, seq, job, e, 0)
+        except (NetworkError, asyncio.TimeoutError) as e:
+            self._retry(lane, seq, job, e, min(2 ** job.attempt, 30))
+        except Exception as e:
+            stats['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            stats['sent'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _retry(self, lane: int, seq: int, job: _Job, error: Exception, delay: float) -> None:
+        """Requeue a failed send after ``delay`` seconds, or fail it once it has run out of attempts."""
+        stats = self._stats[lane]
+        if job.attempt >= self.MAX_ATTEMPTS or job.future.done() or not _rewind(job.files):
+            stats['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(error)
+            return
+        stats['retried'] += 1
+        job.attempt += 1
+        # It takes a fresh chat token, which also honours a flood-wait pause on the chat.
+        job.admitted = False
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self._put, lane, seq, job)
+        else:
+            self._put(lane, seq, job)
+
+    def metrics(self) -> dict[str, dict]:
+        """Return per-lane queue depth, delivery counters and average queue wait in seconds."""
+        result = {}
+        for lane, name in LANES.items():
+            stats = self._stats[lane]
+            handled = stats['sent'] + stats['failed']
+            result[name] = {
+                'queued': self._queued[lane],
+                'sent': stats['sent'],
+                'retried': stats['retried'],
+                'failed': stats['failed'],
+                'avg_wait': round(stats['wait'] / handled, 3) if handled else 0.0,
+            }
+        return result
+
+    async def _log_metrics(self) -> None:
+        last = None
+        while True:
+            await asyncio.sleep(self.METRICS_INTERVAL)
+            current = self.metrics()
+            if current != last:
+                logger.info("Outbound queue: %s", current)
+                last = current
+
+
+outbound = OutboundDispatcher()
+
+
+class OutboundBot(Bot):
+    """Bot whose chat-posting API calls are routed through the outbound dispatcher."""
+
+    async def request(self, method: str, data: dict | None = None, files: dict | None = None, **kwargs):
+        send = super().request
+        if method not in SEND_METHODS:
+            return await send(method, data, files, **kwargs)
+        return await outbound.submit(
+            lambda: send(method, data, files, **kwargs),
+            chat_id=(data or {}).get('chat_id'),
+            files=files,
+        )
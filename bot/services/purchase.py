@@ -0,0 +1,340 @@
+import asyncio
+import os
+import shutil
+from collections import Counter
+
+from aiogram import Bot
+from aiogram.types import User as TelegramUser
+from aiogram.utils.exceptions import BadRequest, MessageNotModified
+from sqlalchemy import func
+
+from bot.database import Database, run_db
+from bot.database.catalog import catalog
+from bot.database.methods import (
+    advance_purchase_streak,
+    can_get_referral_reward,
+    credit_in_transaction,
+    debit_in_transaction,
+    get_category_parent,
+    get_item_info,
+    get_user_language,
+    insert_bought_item,
+    release_operation_reservation,
+    take_item_value,
+    top_up_in_transaction,
+)
+from bot.database.models import BoughtGoods, Reservation, User, UserAchievement
+from bot.database.stats import shop_stats
+from bot.keyboards import back, close, home_markup
+from bot.localization import t
+from bot.logger_mesh import logger
+from bot.misc import TgConfig
+from bot.misc.dates import format_local, utcnow
+from bot.services.media import send_media
+from bot.utils.files import cleanup_item_file
+from bot.utils.level import get_level_info
+from bot.utils.notifications import notify_owner_of_purchase
+
+
+class PurchaseService:
+    """Completes purchases: every database effect in one transaction, then the side effects.
+
+    ``commit`` debits the buyer, hands out the stock unit and records the sale,
+    referral reward, lottery ticket, streak and achievements under a single
+    ``BEGIN IMMEDIATE``, so a crash leaves either all of it or none. Messages,
+    the owner notification and file housekeeping only run once that has
+    committed: the item is delivered first, then the follow-up messages and
+    the referral notice run as concurrent jobs.
+    """
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+
+    @staticmethod
+    def _grant(session, user_id: int, code: str, achieved_at, granted: list[str]) -> None:
+        exists = session.query(UserAchievement.user_id).filter(
+            UserAchievement.user_id == user_id, UserAchievement.achievement_code == code
+        ).first()
+        if exists is None:
+            session.add(UserAchievement(user_id=user_id, achievement_code=code, achieved_at=achieved_at))
+            granted.append(code)
+
+    def commit(
+        self,
+        user_id: int,
+        item_name: str,
+        price: int,
+        gift_to: int | None = None,
+        gift_name: str | None = None,
+        reserved: dict | None = None,
+        top_up: tuple[str, int] | None = None,
+    ) -> dict:
+        """Apply a purchase in one transaction and return what happened.
+
+        ``reserved`` is a stock unit already taken off sale by a reservation;
+        otherwise the next unit is claimed. ``top_up`` is an ``(operation_id,
+        amount)`` payment credited in the same transaction; it stays credited
+        even when the purchase itself cannot go through. ``top_up_applied`` is
+        False when another path had already credited it. When the purchase does
+        not go through, the invoice's reservation is released and ``restocked``
+        lists the items that were out of stock until then.
+        """
+        now = utcnow()
+        result = {
+            'status': 'completed',
+            'value': None,
+            'balance': None,
+            'purchases': 0,
+            'referral': None,
+            'achievements': [],
+            'bought_time': now,
+            'top_up_applied': bool(top_up),
+            'restocked': [],
+        }
+        units = []
+        balance_delta = 0
+        sales = 0
+        with Database().transaction() as session:
+            if top_up:
+                operation_id, _ = top_up
+                status = session.query(Reservation.status).filter(
+                    Reservation.operation_id == operation_id
+                ).scalar()
+                if status is not None and status != 'active':
+                    # The reservation expired and its unit went back on sale: claim a fresh one.
+                    reserved = None
+                # Claims the open operation, so an invoice already credited by the IPN inbox or
+                # reconciliation is not credited again; its amount is on the balance either way.
+                applied = top_up_in_transaction(session, operation_id)
+                if applied:
+                    balance_delta += applied[1]
+                    self._grant(session, user_id, 'first_topup', now, result['achievements'])
+                else:
+                    result['top_up_applied'] = False
+
+            balance = debit_in_transaction(session, user_id, price)
+            if balance is None:
+                result['status'] = 'insufficient'
+            else:
+                value = reserved or take_item_value(session, item_name)
+                if value is None:
+                    credit_in_transaction(session, user_id, price)
+                    result['status'] = 'out_of_stock'
+                else:
+                    balance_delta -= price
+                    result['value'], result['balance'] = value, balance
+                    if gift_to:
+                        insert_bought_item(session, value['item_name'], value['value'], price, gift_to, now)
+                        insert_bought_item(session, value['item_name'], f'Gifted to @{gift_name}', price, user_id, now)
+                        sales = 2
+                    else:
+                        insert_bought_item(session, value['item_name'], value['value'], price, user_id, now)
+                        sales = 1
+                    session.flush()
+                    result['purchases'] = session.query(func.count(BoughtGoods.id)).filter(
+                        BoughtGoods.buyer_id == user_id
+                    ).scalar()
+
+                    referral_id = session.query(User.referral_id).filter(User.telegram_id == user_id).scalar()
+                    if referral_id and TgConfig.REFERRAL_PERCENT and can_get_referral_reward(value['item_name']):
+                        reward = round(price * TgConfig.REFERRAL_PERCENT / 100, 2)
+                        if credit_in_transaction(session, referral_id, reward) is not None:
+                            balance_delta += reward
+                            result['referral'] = (referral_id, reward)
+
+                    session.query(User).filter(User.telegram_id == user_id).update(
+                        {User.lottery_tickets: User.lottery_tickets + 1}, synchronize_session=False
+                    )
+                    advance_purchase_streak(session, user_id)
+                    self._grant(session, user_id, 'first_purchase', now, result['achievements'])
+                    if gift_to:
+                        self._grant(session, user_id, 'gift_sent', now, result['achievements'])
+
+            if top_up and result['status'] == 'completed':
+                session.query(Reservation).filter(
+                    Reservation.operation_id == operation_id, Reservation.status == 'active'
+                ).update({Reservation.status: 'completed', Reservation.released_at: now}, synchronize_session=False)
+            elif top_up:
+                # Nothing was bought: an unexpired reservation goes back on sale, exactly once.
+                units, result['restocked'] = release_operation_reservation(session, operation_id)
+
+        if balance_delta:
+            shop_stats.balance_changed(balance_delta)
+        if result['top_up_applied']:
+            shop_stats.top_up_recorded(top_up[1])
+        for _ in range(sales):
+            shop_stats.sale_recorded(price)
+        for name, amount in Counter(units).items():
+            catalog.stock_added(name, amount)
+        value = result['value']
+        if value and not reserved and not value['is_infinity']:
+            catalog.stock_removed(item_name)
+        return result
+
+    async def purchase(
+        self,
+        buyer: TelegramUser,
+        chat_id: int,
+        message_id: int,
+        item_name: str,
+        price: int,
+        lang: str,
+        gift_to: int | None = None,
+        gift_name: str | None = None,
+        reserved: dict | None = None,
+        top_up: tuple[str, int] | None = None,
+        back_to: str | None = None,
+    ) -> dict:
+        """Commit a purchase and, once it is durable, run its messages and notifications."""
+        result = await run_db(
+            self.commit, buyer.id, item_name, price, gift_to, gift_name, reserved, top_up
+        )
+        if result['status'] != 'completed':
+            return result
+        username = f'@{buyer.username}' if buyer.username else buyer.full_name
+        # Decided before delivery moves the file into Sold.
+        edit = _is_file(result['value'])
+        # The item goes out before the follow-up messages that refer to it.
+        await self.run_jobs(
+            self._deliver(buyer, username, chat_id, message_id, item_name, price, lang, result, gift_to)
+        )
+        jobs = [
+            self._announce(buyer.id, chat_id, message_id, lang, result, gift_name,
+                           back_to or f'item_{item_name}', edit=edit),
+        ]
+        if result['referral']:
+            referral_id, reward = result['referral']
+            jobs.append(self._reward_referral(referral_id, reward, buyer.first_name))
+        await self.run_jobs(*jobs)
+        logger.info(f"User {buyer.id} ({buyer.first_name}) bought 1 item of {item_name} for {price}€")
+        return result
+
+    @staticmethod
+    async def run_jobs(*jobs) -> None:
+        """Run post-commit jobs concurrently; one failing does not stop the others."""
+        for outcome in await asyncio.gather(*jobs, return_exceptions=True):
+            if isinstance(outcome, Exception):
+                logger.error(f"Post-purchase job failed: {outcome}")
+
+    async def _deliver(self, buyer, username: str, chat_id: int, message_id: int, item_name: str,
+                       price: int, lang: str, result: dict, gift_to: int | None) -> None:
+        """Hand the item to the buyer or gift recipient, then tell the owner about the sale."""
+        value = result['value']
+        path = value['value']
+        recipient_lang = (await run_db(get_user_language, gift_to) or 'en') if gift_to else lang
+        file_path = None
+        if _is_file(value):
+            description = await asyncio.to_thread(_read_description, path)
+            if gift_to:
+                caption = t(recipient_lang, 'gift_received', item=value['item_name'], user=username)
+                await send_media(self.bot, gift_to, path, caption=caption, parse_mode='HTML')
+            else:
+                caption = (
+                    f'✅ Item purchased. **Balance**: <i>{result["balance"]}</i>€\n'
+                    f'📦 Purchases: {result["purchases"]}'
+                )
+                if description:
+                    caption += f'\n\n{description}'
+                await send_media(self.bot, chat_id, path, caption=caption, parse_mode='HTML')
+            file_path = await asyncio.to_thread(
+                _archive_sold,
+                path,
+                f"{format_local(result['bought_time'])} user:{buyer.id} item:{item_name} price:{price}\n",
+            )
+        else:
+            description = path
+            if gift_to:
+                await self.bot.send_message(
+                    gift_to, t(recipient_lang, 'gift_received', item=value['item_name'], user=username)
+                )
+            else:
+                await self._edit_or_send(
+                    chat_id,
+                    message_id,
+                    f'✅ Item purchased. **Balance**: <i>{result["balance"]}</i>€\n'
+                    f'📦 Purchases: {result["purchases"]}\n\n{path}',
+                    parse_mode='HTML',
+                    reply_markup=home_markup(lang),
+                )
+        item_info = await run_db(get_item_info, value['item_name'], buyer.id)
+        parent_cat = await run_db(get_category_parent, item_info['category_name'])
+        await notify_owner_of_purchase(
+            self.bot,
+            username,
+            format_local(result['bought_time']),
+            value['item_name'],
+            price,
+            parent_cat,
+            item_info['category_name'],
+            description,
+            file_path,
+        )
+
+    async def _announce(self, user_id: int, chat_id: int, message_id: int, lang: str, result: dict,
+                        gift_name: str | None, back_to: str,
+                        edit: bool) -> None:
+        """Send the buyer's follow-up messages in order."""
+        purchases = result['purchases']
+        if gift_name:
+            await self.bot.send_message(user_id, t(lang, 'gift_sent', user=f'@{gift_name}'), reply_markup=back('profile'))
+        elif edit:
+            await self._edit_or_send(
+                chat_id,
+                message_id,
+                f'✅ Item purchased. 📦 Total Purchases: {purchases}',
+                reply_markup=back(back_to),
+            )
+        level_before, _, _ = get_level_info(purchases - 1, lang)
+        level_after, _, _ = get_level_info(purchases, lang)
+        if level_after != level_before:
+            await self.bot.send_message(user_id, t(lang, 'level_up', level=level_after))
+        await self.bot.send_message(user_id, t(lang, 'lottery_ticket_awarded'))
+        if result['top_up_applied']:
+            await self.bot.send_message(user_id, t(lang, 'top_up_completed'))
+        for code in result['achievements']:
+            await self.bot.send_message(user_id, t(lang, 'achievement_unlocked', name=t(lang, f'achievement_{code}')))
+            logger.info(f"User {user_id} unlocked achievement {code}")
+
+    async def _edit_or_send(self, chat_id: int, message_id: int, text: str, **kwargs) -> None:
+        """Replace the purchase message, or send a new one when it cannot be edited (e.g. an invoice photo)."""
+        try:
+            await self.bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+        except MessageNotModified:
+            pass
+        except BadRequest:
+            await self.bot.send_message(chat_id, text, **kwargs)
+
+    async def _reward_referral(self, referral_id: int, reward: float, first_name: str) -> None:
+        ref_lang = await run_db(get_user_language, referral_id) or 'en'
+        await self.bot.send_message(
+            referral_id,
+            t(ref_lang, 'referral_reward', amount=f'{reward:.2f}', user=first_name),
+            reply_markup=close(),
+        )
+
+
+def _is_file(value: dict | None) -> bool:
+    return bool(value) and os.path.isfile(value['value'])
+
+
+def _read_description(path: str) -> str:
+    desc_file = f'{path}.txt'
+    if not os.path.isfile(desc_file):
+        return ''
+    with open(desc_file) as f:
+        return f.read()
+
+
+def _archive_sold(path: str, log_line: str) -> str:
+    """Move a delivered item file and its description into ``Sold`` and log the sale; returns the new path."""
+    desc_file = f'{path}.txt'
+    sold_folder = os.path.join(os.path.dirname(path), 'Sold')
+    os.makedirs(sold_folder, exist_ok=True)
+    file_path = os.path.join(sold_folder, os.path.basename(path))
+    shutil.move(path, file_path)
+    if os.path.isfile(desc_file):
+        shutil.move(desc_file, os.path.join(sold_folder, os.path.basename(desc_file)))
+    cleanup_item_file(path)
+    with open(os.path.join('assets', 'purchases.txt'), 'a') as log_file:
+        log_file.write(log_line)
+    return file_path
@@ -0,0 +1,94 @@
+import asyncio
+import datetime
+
+from aiogram import Bot
+
+from bot.database import Database, run_db
+from bot.database.methods import complete_top_ups, expire_operations, get_open_operations
+from bot.logger_mesh import logger
+from bot.misc import TgConfig
+from bot.misc.dates import utcnow
+from bot.misc.nowpayments import check_payment
+from bot.misc.payment import IN_PROGRESS_STATUSES, PAID_STATUSES, check_payment_status
+from bot.services.ipn_inbox import notify_top_up
+from bot.services.reservations import sweep_expired_reservations
+from bot.utils import notify_restock
+
+INTERVAL = 60
+CONCURRENCY = 10
+# Unpaid invoices are normally cancelled by their invoice-expiry job; only orphans older than this are closed here.
+GRACE = datetime.timedelta(minutes=5)
+
+_task: asyncio.Task | None = None
+
+
+def _is_yoomoney(operation_id: str) -> bool:
+    # YooMoney labels are '<user id>_<random>'; NOWPayments ids are plain numbers.
+    return '_' in operation_id
+
+
+async def _status(operation: dict, semaphore: asyncio.Semaphore) -> str | None:
+    """Return the provider's status; None means the provider has no payment for it. Errors propagate."""
+    operation_id = operation['operation_id']
+    async with semaphore:
+        if _is_yoomoney(operation_id):
+            return await check_payment_status(operation_id, operation['created_at'])
+        return await check_payment(operation_id)
+
+
+async def reconcile(bot: Bot) -> None:
+    """Check every open invoice with its provider and apply what changed."""
+    operations = await run_db(get_open_operations)
+    if operations:
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        statuses = await asyncio.gather(
+            *(_status(operation, semaphore) for operation in operations), return_exceptions=True
+        )
+        expired_before = utcnow() - datetime.timedelta(seconds=int(TgConfig.PAYMENT_TIME)) - GRACE
+        paid, expired = [], []
+        for operation, status in zip(operations, statuses):
+            operation_id = operation['operation_id']
+            if isinstance(status, BaseException):
+                # No answer is not an unpaid answer: leave it open for the next pass.
+                logger.warning("Status check for operation %s failed: %s", operation_id, status)
+                continue
+            overdue = operation['created_at'] is not None and operation['created_at'] < expired_before
+            if status in PAID_STATUSES:
+                # A paid purchase invoice is completed by the buyer's "check payment" while it is open;
+                # only credit it to the balance once that window has passed.
+                if overdue or not operation['reserved']:
+                    paid.append(operation_id)
+            elif overdue and status not in IN_PROGRESS_STATUSES:
+                expired.append(operation_id)
+        if paid:
+            credited = await run_db(complete_top_ups, paid)
+            logger.info("Reconciliation credited %s paid invoices", len(credited))
+            await asyncio.gather(*(notify_top_up(bot, *top_up) for top_up in credited))
+        if expired:
+            restocked = await run_db(expire_operations, expired)
+            logger.info("Reconciliation closed %s expired invoices", len(expired))
+            for item_name in restocked:
+                await notify_restock(bot, item_name)
+    released = await sweep_expired_reservations(bot)
+    if released:
+        logger.info("Released %s expired reservations", released)
+
+
+async def _run(bot: Bot) -> None:
+    while True:
+        try:
+            await reconcile(bot)
+        except Exception:
+            logger.exception("Payment reconciliation failed")
+        finally:
+            # This task lives for the whole process: never keep a read snapshot open between passes.
+            Database().remove_session()
+        await asyncio.sleep(INTERVAL)
+
+
+def start_reconciliation(bot: Bot) -> asyncio.Task:
+    """Start the periodic reconciliation; the first pass recovers invoices left open by a restart."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run(bot))
+    return _task
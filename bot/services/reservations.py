@@ -0,0 +1,29 @@
+import datetime
+
+from aiogram import Bot
+
+from bot.database import run_db
+from bot.database.methods import release_expired_reservations
+from bot.logger_mesh import logger
+from bot.misc.dates import utcnow
+from bot.utils import notify_restock
+
+BATCH_SIZE = 500
+# Leave the invoice-expiry job, which checks for a late payment first, time to release its own reservation.
+GRACE = datetime.timedelta(minutes=2)
+
+
+async def sweep_expired_reservations(bot: Bot) -> int:
+    """Release every reservation past its expiry, in batches; return how many were released."""
+    released = 0
+    while True:
+        restocked, count = await run_db(release_expired_reservations, utcnow() - GRACE, BATCH_SIZE)
+        released += count
+        for item_name in restocked:
+            try:
+                await notify_restock(bot, item_name)
+            except Exception as e:
+                logger.error("Restock notification for %s failed: %s", item_name, e)
+        if count < BATCH_SIZE:
+            return released
+
@@ -0,0 +1,143 @@
+import asyncio
+import datetime
+import heapq
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+
+from bot.database import run_db
+from bot.database.methods import (
+    claim_jobs,
+    finish_jobs,
+    get_pending_job_times,
+    reschedule_job,
+    schedule_job,
+)
+from bot.logger_mesh import logger
+from bot.misc.dates import utcnow
+
+JobHandler = Callable[[Bot, dict], Awaitable[None]]
+
+
+class JobScheduler:
+    """Durable deferred jobs run by one loop instead of a sleeping task each.
+
+    Jobs are rows in ``scheduled_jobs``; the loop keeps a min-heap of their due
+    times, sleeps until the earliest one and fires everything due in batches.
+    The heap is reloaded from the table on start and every ``SYNC_INTERVAL``,
+    so jobs survive restarts, failed batches and jobs scheduled by another
+    process. Each job is claimed with a ``LEASE`` before it runs, so only one
+    process runs it, and marked done only after its handler returns: handlers
+    must be idempotent.
+    """
+
+    BATCH_SIZE = 100
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = 60
+    SYNC_INTERVAL = 60
+    LEASE = datetime.timedelta(minutes=5)
+
+    def __init__(self):
+        self._handlers: dict[str, JobHandler] = {}
+        self._heap: list[tuple[datetime.datetime, int]] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._bot: Bot | None = None
+        self._synced_at = utcnow()
+
+    def handler(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        """Register the coroutine ``handler(bot, payload)`` that runs jobs of ``kind``."""
+        def register(func: JobHandler) -> JobHandler:
+            self._handlers[kind] = func
+            return func
+        return register
+
+    async def schedule(self, kind: str, delay: float | datetime.timedelta, payload: dict | None = None) -> int:
+        """Persist a job to run ``delay`` seconds from now and return its id."""
+        if not isinstance(delay, datetime.timedelta):
+            delay = datetime.timedelta(seconds=delay)
+        run_at = utcnow() + delay
+        job_id = await run_db(schedule_job, kind, run_at, payload)
+        self._push(run_at, job_id)
+        return job_id
+
+    def _push(self, run_at: datetime.datetime, job_id: int) -> None:
+        heapq.heappush(self._heap, (run_at, job_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self, bot: Bot) -> None:
+        """Load pending jobs and start the scheduler loop."""
+        if self._task is not None:
+            return
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        await self._sync()
+        logger.info("Job scheduler started with %s pending jobs", len(self._heap))
+        self._task = asyncio.create_task(self._run())
+
+    async def _sync(self) -> None:
+        """Merge every pending job in the table into the heap."""
+        entries = set(self._heap)
+        entries.update((run_at, job_id) for job_id, run_at in await run_db(get_pending_job_times))
+        self._heap = list(entries)
+        heapq.heapify(self._heap)
+        self._synced_at = utcnow()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = utcnow()
+            next_sync = self._synced_at + datetime.timedelta(seconds=self.SYNC_INTERVAL)
+            if now >= next_sync:
+                try:
+                    await self._sync()
+                except Exception:
+                    logger.exception("Job scheduler failed to reload pending jobs")
+                    self._synced_at = now
+                continue
+            wake_at = min(self._heap[0][0], next_sync) if self._heap else next_sync
+            if not self._heap or self._heap[0][0] > now:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), (wake_at - now).total_seconds())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due = []
+            while self._heap and self._heap[0][0] <= now and len(due) < self.BATCH_SIZE:
+                due.append(heapq.heappop(self._heap))
+            try:
+                await self._fire(now, due)
+            except Exception:
+                logger.exception("Job scheduler failed to run jobs %s", [job_id for _, job_id in due])
+                # Still pending in the table: try them again (a claimed one waits out its lease).
+                for entry in due:
+                    heapq.heappush(self._heap, entry)
+                await asyncio.sleep(1)
+
+    async def _fire(self, now: datetime.datetime, due: list[tuple[datetime.datetime, int]]) -> None:
+        jobs = await run_db(claim_jobs, [job_id for _, job_id in due], now, utcnow() + self.LEASE)
+        outcomes = await asyncio.gather(*(self._execute(job) for job in jobs), return_exceptions=True)
+        done, failed = [], []
+        for job, outcome in zip(jobs, outcomes):
+            if not isinstance(outcome, Exception):
+                done.append(job['id'])
+                continue
+            logger.error("Scheduled %s job %s failed: %s", job['kind'], job['id'], outcome)
+            if job['attempts'] + 1 >= self.MAX_ATTEMPTS:
+                failed.append(job['id'])
+            else:
+                run_at = utcnow() + datetime.timedelta(seconds=self.RETRY_DELAY * 2 ** job['attempts'])
+                await run_db(reschedule_job, job['id'], run_at)
+                self._push(run_at, job['id'])
+        await run_db(finish_jobs, done)
+        await run_db(finish_jobs, failed, 'failed')
+
+    async def _execute(self, job: dict) -> None:
+        handler = self._handlers.get(job['kind'])
+        if handler is None:
+            raise LookupError(f"no handler registered for job kind {job['kind']!r}")
+        await handler(self._bot, job['payload'])
+
+
+scheduler = JobScheduler()
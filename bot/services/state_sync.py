@@ -0,0 +1,49 @@
+import asyncio
+
+from bot.database import run_db
+from bot.database.methods import get_conversation_state, save_conversation_state
+from bot.logger_mesh import logger
+from bot.misc import TgConfig
+
+# Handlers write TgConfig.STATE synchronously; changes reach SQLite in the background.
+FLUSH_INTERVAL = 5
+STATS_INTERVAL = 3600
+
+_task: asyncio.Task | None = None
+
+
+async def restore_state() -> None:
+    """Load the persisted conversation state saved before the last shutdown."""
+    loaded = TgConfig.STATE.load(await run_db(get_conversation_state))
+    logger.info("Restored %s conversation state entries", loaded)
+
+
+async def flush_state() -> None:
+    TgConfig.STATE.purge_expired()
+    upserts, deleted = TgConfig.STATE.drain_changes()
+    try:
+        await run_db(save_conversation_state, upserts, deleted)
+    except Exception:
+        TgConfig.STATE.requeue(upserts, deleted)
+        raise
+
+
+async def _run() -> None:
+    elapsed = 0
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        try:
+            await flush_state()
+        except Exception:
+            logger.exception("Saving conversation state failed")
+        elapsed += FLUSH_INTERVAL
+        if elapsed >= STATS_INTERVAL:
+            elapsed = 0
+            logger.info("Conversation state: %s", TgConfig.STATE.stats())
+
+
+def start_state_sync() -> asyncio.Task:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run())
+    return _task
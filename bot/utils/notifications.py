@@ -7,6 +7,8 @@ from aiogram.utils.exceptions import (
 from bot.misc import EnvKeys
 from bot.logger_mesh import logger
 from bot.keyboards import close
+from bot.services.media import send_media
+from bot.services.outbound import NOTIFICATION, priority
 
 
 async def notify_owner_of_purchase(
@@ -47,13 +49,14 @@ async def notify_owner_of_purchase(
     ).strip()
 
     # 3) Try media first if available, else text; fall back to plain text on errors
+    with priority(NOTIFICATION):
+        await _send_purchase_notification(bot, owner_id, text, file_path)
+
+
+async def _send_purchase_notification(bot: Bot, owner_id: int, text: str, file_path: str | None) -> None:
     try:
         if file_path and os.path.isfile(file_path):
-            with open(file_path, "rb") as media:
-                if file_path.lower().endswith(".mp4"):
-                    await bot.send_video(owner_id, media, caption=text, parse_mode="HTML", reply_markup=close())
-                else:
-                    await bot.send_photo(owner_id, media, caption=text, parse_mode="HTML", reply_markup=close())
+            await send_media(bot, owner_id, file_path, caption=text, parse_mode="HTML", reply_markup=close())
         else:
             await bot.send_message(owner_id, text, parse_mode="HTML", reply_markup=close())
 
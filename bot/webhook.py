@@ -0,0 +1,119 @@
+import asyncio
+import hmac
+import secrets
+from typing import Awaitable, Callable
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+
+from bot.ipn_server import add_ipn_routes
+from bot.logger_mesh import logger
+from bot.misc import EnvKeys
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# Telegram accepts 1-256 characters from A-Z, a-z, 0-9, _ and -; token_urlsafe stays within them.
+# Without a configured secret a fresh one is set with the webhook on every start.
+SECRET_TOKEN = EnvKeys.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+# Updates still running after this long are acknowledged anyway, so Telegram does not redeliver them.
+RESPONSE_TIMEOUT = 50
+# How long shutdown waits for updates that are already being handled.
+SHUTDOWN_TIMEOUT = 30
+
+_in_flight: set[asyncio.Task] = set()
+
+
+def verify_secret_token(token: str | None) -> bool:
+    return bool(token) and hmac.compare_digest(token, SECRET_TOKEN)
+
+
+async def _process(dp: Dispatcher, update: types.Update) -> None:
+    Bot.set_current(dp.bot)
+    Dispatcher.set_current(dp)
+    try:
+        await dp.process_update(update)
+    except Exception:
+        logger.exception("Handling update %s failed", update.update_id)
+
+
+async def telegram_webhook(request: web.Request) -> web.Response:
+    if not verify_secret_token(request.headers.get(SECRET_HEADER)):
+        raise web.HTTPUnauthorized()
+    try:
+        update = types.Update(**await request.json())
+    except (ValueError, TypeError):
+        raise web.HTTPBadRequest()
+
+    task = asyncio.create_task(_process(request.app['dispatcher'], update))
+    _in_flight.add(task)
+    task.add_done_callback(_in_flight.discard)
+    # Answering once the update is handled lets Telegram's max_connections throttle delivery.
+    await asyncio.wait({task}, timeout=RESPONSE_TIMEOUT)
+    return web.Response()
+
+
+def create_webhook_app(dp: Dispatcher) -> web.Application:
+    """One app for Telegram updates and NOWPayments IPNs."""
+    app = web.Application(client_max_size=1024 ** 2)
+    app['bot'] = dp.bot
+    app['dispatcher'] = dp
+    app.router.add_post(EnvKeys.WEBHOOK_PATH, telegram_webhook)
+    add_ipn_routes(app)
+    return app
+
+
+async def wait_in_flight(timeout: float = SHUTDOWN_TIMEOUT) -> None:
+    """Let updates that are already being handled finish."""
+    if not _in_flight:
+        return
+    logger.info("Waiting for %s in-flight updates", len(_in_flight))
+    _, pending = await asyncio.wait(set(_in_flight), timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+
+def start_webhook(
+    dp: Dispatcher,
+    on_startup: Callable[[Dispatcher], Awaitable[None]],
+    on_shutdown: Callable[[Dispatcher], Awaitable[None]],
+) -> None:
+    """Serve updates over a webhook instead of long polling (blocking).
+
+    The webhook is registered on startup and left in place on shutdown, so
+    Telegram queues updates until the next start instead of dropping them.
+    """
+    app = create_webhook_app(dp)
+    url = EnvKeys.WEBHOOK_URL.rstrip('/') + EnvKeys.WEBHOOK_PATH
+
+    async def _startup(_: web.Application) -> None:
+        Bot.set_current(dp.bot)
+        Dispatcher.set_current(dp)
+        await on_startup(dp)
+        await dp.bot.set_webhook(
+            url,
+            max_connections=int(EnvKeys.WEBHOOK_MAX_CONNECTIONS),
+            secret_token=SECRET_TOKEN,
+            drop_pending_updates=False,
+        )
+        logger.info("Webhook set to %s", url)
+
+    async def _shutdown(_: web.Application) -> None:
+        # The listening socket is closed by now; finish what was accepted before saving state.
+        await wait_in_flight()
+        await on_shutdown(dp)
+
+    async def _cleanup(_: web.Application) -> None:
+        await dp.storage.close()
+        await dp.storage.wait_closed()
+        session = await dp.bot.get_session()
+        await session.close()
+
+    app.on_startup.append(_startup)
+    app.on_shutdown.append(_shutdown)
+    app.on_cleanup.append(_cleanup)
+    web.run_app(
+        app,
+        host=EnvKeys.IPN_HOST,
+        port=int(EnvKeys.IPN_PORT),
+        shutdown_timeout=SHUTDOWN_TIMEOUT,
+        print=None,
+    )
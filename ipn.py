@@ -1,4 +1,22 @@
-from bot.ipn_server import app
+from aiogram import Bot
+from aiohttp import web
+
+from bot.ipn_server import create_ipn_app
+from bot.misc import EnvKeys
+from bot.services.ipn_inbox import start_ipn_worker
+
+
+async def _start_worker(app: web.Application) -> None:
+    start_ipn_worker(app['bot'])
+
+
+async def _close_bot(app: web.Application) -> None:
+    await app['bot'].session.close()
+
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    # Standalone receiver; the bot normally serves IPNs itself (see bot.main).
+    app = create_ipn_app(Bot(token=EnvKeys.TOKEN, parse_mode="HTML"))
+    app.on_startup.append(_start_worker)
+    app.on_cleanup.append(_close_bot)
+    web.run_app(app, host=EnvKeys.IPN_HOST, port=int(EnvKeys.IPN_PORT))
@@ -0,0 +1,14 @@
+import pytest
+
+from bot.database import Database
+from bot.database.models import register_models
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A fresh file-backed WAL database with the full schema, in place of ``database.db``."""
+    monkeypatch.setattr(Database, 'URL', f'sqlite:///{tmp_path / "shop.db"}')
+    monkeypatch.setattr(Database, '_instance', None)
+    register_models()
+    yield Database()
+    Database().engine.dispose()
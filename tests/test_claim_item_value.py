@@ -0,0 +1,30 @@
+import asyncio
+
+from bot.database import run_db
+from bot.database.methods import (
+    add_values_to_item,
+    claim_item_value,
+    create_category,
+    create_item,
+    select_item_values_amount,
+)
+
+STOCK = 200
+BUYERS = 500
+
+
+def test_concurrent_buyers_never_share_a_unit(database):
+    create_category('Category')
+    create_item('Item', 'Description', 10, 'Category')
+    for number in range(STOCK):
+        add_values_to_item('Item', f'unit-{number}', False)
+
+    async def buy_all():
+        return await asyncio.gather(*(run_db(claim_item_value, 'Item') for _ in range(BUYERS)))
+
+    claimed = [value for value in asyncio.run(buy_all()) if value is not None]
+
+    ids = [value['id'] for value in claimed]
+    assert len(ids) == len(set(ids)) == STOCK
+    assert len({value['value'] for value in claimed}) == STOCK
+    assert select_item_values_amount('Item') == 0
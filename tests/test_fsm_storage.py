@@ -0,0 +1,36 @@
+import asyncio
+
+from bot.database.fsm_storage import SQLiteStorage
+
+
+def test_a_worker_sees_another_workers_saved_state(database, monkeypatch):
+    monkeypatch.setattr(SQLiteStorage, 'REVALIDATE_AFTER', 0)
+    first, second = SQLiteStorage(), SQLiteStorage()
+
+    async def scenario():
+        assert await second.get_state(chat=1, user=1) is None
+        await first.set_state(chat=1, user=1, state='Shop:cart')
+        await first.update_data(chat=1, user=1, item='tea')
+        await first.flush()
+        assert await second.get_state(chat=1, user=1) == 'Shop:cart'
+        assert await second.get_data(chat=1, user=1) == {'item': 'tea'}
+
+        await second.reset_state(chat=1, user=1)
+        await second.flush()
+        assert await first.get_state(chat=1, user=1) is None
+        assert await first.get_data(chat=1, user=1) == {}
+
+    asyncio.run(scenario())
+
+
+def test_unsaved_writes_are_not_replaced_by_the_row(database, monkeypatch):
+    monkeypatch.setattr(SQLiteStorage, 'REVALIDATE_AFTER', 0)
+    first, second = SQLiteStorage(), SQLiteStorage()
+
+    async def scenario():
+        await second.set_state(chat=1, user=1, state='Shop:cart')
+        await second.flush()
+        await first.set_state(chat=1, user=1, state='Shop:pay')
+        assert await first.get_state(chat=1, user=1) == 'Shop:pay'
+
+    asyncio.run(scenario())
@@ -0,0 +1,32 @@
+from bot.database.methods import get_open_operations
+from bot.database.migrations import HEAD, upgrade
+
+
+def _replay_from(database, version: int, *statements: str) -> None:
+    with database.engine.begin() as conn:
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql(f'PRAGMA user_version = {version}')
+    upgrade(database.engine)
+    with database.engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA user_version').scalar() == HEAD
+
+
+def test_unparseable_legacy_timestamps_are_cleared(database):
+    _replay_from(
+        database, 4,
+        "INSERT INTO user_profiles (user_id, status, last_activity) VALUES (1, 'active', 'yesterday')",
+        "INSERT INTO user_profiles (user_id, status, last_activity) VALUES (2, 'active', '2024-01-01T12:00:00+03:00')",
+    )
+    with database.engine.connect() as conn:
+        rows = conn.exec_driver_sql('SELECT user_id, last_activity FROM user_profiles ORDER BY user_id').all()
+    assert rows == [(1, None), (2, '2024-01-01 09:00:00.000000')]
+
+
+def test_open_operations_get_a_creation_time(database):
+    _replay_from(
+        database, 14,
+        "INSERT INTO unfinished_operations (user_id, operation_value, operation_id) VALUES (1, 5, 'legacy')",
+    )
+    [operation] = get_open_operations()
+    assert operation['created_at'] is not None
@@ -0,0 +1,132 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.misc.nowpayments import CircuitBreaker, CircuitOpenError, NowPaymentsClient, NowPaymentsError
+
+
+class MockNowPayments:
+    """Local NOWPayments stand-in answering with a scripted list of statuses."""
+
+    def __init__(self, statuses=(200,), delay: float = 0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.hits = 0
+        self.api_keys = []
+
+    def _next_status(self) -> int:
+        self.hits += 1
+        return self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+
+    async def create(self, request: web.Request) -> web.Response:
+        self.api_keys.append(request.headers.get('x-api-key'))
+        status = self._next_status()
+        if status != 200:
+            return web.json_response({'message': 'error'}, status=status)
+        payload = await request.json()
+        return web.json_response({'payment_id': 7, 'pay_address': 'addr', 'pay_amount': payload['price_amount'] / 2})
+
+    async def check(self, request: web.Request) -> web.Response:
+        status = self._next_status()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if status != 200:
+            return web.json_response({'message': 'error'}, status=status)
+        return web.json_response({'payment_id': request.match_info['payment_id'], 'payment_status': 'finished'})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/payment', self.create)
+        app.router.add_get('/payment/{payment_id}', self.check)
+        return app
+
+
+def run(mock: MockNowPayments, scenario, **client_attrs):
+    """Serve ``mock`` locally and run ``scenario(client)`` against it with no retry backoff."""
+    async def main():
+        server = TestServer(mock.app())
+        await server.start_server()
+        client = NowPaymentsClient(str(server.make_url('')), 'test-key', 'https://shop.example/ipn')
+        client.BACKOFF = 0
+        for name, value in client_attrs.items():
+            setattr(client, name, value)
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_create_and_check_payment():
+    mock = MockNowPayments()
+
+    async def scenario(client):
+        return await client.create_payment(20, 'BTC'), await client.check_payment('7')
+
+    created, status = run(mock, scenario)
+    assert created == ('7', 'addr', 10.0)
+    assert status == 'finished'
+    assert mock.api_keys == ['test-key']
+
+
+def test_status_check_retries_server_errors():
+    mock = MockNowPayments(statuses=(502, 503, 200))
+    assert run(mock, lambda client: client.check_payment('7')) == 'finished'
+    assert mock.hits == 3
+
+
+def test_status_check_gives_up_after_max_attempts():
+    mock = MockNowPayments(statuses=(500,))
+    with pytest.raises(NowPaymentsError):
+        run(mock, lambda client: client.check_payment('7'))
+    assert mock.hits == NowPaymentsClient.MAX_ATTEMPTS
+
+
+def test_payment_creation_is_not_retried_once_it_may_have_been_applied():
+    mock = MockNowPayments(statuses=(500, 200))
+    with pytest.raises(NowPaymentsError):
+        run(mock, lambda client: client.create_payment(20, 'BTC'))
+    assert mock.hits == 1
+
+
+def test_status_check_times_out_and_retries():
+    mock = MockNowPayments(delay=1)
+    with pytest.raises(NowPaymentsError):
+        run(mock, lambda client: client.check_payment('7'), TIMEOUT=aiohttp.ClientTimeout(total=0.2))
+    assert mock.hits == NowPaymentsClient.MAX_ATTEMPTS
+
+
+def test_breaker_opens_then_lets_one_probe_through():
+    mock = MockNowPayments(statuses=(500,))
+
+    async def scenario(client):
+        for _ in range(2):
+            with pytest.raises(NowPaymentsError):
+                await client.check_payment('7')
+        hits = mock.hits
+        # Open: fails fast without reaching the API.
+        with pytest.raises(CircuitOpenError):
+            await client.check_payment('7')
+        assert mock.hits == hits
+
+        # Half-open: the probe reaches the API, fails and re-opens the circuit.
+        await asyncio.sleep(0.25)
+        with pytest.raises(NowPaymentsError) as probe:
+            await client.check_payment('7')
+        assert not isinstance(probe.value, CircuitOpenError)
+        assert mock.hits > hits
+        with pytest.raises(CircuitOpenError):
+            await client.check_payment('7')
+
+        # A successful probe closes it again.
+        mock.statuses = [200]
+        await asyncio.sleep(0.25)
+        assert await client.check_payment('7') == 'finished'
+        assert await client.check_payment('7') == 'finished'
+
+    run(mock, scenario, breaker=CircuitBreaker(threshold=2, reset_after=0.2))
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import event
+
+from bot.database.methods import (
+    get_all_item_names,
+    get_all_subcategories,
+    get_item_subscribers,
+    get_purchases_by_date,
+    get_reservations_by_status,
+    get_reviews_by_status,
+    get_unfinished_operation,
+    get_user_unfinished_operation,
+    has_user_achievement,
+    select_item_values_amount,
+    select_user_items,
+)
+
+HOT_LOOKUPS = [
+    (select_item_values_amount, ('Item',), 'ix_item_values_item_name'),
+    (select_user_items, (1,), 'ix_bought_goods_buyer_id'),
+    (get_purchases_by_date, ('2024-01-01',), 'ix_bought_goods_bought_datetime'),
+    (get_unfinished_operation, ('42',), 'ix_unfinished_operations_operation_id'),
+    (get_user_unfinished_operation, (1,), 'ix_unfinished_operations_user_id'),
+    (get_item_subscribers, ('Item',), 'ix_stock_notifications_item_name'),
+    (has_user_achievement, (1, 'start'), 'ix_user_achievements_user_code'),
+    (get_reservations_by_status, ('active',), 'ix_reservations_status_reserved_at'),
+    (get_reviews_by_status, ('pending',), 'ix_reviews_status_created_at'),
+    (get_all_subcategories, ('Category',), 'ix_categories_parent_name'),
+    (get_all_item_names, ('Category',), 'ix_goods_category_name'),
+]
+
+
+def _selects_of(database, method, args) -> list[tuple[str, tuple]]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(database.engine, 'before_cursor_execute', record)
+    try:
+        method(*args)
+    finally:
+        event.remove(database.engine, 'before_cursor_execute', record)
+        database.remove_session()
+    return statements
+
+
+@pytest.mark.parametrize('method, args, index', HOT_LOOKUPS, ids=[index for _, _, index in HOT_LOOKUPS])
+def test_hot_lookup_uses_its_index(database, method, args, index):
+    statements = _selects_of(database, method, args)
+    assert statements, f'{method.__name__} ran no query'
+    with database.engine.connect() as conn:
+        plans = [
+            ' | '.join(row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters))
+            for statement, parameters in statements
+        ]
+    assert any(f'INDEX {index}' in plan for plan in plans), plans
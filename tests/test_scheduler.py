@@ -0,0 +1,49 @@
+import asyncio
+import datetime
+
+from bot.database.methods import claim_jobs, schedule_job
+from bot.misc.dates import utcnow
+from bot.services import scheduler as scheduler_module
+from bot.services.scheduler import JobScheduler
+
+
+def test_a_job_is_claimed_by_one_process_until_its_lease_passes(database):
+    job_id = schedule_job('ping', utcnow() - datetime.timedelta(seconds=1))
+    now = utcnow()
+    lease = now + datetime.timedelta(minutes=5)
+
+    assert [job['id'] for job in claim_jobs([job_id], now, lease)] == [job_id]
+    assert claim_jobs([job_id], now, lease) == []
+    assert [job['id'] for job in claim_jobs([job_id], lease, lease + datetime.timedelta(minutes=5))] == [job_id]
+
+
+def test_jobs_popped_by_a_failed_batch_run_later(database, monkeypatch):
+    calls = {'claims': 0}
+    real_claim_jobs = scheduler_module.claim_jobs
+
+    def flaky_claim_jobs(*args):
+        calls['claims'] += 1
+        if calls['claims'] == 1:
+            raise RuntimeError('database is locked')
+        return real_claim_jobs(*args)
+
+    monkeypatch.setattr(scheduler_module, 'claim_jobs', flaky_claim_jobs)
+    jobs = JobScheduler()
+    ran = []
+
+    @jobs.handler('ping')
+    async def ping(bot, payload):
+        ran.append(payload['n'])
+
+    async def scenario():
+        await jobs.start(None)
+        await jobs.schedule('ping', 0, {'n': 1})
+        for _ in range(50):
+            if ran:
+                break
+            await asyncio.sleep(0.1)
+        jobs._task.cancel()
+
+    asyncio.run(scenario())
+    assert ran == [1]
+    assert calls['claims'] >= 2
@@ -0,0 +1,98 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TelegramAPIServer
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot import webhook
+from bot.misc import EnvKeys
+
+TOKEN = '123456:TEST'
+UPDATE = {
+    'update_id': 1,
+    'message': {
+        'message_id': 10,
+        'date': 0,
+        'chat': {'id': 5, 'type': 'private'},
+        'from': {'id': 5, 'is_bot': False, 'first_name': 'Buyer'},
+        'text': 'hello',
+    },
+}
+
+
+class FakeTelegram:
+    """Local Bot API stand-in recording every method the bot calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def method(self, request: web.Request) -> web.Response:
+        data = dict(await request.post())
+        self.calls.append((request.match_info['method'], data))
+        message = {**UPDATE['message'], 'message_id': 11, 'text': data.get('text')}
+        return web.json_response({'ok': True, 'result': message})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.method)
+        return app
+
+
+def run(scenario):
+    """Serve the webhook app for a dispatcher whose bot talks to a fake Telegram server."""
+    async def main():
+        telegram = FakeTelegram()
+        api = TestServer(telegram.app())
+        await api.start_server()
+        bot = Bot(TOKEN, server=TelegramAPIServer.from_base(str(api.make_url('')).rstrip('/')))
+        dp = Dispatcher(bot)
+        received = []
+
+        async def echo(message: types.Message):
+            received.append(message.text)
+            await message.answer(f'echo: {message.text}')
+
+        dp.register_message_handler(echo)
+        client = TestClient(TestServer(webhook.create_webhook_app(dp)))
+        await client.start_server()
+        try:
+            return await scenario(client, received, telegram)
+        finally:
+            await client.close()
+            await (await bot.get_session()).close()
+            await api.close()
+
+    return asyncio.run(main())
+
+
+def test_update_reaches_the_dispatcher_and_replies_go_to_telegram():
+    async def scenario(client, received, telegram):
+        response = await client.post(
+            EnvKeys.WEBHOOK_PATH, json=UPDATE, headers={webhook.SECRET_HEADER: webhook.SECRET_TOKEN}
+        )
+        assert response.status == 200
+        assert received == ['hello']
+        assert telegram.calls == [('sendMessage', {'chat_id': '5', 'text': 'echo: hello'})]
+
+    run(scenario)
+
+
+def test_wrong_or_missing_secret_token_is_rejected():
+    async def scenario(client, received, telegram):
+        wrong = await client.post(EnvKeys.WEBHOOK_PATH, json=UPDATE, headers={webhook.SECRET_HEADER: 'wrong'})
+        missing = await client.post(EnvKeys.WEBHOOK_PATH, json=UPDATE)
+        assert (wrong.status, missing.status) == (401, 401)
+        await asyncio.sleep(0.05)
+        assert received == []
+        assert telegram.calls == []
+
+    run(scenario)
+
+
+def test_ipn_routes_share_the_webhook_app():
+    async def scenario(client, received, telegram):
+        paths = {resource.canonical for resource in client.server.app.router.resources()}
+        assert {EnvKeys.WEBHOOK_PATH, '/nowpayments-ipn', '/'} <= paths
+
+    run(scenario)
@@ -0,0 +1,46 @@
+import asyncio
+import datetime
+import types
+
+from bot.misc import payment
+from bot.misc.dates import utcnow
+
+
+class FakeClient:
+    """Stands in for ``yoomoney.Client``: a recent history window plus older operations by label."""
+
+    recent = {'1_recent': 'success'}
+    older = {'1_old': 'success'}
+    calls = []
+
+    def __init__(self, token):
+        pass
+
+    def operation_history(self, label=None, from_date=None, start_record=None, records=None):
+        self.calls.append(label or 'window')
+        if label is not None:
+            statuses = {label: self.older[label]} if label in self.older else {}
+        else:
+            statuses = self.recent
+        operations = [types.SimpleNamespace(label=key, status=value) for key, value in statuses.items()]
+        return types.SimpleNamespace(operations=operations, next_record=None)
+
+
+def test_labels_outside_the_window_are_looked_up(monkeypatch):
+    monkeypatch.setattr(payment, 'Client', FakeClient)
+    FakeClient.calls = []
+    history = payment.YooMoneyHistory('token')
+    old = utcnow() - datetime.timedelta(days=2)
+
+    async def scenario():
+        return (
+            await history.status('1_recent', utcnow()),
+            await history.status('1_unpaid', utcnow()),
+            await history.status('1_old', old),
+            await history.status('1_old', old),
+            await history.status('1_gone', old),
+        )
+
+    assert asyncio.run(scenario()) == ('success', None, 'success', 'success', None)
+    # One window fetch; a fresh unpaid invoice needs no lookup, the cached old one no second lookup.
+    assert FakeClient.calls == ['window', '1_old', '1_gone']